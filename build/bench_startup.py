@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Cold-start benchmark for mixtura.
+
+Runs src/main.py against stub nix/flatpak/brew executables (so no real
+backend is needed), measures median wall-clock time per scenario and the
+total import time reported by `python -X importtime`, and exits non-zero
+when any of them exceeds its budget.
+
+Budgets can be overridden with MIXTURA_BENCH_WALL_MS / MIXTURA_BENCH_IMPORT_MS.
+"""
+import os
+import sys
+import stat
+import time
+import tempfile
+import statistics
+import subprocess
+
+SRC_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+MAIN = os.path.join(SRC_DIR, "main.py")
+
+RUNS = int(os.environ.get("MIXTURA_BENCH_RUNS", 15))
+# Median wall time of a fast-path command above bare interpreter start, in milliseconds
+WALL_BUDGET_MS = float(os.environ.get("MIXTURA_BENCH_WALL_MS", 150))
+# Sum of top-level import times on the fast path, in milliseconds
+IMPORT_BUDGET_MS = float(os.environ.get("MIXTURA_BENCH_IMPORT_MS", 60))
+
+# Scenarios that must stay on the fast path
+SCENARIOS = [
+    ["list", "flatpak"],
+    ["nixpkgs", "--gc"],
+    ["search", "flatpak#spotify"],
+]
+
+# Modules that must not be imported by a fast-path command
+FORBIDDEN_IMPORTS = ["urllib.request", "ssl", "http.client", "pkgutil", "inspect", "asyncio"]
+
+STUBS = {
+    "nix": """#!/bin/sh
+case "$*" in
+  --version) echo "nix (Nix) 2.24.0";;
+  "config show") echo "experimental-features = nix-command flakes";;
+  *"profile list --json"*) echo '{"version":3,"elements":{}}';;
+  *"search"*) echo '{}';;
+esac
+""",
+    "flatpak": """#!/bin/sh
+case "$1" in
+  --version) echo "Flatpak 1.14.4";;
+  remotes) echo flathub;;
+  list) printf 'Spotify\\tcom.spotify.Client\\tMusic\\t1.2.3\\n';;
+  search) printf 'Spotify\\tcom.spotify.Client\\tMusic\\t1.2.3\\n';;
+esac
+""",
+    "brew": """#!/bin/sh
+case "$1" in
+  --version) echo "Homebrew 4.2.0";;
+  --prefix) echo /opt/homebrew;;
+esac
+""",
+}
+
+def make_env(root: str) -> dict:
+    bin_dir = os.path.join(root, "bin")
+    os.makedirs(bin_dir)
+    for name, content in STUBS.items():
+        path = os.path.join(bin_dir, name)
+        with open(path, "w") as f:
+            f.write(content)
+        os.chmod(path, os.stat(path).st_mode | stat.S_IEXEC)
+
+    env = dict(os.environ)
+    env["PATH"] = bin_dir + os.pathsep + "/usr/bin:/bin"
+    env["HOME"] = root
+    env["XDG_CACHE_HOME"] = os.path.join(root, "cache")
+    env["MIXTURA_UPDATE_TTL"] = str(10 ** 9)
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    return env
+
+def run(args, env, extra=()):
+    return subprocess.run(
+        [sys.executable, *extra, MAIN, *args],
+        env=env, capture_output=True, text=True, stdin=subprocess.DEVNULL
+    )
+
+def wall_time_ms(args, env) -> float:
+    samples = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        run(args, env)
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+def import_profile(args, env):
+    """Returns (total top-level import time in ms, set of imported module names)."""
+    result = run(args, env, extra=("-X", "importtime"))
+    total_us = 0
+    imported = set()
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        _, _, rest = line.partition(":")
+        self_us, cumulative_us, name = rest.split("|", 2)
+        imported.add(name.strip())
+        # Top-level entries have exactly one space of indentation
+        if name.startswith(" ") and not name.startswith("  "):
+            total_us += int(cumulative_us)
+    return total_us / 1000, imported
+
+def main() -> int:
+    failed = False
+    baseline = None
+
+    with tempfile.TemporaryDirectory() as root:
+        env = make_env(root)
+
+        interpreter = [sys.executable, "-c", "pass"]
+        samples = []
+        for _ in range(RUNS):
+            start = time.perf_counter()
+            subprocess.run(interpreter, env=env)
+            samples.append((time.perf_counter() - start) * 1000)
+        baseline = statistics.median(samples)
+        print(f"interpreter baseline: {baseline:.1f} ms")
+
+        for args in SCENARIOS:
+            # Warm the bytecode and probe caches; we measure cold process start, not first install
+            run(args, env)
+
+            label = " ".join(args)
+            wall = wall_time_ms(args, env)
+            import_ms, imported = import_profile(args, env)
+            forbidden = [m for m in FORBIDDEN_IMPORTS if m in imported]
+
+            status = "ok"
+            if wall - baseline > WALL_BUDGET_MS or import_ms > IMPORT_BUDGET_MS or forbidden:
+                status = "OVER BUDGET"
+                failed = True
+
+            print(f"{label:<28} wall {wall:7.1f} ms (+{wall - baseline:.1f})  imports {import_ms:6.1f} ms  [{status}]")
+            if forbidden:
+                print(f"  forbidden imports on fast path: {', '.join(forbidden)}")
+
+    print(f"budget: wall +{WALL_BUDGET_MS:.0f} ms over interpreter, imports {IMPORT_BUDGET_MS:.0f} ms")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
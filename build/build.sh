@@ -15,6 +15,9 @@ PRODUCT_VERSION="1.0.0.0"
 FILE_DESCRIPTION="Mixtura Package Manager"
 COPYRIGHT_TEXT="Copyright (c) 2025 Mixtura Project"
 
+echo "Generating provider manifest..."
+python3 gen_manifest.py || exit 1
+
 echo "Building mixtura with Nuitka..."
 
 python3 -m nuitka \
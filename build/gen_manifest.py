@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Generates src/modules/manifest.py, the static provider registry used by
+ModuleManager to import providers lazily.
+
+Run from anywhere; build.sh calls it before compiling so the manifest
+always matches the modules that get frozen into the binary.
+"""
+import os
+import sys
+import importlib
+import pkgutil
+
+SRC_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+sys.path.insert(0, SRC_DIR)
+
+from core import PackageManager
+import modules
+
+def collect_providers():
+    providers = {}
+    for importer, modname, ispkg in pkgutil.iter_modules(modules.__path__, modules.__name__ + "."):
+        if not ispkg:
+            continue
+
+        provider_module_name = f"{modname}.provider"
+        try:
+            module = importlib.import_module(provider_module_name)
+        except ImportError:
+            continue
+
+        for attr_name in sorted(dir(module)):
+            attr = getattr(module, attr_name)
+            if (isinstance(attr, type) and
+                issubclass(attr, PackageManager) and
+                attr is not PackageManager and
+                attr.__module__ == module.__name__):
+
+                providers[attr().name] = (provider_module_name, attr_name)
+    return providers
+
+def main():
+    providers = collect_providers()
+    out_path = os.path.join(SRC_DIR, "modules", "manifest.py")
+
+    lines = [
+        "# Generated by build/gen_manifest.py - do not edit by hand.",
+        "# Maps provider names to (module path, class name) for lazy loading.",
+        "PROVIDERS = {",
+    ]
+    for name in sorted(providers, key=lambda n: providers[n][0]):
+        module_name, class_name = providers[name]
+        lines.append(f"    {name!r}: ({module_name!r}, {class_name!r}),")
+    lines.append("}")
+
+    with open(out_path, "w") as f:
+        f.write("\n".join(lines) + "\n")
+
+    print(f"Wrote {len(providers)} providers to {out_path}")
+
+if __name__ == "__main__":
+    main()
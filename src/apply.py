@@ -0,0 +1,119 @@
+from typing import Any, Dict, List, Optional, Tuple
+from core import PackageManager
+from utils import read_json, write_json_atomic
+
+# Bump when the lockfile layout changes
+LOCK_VERSION = 1
+
+class ManifestError(Exception):
+    """A package manifest that can't be parsed."""
+
+def read_manifest(path: str) -> Dict[str, List[str]]:
+    """
+    Desired packages by provider, in file order. One `provider#package` per line
+    (`provider#a,b` lists several); bare names mean nixpkgs, like `mixtura add`.
+    Blank lines and lines starting with '#' are ignored.
+    """
+    desired: Dict[str, List[str]] = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for lineno, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            provider, sep, packages = line.partition("#")
+            if not sep:
+                provider, packages = "nixpkgs", line
+            provider = provider.strip()
+            items = [p.strip() for p in packages.split(",") if p.strip()]
+            if not provider or not items:
+                raise ManifestError(f"{path}:{lineno}: expected 'provider#package', got '{line}'")
+            queued = desired.setdefault(provider, [])
+            queued.extend(p for p in dict.fromkeys(items) if p not in queued)
+    return desired
+
+def lock_path(manifest_path: str) -> str:
+    return manifest_path + ".lock"
+
+def read_lock(path: str) -> Dict[str, Dict[str, Dict[str, Any]]]:
+    """Provider -> manifest entry -> resolved record ({id, version, origin}) of the last apply."""
+    data = read_json(path, {})
+    if not isinstance(data, dict) or data.get("version") != LOCK_VERSION:
+        return {}
+    return data.get("packages") or {}
+
+def write_lock(path: str, packages: Dict[str, Dict[str, Dict[str, Any]]]) -> bool:
+    """Writes the lockfile unless it already says the same. Returns whether it was written."""
+    data = {"version": LOCK_VERSION, "packages": packages}
+    if read_json(path, None) == data:
+        return False
+    write_json_atomic(path, data)
+    return True
+
+def find_installed(mgr: PackageManager, package: str, installed: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """The inventory record a manifest entry resolved to, matched on id first, then name."""
+    keys = mgr.installed_names(package)
+    for field in ("id", "name"):
+        for record in installed:
+            if (record.get(field) or "").lower() in keys:
+                return record
+    return None
+
+def diff(
+    desired: Dict[str, List[str]],
+    locked: Dict[str, Dict[str, Dict[str, Any]]],
+    installed: Dict[str, List[Dict[str, Any]]],
+    managers: Dict[str, PackageManager]
+) -> Tuple[Dict[str, List[str]], Dict[str, List[str]]]:
+    """
+    (to install, to remove), by provider, to get from `installed` to `desired`.
+    Only packages the previous apply tracked (in `locked`) are ever removed, so
+    whatever was installed by other means is left alone.
+    """
+    to_install: Dict[str, List[str]] = {}
+    to_remove: Dict[str, List[str]] = {}
+
+    for provider, mgr in managers.items():
+        present = installed.get(provider, [])
+        wanted = desired.get(provider, [])
+
+        missing = [pkg for pkg in wanted if find_installed(mgr, pkg, present) is None]
+        if missing:
+            to_install[provider] = missing
+
+        wanted_keys = {key for pkg in wanted for key in mgr.installed_names(pkg)}
+        dropped = []
+        for pkg, record in locked.get(provider, {}).items():
+            if set(mgr.installed_names(pkg)) & wanted_keys:
+                continue
+            # Remove it under the id it was resolved to, if it is still there
+            current = find_installed(mgr, record.get("id") or pkg, present)
+            if current is not None:
+                dropped.append(current["id"])
+        if dropped:
+            to_remove[provider] = list(dict.fromkeys(dropped))
+
+    return to_install, to_remove
+
+def resolve(
+    desired: Dict[str, List[str]],
+    installed: Dict[str, List[Dict[str, Any]]],
+    managers: Dict[str, PackageManager]
+) -> Tuple[Dict[str, Dict[str, Dict[str, Any]]], List[str]]:
+    """(lock entries for the installed manifest packages, `provider#package` entries not installed)."""
+    packages: Dict[str, Dict[str, Dict[str, Any]]] = {}
+    unresolved = []
+    for provider, wanted in desired.items():
+        mgr = managers.get(provider)
+        if mgr is None:
+            continue
+        for pkg in wanted:
+            record = find_installed(mgr, pkg, installed.get(provider, []))
+            if record is None:
+                unresolved.append(f"{provider}#{pkg}")
+                continue
+            packages.setdefault(provider, {})[pkg] = {
+                "id": record.get("id"),
+                "version": record.get("version"),
+                "origin": record.get("origin") or "",
+            }
+    return packages, unresolved
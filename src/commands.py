@@ -1,7 +1,14 @@
+import sys
 import argparse
-from typing import Dict, List
-from utils import log_task, log_info, log_success, log_warn, log_error, Style
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+from core import PackageManager
+from utils import log_task, log_info, log_success, log_warn, log_error, Renderer, Style
 from manager import ModuleManager
+import apply
+import inventory
+from plan import Plan
+from ranking import Ranker, rank
 
 def _get_manager_or_warn(name: str):
     mgr = ModuleManager.get_instance().get_manager(name)
@@ -22,6 +29,7 @@ def cmd_add(args: argparse.Namespace) -> None:
     # If not, search ALL providers.
     
     packages_to_install: Dict[str, List[str]] = {}
+    ambiguous: List[str] = []
     
     for arg in args.packages:
         if '#' in arg:
@@ -36,21 +44,36 @@ def cmd_add(args: argparse.Namespace) -> None:
         else:
             # Ambiguous package - Search Mode
             # Handle commas here too: add git,vim -> [git, vim]
-            items = [p.strip() for p in arg.split(',') if p.strip()]
+            ambiguous.extend(p.strip() for p in arg.split(',') if p.strip())
+
+    if ambiguous:
+        # One batched search for every ambiguous item: each provider evaluates its
+        # backend once instead of once per item
+        terms = ", ".join(f"'{Style.BOLD}{item}{Style.RESET}'" for item in dict.fromkeys(ambiguous))
+        log_task(f"Searching for {terms} across all providers...")
+        results_by_item = manager.search_all_many(ambiguous, deadline=args.timeout)
+
+        for item in ambiguous:
+            results = results_by_item.get(item, [])
             
-            for item in items:
-                log_task(f"Searching for '{Style.BOLD}{item}{Style.RESET}' across all providers...")
-                results = manager.search_all(item)
-                
-                if not results:
-                    log_warn(f"No packages found for '{item}'.")
-                    continue
-                
-                # Interactive Selection
-                print(f"\n{Style.BOLD}Found {len(results)} matches for '{item}':{Style.RESET}")
+            if not results:
+                log_warn(f"No packages found for '{item}'.")
+                continue
+            
+            # Interactive Selection, best matches first, one page at a time
+            page = 1
+            seen = []
+            while True:
+                shown, total = rank(results, item, limit=args.limit, page=page)
+                first = len(seen) + 1
+                seen.extend(shown)
+                last = len(seen)
+                has_more = last < total
+
+                if page == 1:
+                    print(f"\n{Style.BOLD}Found {total} matches for '{item}':{Style.RESET}")
                 
-                for i, res in enumerate(results):
-                    idx = i + 1
+                for idx, res in enumerate(shown, start=first):
                     name = res.get('name', 'unknown')
                     prov = res.get('provider', 'unknown')
                     ver = res.get('version', '')
@@ -62,15 +85,24 @@ def cmd_add(args: argparse.Namespace) -> None:
                         print(f"    {desc}")
                 
                 print()
+                more_hint = ", 'm' for more" if has_more else ""
                 try:
-                    choice = input(f"{Style.INFO}Select a package to add (1-{len(results)}) or 's' to skip: {Style.RESET}")
+                    choice = input(f"{Style.INFO}Select a package to add (1-{last}){more_hint} or 's' to skip: {Style.RESET}")
                     if choice.lower() == 's' or choice.lower() == 'q':
                         print("Skipping...")
+                        break
+
+                    if choice.lower() in ('m', 'more'):
+                        if has_more:
+                            page += 1
+                        else:
+                            log_warn("No more matches.")
                         continue
                     
-                    choice_idx = int(choice) - 1
-                    if 0 <= choice_idx < len(results):
-                        selected = results[choice_idx]
+                    choice_idx = int(choice)
+                    # Any number seen so far is valid, not only the current page
+                    if 1 <= choice_idx <= last:
+                        selected = seen[choice_idx - 1]
                         prov = selected['provider']
                         pkg_id = selected.get('id') or selected.get('name')
                         
@@ -83,6 +115,7 @@ def cmd_add(args: argparse.Namespace) -> None:
                         log_error("Invalid selection.")
                 except ValueError:
                     log_error("Invalid input.")
+                break
 
     # Proceed with installation
     if not packages_to_install:
@@ -90,16 +123,14 @@ def cmd_add(args: argparse.Namespace) -> None:
         return
 
     print()
+    plan = Plan(manager)
     for provider_name, packages in packages_to_install.items():
-        mgr = _get_manager_or_warn(provider_name)
-        if mgr and mgr.is_available():
-            log_task(f"Installing {len(packages)} packages via {mgr.name}...")
-            mgr.install(packages)
-        else:
-            if mgr:
-                log_error(f"Provider '{mgr.name}' is not available.")
-            else:
-                 log_error(f"Provider '{provider_name}' unknown.")
+        plan.add(provider_name, "install", packages)
+    plan.show()
+    code = plan.execute(jobs=args.jobs)
+    if code:
+        log_error("Installation finished with failures.")
+        sys.exit(code)
 
     log_success("Installation process finished.")
 
@@ -107,6 +138,7 @@ def cmd_remove(args: argparse.Namespace) -> None:
     manager = ModuleManager.get_instance()
     
     packages_to_remove: Dict[str, List[str]] = {}
+    ambiguous: List[str] = []
 
     for arg in args.packages:
         if '#' in arg:
@@ -121,122 +153,160 @@ def cmd_remove(args: argparse.Namespace) -> None:
         else:
             # Ambiguous package - Search Installed Mode
             # Handle commas here too
-            items = [p.strip() for p in arg.split(',') if p.strip()]
+            ambiguous.extend(p.strip() for p in arg.split(',') if p.strip())
+
+    if ambiguous:
+        # The inventory is fetched once (providers in parallel) and indexed, then
+        # every ambiguous item is looked up in the index
+        terms = ", ".join(f"'{Style.BOLD}{item}{Style.RESET}'" for item in dict.fromkeys(ambiguous))
+        log_task(f"Searching for installed packages matching {terms}...")
+        installed = inventory.snapshot(manager.get_all_managers())
+        index = inventory.InventoryIndex([pkg for pkgs in installed.values() for pkg in pkgs])
+
+        for item in ambiguous:
+            matches = index.search(item)
+            if not matches:
+                # Probably a typo: offer the closest installed names instead
+                matches = index.fuzzy(item)
+                if matches:
+                    log_info(f"No installed package contains '{item}', showing similar names.")
+
+            if not matches:
+                log_warn(f"No installed packages found matching '{item}'.")
+                continue
             
-            for item in items:
-                log_task(f"Searching for installed package '{Style.BOLD}{item}{Style.RESET}'...")
-                
-                matches = []
-                for mgr in manager.get_all_managers():
-                    if not mgr.is_available():
-                        continue
-                    
-                    try:
-                        installed = mgr.list_packages() # Assuming this is reasonably fast
-                        for pkg in installed:
-                            # Fuzzy matching or exact? 
-                            # User said "similar names", so substring match is good.
-                            # But we should prioritize exact match if possible?
-                            p_name = pkg.get('name', '')
-                            if item.lower() in p_name.lower():
-                                pkg['provider'] = mgr.name
-                                matches.append(pkg)
-                    except Exception as e:
-                        log_warn(f"Failed to list packages from {mgr.name}: {e}")
-
-                if not matches:
-                    log_warn(f"No installed packages found matching '{item}'.")
-                    continue
-                
-                # Filter out packages that are already selected for removal
-                # from previous arguments or searches in this same command
-                filtered_matches = []
-                for m in matches:
-                    prov = m['provider']
-                    pid = m.get('id') or m.get('name')
-                    # Check if already in our scheduled list
-                    if pid not in packages_to_remove.get(prov, []):
-                        filtered_matches.append(m)
+            # Filter out packages that are already selected for removal
+            # from previous arguments or searches in this same command
+            filtered_matches = []
+            for m in matches:
+                prov = m['provider']
+                pid = m.get('id') or m.get('name')
+                # Check if already in our scheduled list
+                if pid not in packages_to_remove.get(prov, []):
+                    filtered_matches.append(m)
+            
+            if not filtered_matches:
+                # If we found matches but they are all already selected, just skip
+                if len(matches) > 0:
+                    log_info(f"Matches for '{item}' are already selected for removal. Skipping prompt.")
+                continue
+            
+            matches = filtered_matches
+
+            print(f"\n{Style.BOLD}Found {len(matches)} installed matches for '{item}':{Style.RESET}")
+            
+            for i, res in enumerate(matches):
+                idx = i + 1
+                name = res.get('name', 'unknown')
+                prov = res.get('provider', 'unknown')
+                ver = res.get('version', '')
+                # Some list_packages implementation might not give desc, that's fine.
                 
-                if not filtered_matches:
-                    # If we found matches but they are all already selected, just skip
-                    if len(matches) > 0:
-                        log_info(f"Matches for '{item}' are already selected for removal. Skipping prompt.")
+                print(f" {Style.SUCCESS}{idx}.{Style.RESET} {Style.BOLD}{name}{Style.RESET} {Style.DIM}({prov} {ver}){Style.RESET}")
+            
+            print()
+            try:
+                choice = input(f"{Style.INFO}Select a package to remove (1-{len(matches)}), 'a' to remove all, or 's' to skip: {Style.RESET}")
+                if choice.lower() == 's' or choice.lower() == 'q':
+                    print("Skipping...")
                     continue
                 
-                matches = filtered_matches
+                if choice.lower() == 'a':
+                    confirm = input(f"{Style.WARNING}Are you sure you want to remove ALL {len(matches)} packages listed above? (y/N): {Style.RESET}")
+                    if confirm.lower() == 'y':
+                        for selected in matches:
+                            prov = selected['provider']
+                            pkg_id = selected.get('id') or selected.get('name')
+                            if prov not in packages_to_remove:
+                                packages_to_remove[prov] = []
+                            packages_to_remove[prov].append(pkg_id)
+                            log_info(f"Selected {selected['name']} from {prov} for removal")
+                        continue
+                    else:
+                         print("Cancelled 'remove all'. Skipping...")
+                         continue
 
-                print(f"\n{Style.BOLD}Found {len(matches)} installed matches for '{item}':{Style.RESET}")
-                
-                for i, res in enumerate(matches):
-                    idx = i + 1
-                    name = res.get('name', 'unknown')
-                    prov = res.get('provider', 'unknown')
-                    ver = res.get('version', '')
-                    # Some list_packages implementation might not give desc, that's fine.
+                choice_idx = int(choice) - 1
+                if 0 <= choice_idx < len(matches):
+                    selected = matches[choice_idx]
+                    prov = selected['provider']
                     
-                    print(f" {Style.SUCCESS}{idx}.{Style.RESET} {Style.BOLD}{name}{Style.RESET} {Style.DIM}({prov} {ver}){Style.RESET}")
-                
-                print()
-                try:
-                    choice = input(f"{Style.INFO}Select a package to remove (1-{len(matches)}), 'a' to remove all, or 's' to skip: {Style.RESET}")
-                    if choice.lower() == 's' or choice.lower() == 'q':
-                        print("Skipping...")
-                        continue
+                    pkg_id = selected.get('id') or selected.get('name')
                     
-                    if choice.lower() == 'a':
-                        confirm = input(f"{Style.WARNING}Are you sure you want to remove ALL {len(matches)} packages listed above? (y/N): {Style.RESET}")
-                        if confirm.lower() == 'y':
-                            for selected in matches:
-                                prov = selected['provider']
-                                pkg_id = selected.get('id') or selected.get('name')
-                                if prov not in packages_to_remove:
-                                    packages_to_remove[prov] = []
-                                packages_to_remove[prov].append(pkg_id)
-                                log_info(f"Selected {selected['name']} from {prov} for removal")
-                            continue
-                        else:
-                             print("Cancelled 'remove all'. Skipping...")
-                             continue
-
-                    choice_idx = int(choice) - 1
-                    if 0 <= choice_idx < len(matches):
-                        selected = matches[choice_idx]
-                        prov = selected['provider']
-                        
-                        pkg_id = selected.get('id') or selected.get('name')
-                        
-                        if prov not in packages_to_remove:
-                            packages_to_remove[prov] = []
-                        packages_to_remove[prov].append(pkg_id)
-                        log_info(f"Selected {selected['name']} from {prov} for removal")
-                    else:
-                        log_error("Invalid selection.")
-                except ValueError:
-                    log_error("Invalid input.")
+                    if prov not in packages_to_remove:
+                        packages_to_remove[prov] = []
+                    packages_to_remove[prov].append(pkg_id)
+                    log_info(f"Selected {selected['name']} from {prov} for removal")
+                else:
+                    log_error("Invalid selection.")
+            except ValueError:
+                log_error("Invalid input.")
 
     if not packages_to_remove:
         log_warn("No packages selected for removal.")
         return
 
+    plan = Plan(manager)
     for provider_name, packages in packages_to_remove.items():
-        mgr = _get_manager_or_warn(provider_name)
-        if mgr:
-             log_task(f"Removing {len(packages)} packages via {mgr.name}...")
-             mgr.uninstall(packages)
+        plan.add(provider_name, "remove", packages)
+    plan.show()
+    code = plan.execute(jobs=args.jobs)
+    if code:
+        log_error("Removal finished with failures.")
+        sys.exit(code)
 
     log_success("Removal process finished.")
 
+def _iter_outdated(managers: List[PackageManager]) -> Iterator[Tuple[PackageManager, Optional[List[Dict]]]]:
+    """(provider, its outdated packages or None if it can't tell), as each one answers."""
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+    with ThreadPoolExecutor(max_workers=max(1, len(managers))) as pool:
+        futures = {pool.submit(mgr.outdated): mgr for mgr in managers}
+        for future in as_completed(futures):
+            mgr = futures[future]
+            try:
+                stale = future.result()
+            except Exception as e:
+                log_warn(f"Failed to check {mgr.name} for outdated packages: {e}")
+                stale = None
+            yield mgr, stale
+
+def _plan_full_upgrades(plan: Plan, managers: List[PackageManager], force: bool) -> None:
+    """Upgrades of whole providers, narrowed to their outdated packages unless `force`."""
+    if force:
+        for mgr in managers:
+            plan.add(mgr.name, "upgrade", None) # None = all
+        return
+    if not managers:
+        return
+
+    log_task("Checking for outdated packages...")
+    found = {mgr.name: stale for mgr, stale in _iter_outdated(managers)}
+    for mgr in managers:
+        stale = found[mgr.name]
+        if stale is None or any(pkg.get("full_upgrade") for pkg in stale):
+            # Unknown, or something only a full upgrade reaches: upgrade everything
+            plan.add(mgr.name, "upgrade", None)
+        elif stale:
+            plan.add(mgr.name, "upgrade", [pkg["id"] for pkg in stale])
+        else:
+            log_info(f"{mgr.name} is up to date.")
+
 def cmd_upgrade(args: argparse.Namespace) -> None:
     manager = ModuleManager.get_instance()
     
+    plan = Plan(manager)
+
     # 1. Upgrade ALL
     if not args.packages:
         log_task("Upgrading all available providers...")
-        for mgr in manager.get_all_managers():
-            if mgr.is_available():
-                log_info(f"Upgrading {mgr.name}...")
-                mgr.upgrade(None) # None = all
+        _plan_full_upgrades(plan, [mgr for mgr in manager.get_all_managers() if mgr.is_available()], args.force)
+        if plan:
+            plan.show()
+            code = plan.execute(jobs=args.jobs)
+            if code:
+                log_error("Upgrade finished with failures.")
+                sys.exit(code)
         log_success("Upgrade complete.")
         return
 
@@ -244,6 +314,8 @@ def cmd_upgrade(args: argparse.Namespace) -> None:
     # Or specific packages
     packages_map: Dict[str, List[str]] = {}
     providers_full = []
+    # Installed packages by provider, only fetched if a bare package name needs it
+    installed_in = None
     
     # Reuse simple logic or custom parsing?
     # Let's use simple manual parsing as resolve_packages forces default.
@@ -259,31 +331,37 @@ def cmd_upgrade(args: argparse.Namespace) -> None:
             if prov not in packages_map: packages_map[prov] = []
             packages_map[prov].append(pkg)
         else:
-            # Default fallback for upgrade? 
-            # Assume 'nixpkgs' as default for upgrade context if not specified? 
-            # Or should we warn?
-            # Existing behavior was defaulting to nixpkgs.
-            prov = 'nixpkgs'
+            # Upgrade it where it is installed, if the inventory knows exactly one provider.
+            # Otherwise keep the historical default of nixpkgs.
+            if installed_in is None:
+                installed_in = inventory.snapshot(manager.get_all_managers())
+            owners = [name for name, pkgs in installed_in.items()
+                      if any(arg in (p.get('name'), p.get('id')) for p in pkgs)]
+            prov = owners[0] if len(owners) == 1 else 'nixpkgs'
             if prov not in packages_map: packages_map[prov] = []
             packages_map[prov].append(arg)
 
-    # Execute full upgrades
-    for prov in providers_full:
-        mgr = _get_manager_or_warn(prov)
-        if mgr and mgr.is_available():
-            log_task(f"Upgrading all packages in {prov}...")
-            mgr.upgrade(None)
-
-    # Execute package specific upgrades
+    # A full upgrade of a provider covers any package-specific one
+    full = [manager.get_manager(prov) for prov in dict.fromkeys(providers_full)]
+    for mgr in full:
+        if not mgr.is_available():
+            # Left to the plan, which reports it
+            plan.add(mgr.name, "upgrade", None)
+    _plan_full_upgrades(plan, [mgr for mgr in full if mgr.is_available()], args.force)
     for prov, pkgs in packages_map.items():
-        mgr = _get_manager_or_warn(prov)
-        if mgr and mgr.is_available():
-            log_task(f"Upgrading specific packages in {prov}...")
-            mgr.upgrade(pkgs)
+        plan.add(prov, "upgrade", pkgs)
 
-    if not packages_map and not providers_full:
-        log_warn("No packages or providers specified for upgrade.")
+    if not plan:
+        if providers_full:
+            log_success("Everything is up to date.")
+        else:
+            log_warn("No packages or providers specified for upgrade.")
     else:
+        plan.show()
+        code = plan.execute(jobs=args.jobs)
+        if code:
+            log_error("Upgrade finished with failures.")
+            sys.exit(code)
         log_success("Upgrade process finished.")
 
 def cmd_list(args: argparse.Namespace) -> None:
@@ -306,54 +384,308 @@ def cmd_list(args: argparse.Namespace) -> None:
         log_warn("No package managers found.")
         return
 
-    first = True
-    for mgr in managers_to_list:
-        if not mgr.is_available():
+    available = [mgr for mgr in managers_to_list if mgr.is_available()]
+    if not available:
+        log_warn("No available package managers to list.")
+        return
+
+    out = Renderer.get_instance()
+    if args.output:
+        out.start_records()
+
+    log_task(f"Fetching packages from {', '.join(mgr.name for mgr in available)}...")
+    start = time.monotonic()
+    total = 0
+
+    # Providers are queried concurrently; each section is written whole, as soon as it arrives
+    for name, pkgs in inventory.iter_snapshot(available):
+        total += len(pkgs)
+        if args.output:
+            for pkg in pkgs:
+                out.record(pkg)
+            out.flush()
             continue
 
-        if not first:
-            print()
-        first = False
-            
-        log_task(f"Fetching packages from {mgr.name}...")
-        pkgs = mgr.list_packages()
-        
+        lines = [""]
         if pkgs:
-            print(f"{Style.BOLD}{Style.INFO}:: {mgr.name} ({len(pkgs)}){Style.RESET}")
+            lines.append(f"{Style.BOLD}{Style.INFO}:: {name} ({len(pkgs)}){Style.RESET}")
             for pkg in pkgs:
                 # support various keys
-                name = pkg.get('name', 'unknown')
+                pkg_name = pkg.get('name', 'unknown')
                 extra = pkg.get('version') or pkg.get('id') or pkg.get('origin') or ''
-                print(f"  {Style.SUCCESS}•{Style.RESET} {Style.BOLD}{name}{Style.RESET} {Style.DIM}({extra}){Style.RESET}")
+                lines.append(f"  {Style.SUCCESS}•{Style.RESET} {Style.BOLD}{pkg_name}{Style.RESET} {Style.DIM}({extra}){Style.RESET}")
         else:
-             print(f"{Style.DIM}No packages found in {mgr.name}{Style.RESET}")
+            lines.append(f"{Style.DIM}No packages found in {name}{Style.RESET}")
+        out.lines(lines)
+        out.flush()
+
+    if args.output:
+        out.end_records()
+    else:
+        out.line()
+    log_info(f"Listed {total} packages from {len(available)} providers in {time.monotonic() - start:.2f}s")
+
+def cmd_apply(args: argparse.Namespace) -> None:
+    manager = ModuleManager.get_instance()
+    start = time.monotonic()
+
+    try:
+        desired = apply.read_manifest(args.manifest)
+    except OSError as e:
+        log_error(f"Can't read manifest: {e}")
+        sys.exit(1)
+    except apply.ManifestError as e:
+        log_error(str(e))
+        sys.exit(1)
+
+    lock_path = args.lock or apply.lock_path(args.manifest)
+    locked = apply.read_lock(lock_path)
+
+    managers = {}
+    skipped = set()
+    for prov in dict.fromkeys(list(desired) + list(locked)):
+        mgr = manager.get_manager(prov)
+        if not mgr:
+            if prov in desired:
+                log_error(f"Unknown provider '{prov}' in {args.manifest}.")
+                sys.exit(1)
+            continue
+        if not mgr.is_available():
+            log_warn(f"{prov} is not available here, leaving its packages alone.")
+            skipped.add(prov)
+            continue
+        managers[prov] = mgr
+
+    log_task(f"Comparing {args.manifest} with the installed packages...")
+    installed = inventory.snapshot(list(managers.values()))
+    to_install, to_remove = apply.diff(desired, locked, installed, managers)
+
+    plan = Plan(manager)
+    for prov, pkgs in to_remove.items():
+        plan.add(prov, "remove", pkgs)
+    for prov, pkgs in to_install.items():
+        plan.add(prov, "install", pkgs)
+
+    code = 0
+    if plan:
+        plan.show()
+        if args.dry_run:
+            log_info("Dry run, nothing was changed.")
+            return
+        # A failed step still locks what did get installed; an abort exits right away
+        code = plan.execute(jobs=args.jobs)
+        # The steps dropped the affected inventory slices: this re-reads only those
+        installed = inventory.snapshot(list(managers.values()))
+    else:
+        log_info("Nothing to do, the installed packages already match.")
+
+    packages, unresolved = apply.resolve(desired, installed, managers)
+    for prov in skipped:
+        # Not our business on this machine, but another one may still track them
+        if prov in locked:
+            packages[prov] = locked[prov]
+    for entry in unresolved:
+        log_warn(f"{entry} is not installed.")
+
+    if not args.dry_run and apply.write_lock(lock_path, packages):
+        log_info(f"Wrote {lock_path}")
+
+    if code or unresolved:
+        log_error(f"Applied {args.manifest} with failures.")
+        sys.exit(code or 1)
+    log_success(f"Applied {args.manifest} in {time.monotonic() - start:.2f}s")
+
+def cmd_outdated(args: argparse.Namespace) -> None:
+    manager = ModuleManager.get_instance()
+
+    if args.type:
+        mgr = _get_manager_or_warn(args.type)
+        if not mgr:
+            return
+        managers = [mgr]
+    else:
+        managers = manager.get_all_managers()
+
+    available = [mgr for mgr in managers if mgr.is_available()]
+    if not available:
+        log_warn("No available package managers to check.")
+        return
+
+    out = Renderer.get_instance()
+    if args.output:
+        out.start_records()
+
+    log_task(f"Checking {', '.join(mgr.name for mgr in available)} for outdated packages...")
+    total = 0
+
+    # Checked concurrently (these mostly wait on the network); each section printed as it arrives
+    for mgr, stale in _iter_outdated(available):
+        if stale is None:
+            log_warn(f"Can't tell which packages are outdated in {mgr.name}.")
+            continue
+        total += len(stale)
+        if args.output:
+            for pkg in stale:
+                out.record(dict(pkg, provider=mgr.name))
+            out.flush()
+            continue
+
+        lines = [""]
+        if stale:
+            lines.append(f"{Style.BOLD}{Style.INFO}:: {mgr.name} ({len(stale)} outdated){Style.RESET}")
+            for pkg in stale:
+                if pkg.get('latest'):
+                    extra = f"{pkg.get('version')} → {pkg['latest']}"
+                else:
+                    extra = ", ".join(filter(None, [pkg.get('version'), pkg.get('detail')]))
+                lines.append(f"  {Style.SUCCESS}•{Style.RESET} {Style.BOLD}{pkg.get('name')}{Style.RESET} {Style.DIM}({extra}){Style.RESET}")
+        else:
+            lines.append(f"{Style.DIM}{mgr.name} is up to date{Style.RESET}")
+        out.lines(lines)
+        out.flush()
+
+    if args.output:
+        out.end_records()
+    else:
+        out.line()
+    if total:
+        log_info(f"{total} outdated packages. Run 'mixtura upgrade' to upgrade them.")
+    else:
+        log_success("Everything is up to date.")
+
+def _print_ranked(ranker: Ranker, term: str, header: str, args: argparse.Namespace, show_provider: bool) -> None:
+    shown, total = ranker.results()
+    if not shown:
+        log_warn(f"No results on page {args.page} ({total} matches in total).")
+        return
+
+    out = Renderer.get_instance()
+    if args.output:
+        for res in shown:
+            out.record(dict(res, query=term))
+        out.flush()
+        return
+
+    first = (args.page - 1) * args.limit + 1 if args.limit else 1
+    last = first + len(shown) - 1
+    lines = [f"{Style.BOLD}{header} ({first}-{last} of {total}):{Style.RESET}"]
+    for res in shown:
+        prefix = f"[{res.get('provider')}] " if show_provider else "• "
+        lines.append(f"  {prefix}{res.get('name')} ({res.get('version')}) - {res.get('description')}")
+    if last < total:
+        lines.append(f"  {Style.DIM}... {total - last} more, use --page {args.page + 1} or --limit to see them{Style.RESET}")
+    out.lines(lines)
+    out.flush()
 
 def cmd_search(args: argparse.Namespace) -> None:
     manager = ModuleManager.get_instance()
-    # If args.query is a list, we handle each.
-    # Note: argparse definition for 'search' usually takes 'query' as nargs='+'
-    
+
+    if args.page < 1 or args.limit < 0:
+        log_error("--page must be at least 1 and --limit can't be negative.")
+        return
+    # Collect every term first so each provider is asked once for the whole batch:
+    # plain terms go to all providers, 'prov#term' only to that provider.
+    plain: List[str] = []
+    per_provider: Dict[str, List[str]] = {}
+    for q in args.query:
+        if '#' in q:
+            prov, term = q.split('#', 1)
+            per_provider.setdefault(prov, []).append(term)
+        else:
+            plain.append(q)
+
+    provider_results: Dict[str, Dict[str, List[Dict]]] = {}
+    for prov, terms in per_provider.items():
+        mgr = _get_manager_or_warn(prov)
+        if mgr and mgr.is_available():
+            provider_results[prov] = manager.search_all_many(terms, deadline=args.timeout, managers=[mgr])
+
+    out = Renderer.get_instance()
+    if args.output:
+        out.start_records()
+
+    # Each provider's answer goes straight into the bounded rankings as it arrives,
+    # so only the shown page per term is kept, never every provider's full results
+    rankers = {q: Ranker(q, limit=args.limit, page=args.page) for q in plain}
+    if plain:
+        log_task("Searching for " + ", ".join(f"'{q}'" for q in rankers) + "...")
+        for position, _, results in manager.iter_search_many(plain, deadline=args.timeout):
+            for q, found in results.items():
+                if q in rankers:
+                    rankers[q].add(found, source=position)
+
     for q in args.query:
         if '#' in q:
              # Provider specific search
              prov, term = q.split('#', 1)
-             mgr = _get_manager_or_warn(prov)
-             if mgr and mgr.is_available():
-                 results = mgr.search(term)
-                 if results:
-                     print(f"{Style.BOLD}Results for '{term}' in {prov}:{Style.RESET}")
-                     for res in results:
-                         print(f"  • {res.get('name')} ({res.get('version')}) - {res.get('description')}")
-                 else:
-                     log_warn(f"No results for '{term}' in {prov}")
+             if prov not in provider_results:
+                 continue
+             ranker = Ranker(term, limit=args.limit, page=args.page)
+             # Records must say where they came from even when the provider was explicit
+             ranker.add(dict(res, provider=prov) for res in provider_results[prov].get(term, []))
+             if ranker.total:
+                 _print_ranked(ranker, term, f"Results for '{term}' in {prov}", args, show_provider=False)
+             else:
+                 log_warn(f"No results for '{term}' in {prov}")
         else:
-             # Search all
-             log_task(f"Searching for '{q}'...")
-             results = manager.search_all(q)
-             if results:
-                 print(f"{Style.BOLD}Results for '{q}':{Style.RESET}")
-                 for res in results:
-                      prov = res.get('provider')
-                      print(f"  [{prov}] {res.get('name')} ({res.get('version')}) - {res.get('description')}")
+             ranker = rankers[q]
+             if ranker.total:
+                 _print_ranked(ranker, q, f"Results for '{q}'", args, show_provider=True)
              else:
                  log_warn(f"No results for '{q}'")
+
+    if args.output:
+        out.end_records()
+
+def cmd_index(args: argparse.Namespace) -> None:
+    manager = ModuleManager.get_instance()
+
+    if args.provider:
+        mgr = _get_manager_or_warn(args.provider)
+        if not mgr:
+            return
+        managers = [mgr]
+    else:
+        managers = manager.get_all_managers()
+
+    found = False
+    for mgr in managers:
+        if not mgr.is_available():
+            continue
+
+        if args.action == "refresh":
+            log_task(f"Refreshing {mgr.name} index...")
+            try:
+                rebuilt = mgr.refresh_index(force=args.force)
+            except Exception as e:
+                log_error(f"Failed to refresh {mgr.name} index: {e}")
+                continue
+            if rebuilt is None:
+                continue
+            found = True
+            if rebuilt:
+                log_success(f"{mgr.name} index rebuilt.")
+            else:
+                log_info(f"{mgr.name} index is already up to date.")
+        else:
+            status = mgr.index_status()
+            if status is None:
+                continue
+            found = True
+            print(f"{Style.BOLD}{Style.INFO}:: {mgr.name}{Style.RESET}")
+            if not status.get("exists"):
+                print(f"  {Style.DIM}No index. Run 'mixtura index refresh {mgr.name}' to build one.{Style.RESET}")
+                continue
+            state = f"{Style.SUCCESS}current{Style.RESET}" if status.get("current") else f"{Style.WARNING}outdated{Style.RESET}"
+            for key, value in status.items():
+                if key in ("exists", "current"):
+                    continue
+                if key == "built_at" and value:
+                    value = time.strftime("%Y-%m-%d %H:%M", time.localtime(value))
+                elif key == "size":
+                    value = f"{value / (1024 * 1024):.1f} MiB"
+                print(f"  {Style.BOLD}{key}{Style.RESET}: {value}")
+            print(f"  {Style.BOLD}state{Style.RESET}: {state}")
+
+    if not found:
+        log_warn("No available provider keeps a local index.")
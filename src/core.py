@@ -1,11 +1,20 @@
+import os
 from abc import ABC, abstractmethod
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Hashable
 import argparse
+from probe import Probe, probe_binary
+from utils import path_fingerprint, read_json, write_json_atomic
 
 class PackageManager(ABC):
     """
     Abstract base class for all package manager modules.
     """
+
+    # Executable backing this provider (e.g. 'nix'), resolved through the probe layer.
+    binary: str = ""
+
+    # Seconds a search waits for this provider (and its processes) unless --timeout says otherwise.
+    search_timeout: float = 30.0
     
     @property
     @abstractmethod
@@ -36,6 +45,16 @@ class PackageManager(ABC):
         """
         pass
 
+    def outdated(self) -> Optional[List[Dict[str, Any]]]:
+        """
+        Installed packages that an upgrade would change. Each dict has 'name', 'id'
+        (what upgrade() takes), 'version' and 'latest' (None if the backend doesn't say),
+        optionally 'detail', and 'full_upgrade' when only upgrading the whole provider
+        updates it. None means the provider can't tell, so upgrades of it can't be
+        skipped; that is the default.
+        """
+        return None
+
     @abstractmethod
     def list_packages(self) -> List[Dict[str, Any]]:
         """
@@ -52,6 +71,69 @@ class PackageManager(ABC):
         """
         pass
 
+    def search_many(self, queries: List[str]) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Search for several queries at once, returning results per query.
+        The default runs `search` once per query; override it when the backend
+        can answer all of them in a single call or scan.
+        """
+        return {q: self.search(q) for q in dict.fromkeys(queries)}
+
+    def package_key(self, package: str) -> str:
+        """
+        Canonical spelling of a package argument, so requests naming the same
+        package differently are merged. Identity by default.
+        """
+        return package
+
+    def installed_names(self, package: str) -> List[str]:
+        """
+        Lowercased ids or names an installed record of `package` may carry, for
+        matching requested packages to the inventory. Its package_key by default.
+        """
+        return [self.package_key(package).lower()]
+
+    def probe(self) -> Probe:
+        """
+        Resolve the backend binary, version and capabilities.
+        Cached per process and on disk, so this is cheap to call repeatedly.
+        """
+        return probe_binary(self.binary, self.probe_capabilities, self.probe_fingerprint_files())
+
+    def probe_capabilities(self, path: str) -> Dict[str, Any]:
+        """
+        Discover backend capabilities given the absolute binary path.
+        Only called when the cached probe is stale. Override to add provider-specific data.
+        """
+        return {}
+
+    def probe_fingerprint_files(self) -> List[str]:
+        """Extra files whose mtime invalidates the cached capabilities (e.g. remote configs)."""
+        return []
+
+    def bin(self) -> str:
+        """Absolute path of the backend binary, falling back to the bare name."""
+        return self.probe().path or self.binary
+
+    def inventory_fingerprints(self) -> List[str]:
+        """
+        Paths whose state changes whenever packages are installed or removed (profile
+        links, install directories). The inventory snapshot re-runs list_packages only
+        when one of them changed; with none, it asks every time.
+        """
+        return []
+
+    def refresh_index(self, force: bool = False) -> Optional[bool]:
+        """
+        Rebuild the provider's local search index if its source changed (or `force`).
+        Returns True if rebuilt, False if already current, None if the provider has no index.
+        """
+        return None
+
+    def index_status(self) -> Optional[Dict[str, Any]]:
+        """Describe the provider's local search index, or None if it has no index."""
+        return None
+
     def setup_parser(self, parser: argparse.ArgumentParser) -> None:
         """
         Configure an argparse subparser for this package manager.
@@ -66,3 +148,142 @@ class PackageManager(ABC):
         """
         pass
 
+class CachedCatalog(ABC):
+    """
+    Searchable package catalog parsed from a provider's own metadata files.
+
+    Parsed once into compact records (lists) and cached as JSON under the XDG
+    cache, keyed by a fingerprint (path, target, mtime, size) of every source
+    file; any change to one of them rebuilds it. Subclasses name their sources
+    and say how to parse them, what to search and what a result looks like.
+    """
+
+    # Bump in a subclass when its record layout changes
+    cache_version: int = 1
+
+    def __init__(self, cache_path: str):
+        self.cache_path = cache_path
+        self._records: Optional[List[List[Any]]] = None
+        self._haystacks: List[str] = []
+        # Whether the last load() had to re-parse the sources
+        self.rebuilt = False
+
+    @abstractmethod
+    def sources(self) -> List[Any]:
+        """The source files to build from, as whatever parse() takes."""
+        pass
+
+    @abstractmethod
+    def source_path(self, source: Any) -> str:
+        """The file a source is read from."""
+        pass
+
+    @abstractmethod
+    def parse(self, source: Any) -> List[List[Any]]:
+        """Records of one source; may raise on unreadable or malformed files."""
+        pass
+
+    @abstractmethod
+    def haystack(self, record: List[Any]) -> str:
+        """The lowercased text search() matches against."""
+        pass
+
+    @abstractmethod
+    def to_result(self, record: List[Any]) -> Dict[str, Any]:
+        """A record as a search result."""
+        pass
+
+    def record_key(self, record: List[Any]) -> Optional[Hashable]:
+        """Identity of a record across sources: later duplicates are dropped. None keeps all."""
+        return None
+
+    def status_details(self, sources: List[Any]) -> Dict[str, Any]:
+        """Extra fields for status()."""
+        return {}
+
+    def available(self) -> bool:
+        return bool(self.sources())
+
+    def _fingerprint(self, sources: List[Any]) -> List[List[Any]]:
+        # path_fingerprint tolerates files vanishing between listing and stat
+        return [path_fingerprint(self.source_path(source)) for source in sources]
+
+    def load(self, force: bool = False) -> List[List[Any]]:
+        if self._records is not None and not force:
+            return self._records
+
+        sources = self.sources()
+        fingerprint = self._fingerprint(sources)
+
+        cached = read_json(self.cache_path, {})
+        self.rebuilt = False
+        if (not force and isinstance(cached, dict) and cached.get("version") == self.cache_version
+                and cached.get("fingerprint") == fingerprint):
+            records = cached.get("records", [])
+        else:
+            self.rebuilt = True
+            records = []
+            seen = set()
+            complete = True
+            for source in sources:
+                try:
+                    parsed = self.parse(source)
+                except Exception:
+                    complete = False
+                    continue
+                for record in parsed:
+                    key = self.record_key(record)
+                    if key is not None:
+                        if key in seen:
+                            continue
+                        seen.add(key)
+                    records.append(record)
+
+            # A partial catalog is used for this run, but not cached: the next one retries
+            if complete:
+                try:
+                    write_json_atomic(self.cache_path, {
+                        "version": self.cache_version,
+                        "fingerprint": fingerprint,
+                        "records": records,
+                    })
+                except OSError:
+                    pass
+
+        self._records = records
+        self._haystacks = [self.haystack(record) for record in records]
+        return records
+
+    def status(self) -> Dict[str, Any]:
+        sources = self.sources()
+        cached = read_json(self.cache_path, {})
+        if not isinstance(cached, dict) or not cached.get("records"):
+            return {"exists": False, "path": self.cache_path, "sources": len(sources)}
+        try:
+            size = os.path.getsize(self.cache_path)
+        except OSError:
+            size = 0
+        return dict({
+            "exists": True,
+            "path": self.cache_path,
+            "sources": len(sources),
+            "packages": len(cached["records"]),
+            "current": cached.get("version") == self.cache_version
+                and cached.get("fingerprint") == self._fingerprint(sources),
+            "size": size,
+        }, **self.status_details(sources))
+
+    def search(self, query: str) -> List[Dict[str, Any]]:
+        """Case-insensitive substring match over each record's haystack."""
+        return self.search_many([query])[query]
+
+    def search_many(self, queries: List[str]) -> Dict[str, List[Dict[str, Any]]]:
+        """Matches every query in a single pass over the records."""
+        records = self.load()
+        needles = [(q, q.lower()) for q in dict.fromkeys(queries)]
+        found: Dict[str, List[Dict[str, Any]]] = {q: [] for q, _ in needles}
+        for record, haystack in zip(records, self._haystacks):
+            for query, needle in needles:
+                if needle in haystack:
+                    found[query].append(self.to_result(record))
+        return found
@@ -0,0 +1,202 @@
+import os
+import time
+import queue
+import threading
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+from core import PackageManager
+from utils import cache_dir, command_group, log_warn, on_mutation, path_fingerprint, read_json, write_json_atomic
+from ranking import FUZZY_CUTOFF
+
+# Bump when the record layout changes
+SNAPSHOT_VERSION = 1
+
+# Provider name -> slice ({fingerprint, group, updated, packages}), as persisted
+_slices: Optional[Dict[str, Dict[str, Any]]] = None
+_lock = threading.Lock()
+
+def _snapshot_path() -> str:
+    return os.path.join(cache_dir(), "inventory.json")
+
+def _load() -> Dict[str, Dict[str, Any]]:
+    global _slices
+    if _slices is None:
+        data = read_json(_snapshot_path(), {})
+        if isinstance(data, dict) and data.get("version") == SNAPSHOT_VERSION:
+            _slices = data.get("providers") or {}
+        else:
+            _slices = {}
+    return _slices
+
+def _save() -> None:
+    try:
+        write_json_atomic(_snapshot_path(), {"version": SNAPSHOT_VERSION, "providers": _slices})
+    except OSError:
+        pass
+
+def _record(provider: str, pkg: Dict[str, Any]) -> Dict[str, Any]:
+    """Inventory record: provider, name, id, version and origin, plus whatever else the provider reported."""
+    record = dict(pkg)
+    name = pkg.get("name") or pkg.get("id") or "unknown"
+    record.update({
+        "provider": provider,
+        "name": name,
+        "id": pkg.get("id") or name,
+        "version": pkg.get("version") or "unknown",
+        "origin": pkg.get("origin") or "",
+    })
+    return record
+
+def packages(mgr: PackageManager, refresh: bool = False) -> List[Dict[str, Any]]:
+    """
+    Installed packages of one provider. Answered from the on-disk snapshot while the
+    provider's inventory fingerprint (PackageManager.inventory_fingerprints) is
+    unchanged; otherwise list_packages() is asked and the snapshot updated.
+    Returns copies, callers may annotate them.
+    """
+    paths = mgr.inventory_fingerprints()
+    fingerprint = [path_fingerprint(p) for p in paths]
+
+    with _lock:
+        cached = _load().get(mgr.name)
+    if (not refresh and paths and cached and cached.get("fingerprint") == fingerprint
+            and cached.get("packages")):
+        return [dict(p) for p in cached["packages"]]
+
+    records = [_record(mgr.name, pkg) for pkg in mgr.list_packages()]
+
+    with _lock:
+        slices = _load()
+        if records and paths:
+            slices[mgr.name] = {
+                "fingerprint": fingerprint,
+                "group": command_group([mgr.binary]),
+                "updated": time.time(),
+                "packages": records,
+            }
+        else:
+            # An empty answer may be a failed query; it is cheap to ask again
+            slices.pop(mgr.name, None)
+        _save()
+
+    return [dict(p) for p in records]
+
+def iter_snapshot(managers: List[PackageManager], refresh: bool = False) -> Iterator[Tuple[str, List[Dict[str, Any]]]]:
+    """
+    (provider name, installed packages) of every given (available) provider, yielded
+    as each one is ready: providers are asked concurrently, so slow backends don't
+    hold back the others. A provider that fails is reported and yields no packages.
+    """
+    available = [mgr for mgr in managers if mgr.is_available()]
+    if len(available) < 2:
+        for mgr in available:
+            try:
+                yield mgr.name, packages(mgr, refresh)
+            except Exception as e:
+                log_warn(f"Failed to list packages from {mgr.name}: {e}")
+                yield mgr.name, []
+        return
+
+    finished: "queue.Queue" = queue.Queue()
+
+    def _worker(mgr: PackageManager) -> None:
+        try:
+            finished.put((mgr.name, packages(mgr, refresh), None))
+        except Exception as e:
+            finished.put((mgr.name, [], e))
+
+    for mgr in available:
+        threading.Thread(target=_worker, args=(mgr,), daemon=True).start()
+
+    for _ in available:
+        name, pkgs, error = finished.get()
+        if error is not None:
+            log_warn(f"Failed to list packages from {name}: {error}")
+        yield name, pkgs
+
+def snapshot(managers: List[PackageManager], refresh: bool = False) -> Dict[str, List[Dict[str, Any]]]:
+    """Installed packages of every given (available) provider, by provider name, in the given order."""
+    found = dict(iter_snapshot(managers, refresh))
+    return {mgr.name: found[mgr.name] for mgr in managers if mgr.name in found}
+
+class InventoryIndex:
+    """
+    Substring and fuzzy lookup over installed packages' names and ids.
+
+    Every trigram of the lowercased name and id maps to the records containing it.
+    A term intersects the postings of its trigrams (rarest first) and only the
+    surviving candidates are verified; terms shorter than a trigram are scanned.
+    """
+
+    def __init__(self, records: List[Dict[str, Any]]):
+        self.records = records
+        self._keys: List[str] = []
+        self._grams: Dict[str, Set[int]] = {}
+        for i, record in enumerate(records):
+            key = f"{record.get('name', '')}\n{record.get('id', '')}".lower()
+            self._keys.append(key)
+            for gram in set(self._trigrams(key)):
+                if "\n" not in gram:
+                    self._grams.setdefault(gram, set()).add(i)
+
+    def _trigrams(self, term: str) -> List[str]:
+        return [term[i:i + 3] for i in range(len(term) - 2)]
+
+    def search(self, term: str) -> List[Dict[str, Any]]:
+        """Records whose name or id contains `term` (case-insensitive), in inventory order."""
+        term = term.lower()
+        if not term:
+            return []
+        if len(term) < 3:
+            # Matches most of the inventory anyway: no index can beat a scan here
+            hits = {i for i, key in enumerate(self._keys) if term in key}
+        else:
+            postings = sorted((self._grams.get(g, set()) for g in self._trigrams(term)), key=len)
+            hits = set(postings[0]).intersection(*postings[1:])
+            hits = {i for i in hits if term in self._keys[i]}
+        return [self.records[i] for i in sorted(hits)]
+
+    def fuzzy(self, term: str, cutoff: float = FUZZY_CUTOFF, limit: int = 10) -> List[Dict[str, Any]]:
+        """
+        Closest names for a term that matched nothing (typos): only records sharing
+        at least a third of the term's trigrams are scored, with difflib.
+        """
+        import difflib
+        term = term.lower()
+        shared: Dict[int, int] = {}
+        trigrams = set(self._trigrams(term))
+        for gram in trigrams:
+            for i in self._grams.get(gram, ()):
+                shared[i] = shared.get(i, 0) + 1
+
+        needed = max(1, len(trigrams) // 3)
+        scored = []
+        for i, count in shared.items():
+            if count < needed:
+                continue
+            name = (self.records[i].get("name") or "").lower()
+            ratio = difflib.SequenceMatcher(None, term, name).ratio()
+            if ratio >= cutoff:
+                scored.append((-ratio, i))
+        return [self.records[i] for _, i in sorted(scored)[:limit]]
+
+def invalidate(provider: Optional[str] = None) -> None:
+    """Drops the slice of one provider, or the whole snapshot."""
+    with _lock:
+        slices = _load()
+        if provider is None:
+            slices.clear()
+        else:
+            slices.pop(provider, None)
+        _save()
+
+def _forget_group(group: str) -> None:
+    # A mutation through utils.run(): whatever that backend had installed is now unknown
+    with _lock:
+        slices = _load()
+        stale = [name for name, s in slices.items() if s.get("group") == group]
+        for name in stale:
+            del slices[name]
+        if stale:
+            _save()
+
+on_mutation(_forget_group)
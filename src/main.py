@@ -1,16 +1,14 @@
 import argparse
 import sys
-import hashlib
 import os
-import subprocess
-import urllib.request
-import json
-import base64
-import ssl
+import time
 
+# Network, hashing and threading modules are imported inside the update helpers:
+# they are only needed when the cached update state is stale or the binary changed.
 
-from utils import Style
-from commands import cmd_add, cmd_remove, cmd_upgrade, cmd_list, cmd_search
+
+from utils import Renderer, Style, cache_dir, env_number, read_json, write_json_atomic
+from commands import cmd_add, cmd_remove, cmd_upgrade, cmd_apply, cmd_outdated, cmd_list, cmd_search, cmd_index
 from manager import ModuleManager
 
 class ColoredHelpFormatter(argparse.RawDescriptionHelpFormatter):
@@ -25,98 +23,198 @@ class ColoredHelpFormatter(argparse.RawDescriptionHelpFormatter):
         prefix = f"{Style.BOLD}{Style.SUCCESS}{prefix}{Style.RESET}"
         return super()._format_usage(usage, actions, groups, prefix)
 
-def check_for_updates():
-    """Checks if there is a new version available by comparing hashes."""
-    # Only check if running as a compiled executable (Nuitka)
-    #if not getattr(sys, 'frozen', False):
-    #    return
-
-    github_hash_url = "https://api.github.com/repos/miguel-b-p/mixtura/contents/bin/HASH"
+GITHUB_HASH_URL = os.environ.get(
+    "MIXTURA_UPDATE_URL",
+    "https://api.github.com/repos/miguel-b-p/mixtura/contents/bin/HASH"
+)
+UPDATE_BINARY_URL = "https://raw.githubusercontent.com/miguel-b-p/mixtura/master/bin/mixtura"
+
+# How often (seconds) the remote hash is re-fetched. 0 forces a check on every run.
+UPDATE_TTL = env_number("MIXTURA_UPDATE_TTL", 24 * 60 * 60)
+# How long (seconds) to wait after a failed check (offline, rate limited) before trying again.
+UPDATE_RETRY = 60 * 60
+# How long (seconds) we are willing to wait on exit for a pending background check.
+# A check that doesn't make it is abandoned and counts as failed (see UPDATE_RETRY).
+UPDATE_JOIN_TIMEOUT = 0.2
+
+_update_thread = None
+
+def _update_state_path() -> str:
+    return os.path.join(cache_dir(), "update.json")
+
+def _local_hash(executable_path: str, state: dict) -> str:
+    """
+    SHA-256 of the running binary, cached in `state` by (inode, size, mtime)
+    so the onefile executable is only re-read after it actually changed.
+    """
+    st = os.stat(executable_path)
+    key = [st.st_ino, st.st_size, st.st_mtime_ns]
+
+    cached = state.get("local") or {}
+    if cached.get("key") == key and cached.get("hash"):
+        return cached["hash"]
+
+    import hashlib
+
+    sha256_hash = hashlib.sha256()
+    with open(executable_path, "rb") as f:
+        for byte_block in iter(lambda: f.read(1024 * 1024), b""):
+            sha256_hash.update(byte_block)
+
+    state["local"] = {"key": key, "hash": sha256_hash.hexdigest()}
+    return state["local"]["hash"]
+
+def _fetch_remote_hash(state: dict) -> None:
+    """
+    Refreshes state['remote'] from GitHub. The request carries the last ETag,
+    so an unchanged HASH file costs a bodyless 304 reply.
+    Runs in a background thread; every failure is swallowed and recorded as
+    state['failed_at'], which holds off the next attempt for UPDATE_RETRY.
+    """
     try:
-        # 1. Calculate local hash using system command
-        executable_path = os.path.join(os.path.dirname(sys.argv[0])) + "/mixtura"
-        # print("executable path:", executable_path)
-
-        # Use hashlib
-        sha256_hash = hashlib.sha256()
-        with open(executable_path, "rb") as f:
-            for byte_block in iter(lambda: f.read(4096), b""):
-                sha256_hash.update(byte_block)
-        local_hash = sha256_hash.hexdigest()
-
+        import base64
+        import json
+        import ssl
+        import urllib.request
+        import urllib.error
 
-        # 2. Fetch remote hash
         ctx = ssl.create_default_context()
         ctx.check_hostname = False
         ctx.verify_mode = ssl.CERT_NONE
 
-        req = urllib.request.Request(github_hash_url)
-        with urllib.request.urlopen(req, context=ctx) as response:
-            data = json.loads(response.read().decode())
-            content = data.get("content", "")
-            remote_hash = base64.b64decode(content).decode().strip()
+        req = urllib.request.Request(GITHUB_HASH_URL)
+        if state.get("etag"):
+            req.add_header("If-None-Match", state["etag"])
+
+        try:
+            with urllib.request.urlopen(req, context=ctx, timeout=10) as response:
+                data = json.loads(response.read().decode())
+                content = data.get("content", "")
+                state["remote"] = base64.b64decode(content).decode().strip()
+                state["etag"] = response.headers.get("ETag")
+        except urllib.error.HTTPError as e:
+            if e.code != 304:
+                raise
+
+        state["checked_at"] = time.time()
+        state.pop("failed_at", None)
+    except Exception:
+        # Fail silently on network errors or other issues to not disrupt usage, but
+        # remember the attempt so offline runs don't start (and wait on) a fetch every time
+        state["failed_at"] = time.time()
 
-        # print("local hash:", local_hash)
-        # print("remote hash:", remote_hash)
+    try:
+        write_json_atomic(_update_state_path(), state)
+    except OSError:
+        pass
+
+def _self_update(executable_path: str) -> None:
+    import urllib.request
+
+    print(f"{Style.INFO}Downloading update...{Style.RESET}")
+
+    try:
+        # Download new binary
+        with urllib.request.urlopen(UPDATE_BINARY_URL) as response:
+            new_content = response.read()
+
+        # Write to a temp file first
+        temp_path = executable_path + ".tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(new_content)
+
+        # Make executable
+        os.chmod(temp_path, 0o755)
+
+        # Atomically replace (this works on Linux even if file is busy)
+        os.replace(temp_path, executable_path)
+
+        print(f"{Style.SUCCESS}Update successful! Please restart Mixtura.{Style.RESET}")
+        sys.exit(0)
 
-        # 3. Compare
-        if local_hash.lower() != remote_hash.lower():
-            print(f"{Style.BOLD}{Style.WARNING}NOTICE: A new version of Mixtura is available!{Style.RESET}")
-            
-            # Interactive update
-            try:
-                choice = input(f"Do you want to update to the latest version? ({Style.BOLD}y/N{Style.RESET}): ")
-            except EOFError:
-                choice = 'n'
-
-            if choice.lower() == 'y':
-                print(f"{Style.INFO}Downloading update...{Style.RESET}")
-                update_url = "https://raw.githubusercontent.com/miguel-b-p/mixtura/master/bin/mixtura"
-                
-                try:
-                    # Download new binary
-                    with urllib.request.urlopen(update_url) as response:
-                        new_content = response.read()
-                    
-                    # Write to a temp file first
-                    temp_path = executable_path + ".tmp"
-                    with open(temp_path, 'wb') as f:
-                        f.write(new_content)
-                    
-                    # Make executable
-                    os.chmod(temp_path, 0o755)
-                    
-                    # Atomically replace (this works on Linux even if file is busy)
-                    os.replace(temp_path, executable_path)
-                    
-                    print(f"{Style.SUCCESS}Update successful! Please restart Mixtura.{Style.RESET}")
-                    sys.exit(0)
-                    
-                except Exception as e:
-                    print(f"{Style.ERROR}Update failed: {e}{Style.RESET}")
-            else:
-                 print(f"Update skipped.")
-                 print()
-            
     except Exception as e:
-        # Fail silently on network errors or other issues to not disrupt usage
-        # print(e)
+        print(f"{Style.ERROR}Update failed: {e}{Style.RESET}")
+
+def check_for_updates():
+    """
+    Checks if there is a new version available by comparing hashes.
+
+    The comparison uses the last known remote hash from the XDG cache, so it
+    never waits on the network. When that state is older than UPDATE_TTL a
+    background thread refreshes it for the next run.
+    """
+    global _update_thread
+
+    try:
+        executable_path = os.path.join(os.path.dirname(sys.argv[0])) + "/mixtura"
+        state_path = _update_state_path()
+        state = read_json(state_path, {})
+        if not isinstance(state, dict):
+            state = {}
+
+        previous_local = state.get("local")
+        local_hash = _local_hash(executable_path, state)
+        if state.get("local") != previous_local:
+            write_json_atomic(state_path, state)
+
+        now = time.time()
+        if (now - state.get("checked_at", 0) >= UPDATE_TTL
+                and now - state.get("failed_at", 0) >= min(UPDATE_RETRY, UPDATE_TTL)):
+            import threading
+            # Recorded as failed until the fetch says otherwise: a fetch cut short by our
+            # exit must not be restarted (and cut short again) on every run
+            try:
+                write_json_atomic(state_path, dict(state, failed_at=now))
+            except OSError:
+                pass
+            _update_thread = threading.Thread(target=_fetch_remote_hash, args=(dict(state),), daemon=True)
+            _update_thread.start()
+
+        remote_hash = state.get("remote")
+        if not remote_hash or local_hash.lower() == remote_hash.lower():
+            return
+
+        if not (sys.stdin.isatty() and sys.stdout.isatty()):
+            # Nobody to ask, and the notice would end up in piped output
+            return
+
+        print(f"{Style.BOLD}{Style.WARNING}NOTICE: A new version of Mixtura is available!{Style.RESET}")
+
+        # Interactive update
+        try:
+            choice = input(f"Do you want to update to the latest version? ({Style.BOLD}y/N{Style.RESET}): ")
+        except EOFError:
+            choice = 'n'
+
+        if choice.lower() == 'y':
+            _self_update(executable_path)
+        else:
+            print(f"Update skipped.")
+            print()
+
+    except Exception:
+        # Fail silently (e.g. not running as the compiled binary) to not disrupt usage
         pass
 
-def main() -> None:
-    check_for_updates()
+def finish_update_check() -> None:
+    """Gives a pending background check a short grace period before the process exits."""
+    if _update_thread is not None:
+        _update_thread.join(UPDATE_JOIN_TIMEOUT)
 
-    # Ensure modules are discovered
-    manager = ModuleManager.get_instance()
-    available_managers = manager.get_all_managers()
-    
+def _has_custom_commands(mgr) -> bool:
+    """Whether the provider's setup_parser adds any arguments of its own."""
+    temp_parser = argparse.ArgumentParser(add_help=False)
+    mgr.setup_parser(temp_parser)
+    return len(temp_parser._actions) > 0
+
+def _build_epilog(available_managers) -> str:
     # Build list of manager names for help
     mgr_names = [m.name for m in available_managers if m.is_available()]
     mgr_help_str = "\n".join([f"  {Style.BOLD}{name}{Style.RESET}" for name in mgr_names])
     if not mgr_help_str:
         mgr_help_str = "  (none installed)"
 
-    main_epilog = f"""
+    return f"""
 {Style.BOLD}{Style.MAIN}Available Managers:{Style.RESET}
 {mgr_help_str}
 
@@ -133,26 +231,27 @@ def main() -> None:
   {Style.SUCCESS}#{Style.RESET} Search for packages
   {Style.DIM}$ mixtura search "web browser" flatpak#spotify{Style.RESET}
 
+  {Style.SUCCESS}#{Style.RESET} Build the local nixpkgs search index
+  {Style.DIM}$ mixtura index refresh nixpkgs{Style.RESET}
+
   {Style.SUCCESS}#{Style.RESET} Upgrade all packages
   {Style.DIM}$ mixtura upgrade{Style.RESET}
 
+  {Style.SUCCESS}#{Style.RESET} Show packages with available upgrades
+  {Style.DIM}$ mixtura outdated{Style.RESET}
+
+  {Style.SUCCESS}#{Style.RESET} Make this machine match a package manifest
+  {Style.DIM}$ mixtura apply packages.txt{Style.RESET}
+
   {Style.SUCCESS}#{Style.RESET} Run manager specific commands
   {Style.DIM}$ mixtura nixpkgs --gc{Style.RESET}
 """
 
-    parser = argparse.ArgumentParser(
-        prog="mixtura",
-        description=f"""
-{Style.ASCII}
-{Style.BOLD}Mixed together. Running everywhere.{Style.RESET}
-""",
-        epilog=main_epilog,
-        formatter_class=ColoredHelpFormatter
-    )
-
-    sub = parser.add_subparsers(dest="command", required=True, title="available commands")
+# -----------------------------------------------------------------------------
+# Subcommand definitions
+# -----------------------------------------------------------------------------
 
-    # ADD
+def _setup_add(sub) -> None:
     p_add = sub.add_parser(
         "add", 
         help="Installs packages from Nix or Flatpak",
@@ -164,9 +263,21 @@ def main() -> None:
         nargs="+", 
         help="Package names. E.g. 'git', 'nixpkgs#vim', 'flatpak#Spotify'"
     )
+    p_add.add_argument(
+        "--timeout",
+        type=float,
+        help="Seconds each provider may search before it is stopped (default: its own limit, at most 60)"
+    )
+    p_add.add_argument(
+        "--limit",
+        type=int,
+        default=20,
+        help="Matches shown per page when choosing a package (default: 20, 0 = all)"
+    )
+    _add_jobs_option(p_add)
     p_add.set_defaults(func=cmd_add)
 
-    # UPGRADE
+def _setup_upgrade(sub) -> None:
     p_upgrade = sub.add_parser(
         "upgrade", 
         help="Upgrades installed packages", 
@@ -178,9 +289,54 @@ def main() -> None:
         nargs="*", 
         help="Specific packages to upgrade, or 'nixpkgs'/'flatpak' to upgrade all of that type. Empty = upgrade all."
     )
+    p_upgrade.add_argument(
+        "--force",
+        action="store_true",
+        help="Upgrade whole providers without checking which packages are outdated"
+    )
+    _add_jobs_option(p_upgrade)
     p_upgrade.set_defaults(func=cmd_upgrade)
 
-    # REMOVE
+def _setup_apply(sub) -> None:
+    p_apply = sub.add_parser(
+        "apply",
+        help="Installs and removes packages to match a manifest",
+        description="Makes the installed packages match a manifest of 'provider#package' lines, "
+                    "changing only what differs, and records the result in a lockfile.",
+        formatter_class=ColoredHelpFormatter
+    )
+    p_apply.add_argument(
+        "manifest",
+        help="Manifest file, one 'provider#package' per line ('#' starts a comment line)"
+    )
+    p_apply.add_argument(
+        "--lock",
+        help="Lockfile to read and write (default: <manifest>.lock)"
+    )
+    p_apply.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Only show what would be installed and removed"
+    )
+    _add_jobs_option(p_apply)
+    p_apply.set_defaults(func=cmd_apply)
+
+def _setup_outdated(sub) -> None:
+    p_outdated = sub.add_parser(
+        "outdated",
+        help="Lists packages with available upgrades",
+        description="Lists installed packages that 'mixtura upgrade' would upgrade.",
+        formatter_class=ColoredHelpFormatter
+    )
+    p_outdated.add_argument(
+        "type",
+        nargs="?",
+        help="Optional: only check this provider"
+    )
+    _add_output_options(p_outdated)
+    p_outdated.set_defaults(func=cmd_outdated)
+
+def _setup_remove(sub) -> None:
     p_remove = sub.add_parser(
         "remove", 
         help="Removes packages",
@@ -192,9 +348,44 @@ def main() -> None:
         nargs="+", 
         help="Package names to remove. E.g. 'git', 'flatpak#Spotify'"
     )
+    _add_jobs_option(p_remove)
     p_remove.set_defaults(func=cmd_remove)
 
-    # LIST
+def _positive_int(value: str) -> int:
+    try:
+        number = int(value)
+    except ValueError:
+        number = 0
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"expected a whole number of at least 1, got '{value}'")
+    return number
+
+def _add_jobs_option(parser) -> None:
+    parser.add_argument(
+        "-j", "--jobs",
+        type=_positive_int,
+        default=1,
+        help="Providers to run at the same time, with prefixed output (default: 1)"
+    )
+
+def _add_output_options(parser) -> None:
+    fmt = parser.add_mutually_exclusive_group()
+    fmt.add_argument(
+        "--json",
+        dest="output",
+        action="store_const",
+        const="json",
+        help="Print results as a JSON array, one object per package"
+    )
+    fmt.add_argument(
+        "--ndjson",
+        dest="output",
+        action="store_const",
+        const="ndjson",
+        help="Print results as newline-delimited JSON, one object per line"
+    )
+
+def _setup_list(sub) -> None:
     p_list = sub.add_parser(
         "list", 
         help="Lists installed packages", 
@@ -206,9 +397,10 @@ def main() -> None:
         choices=["nixpkgs", "flatpak"], 
         help="Optional: filter list by 'nixpkgs' or 'flatpak'"
     )
+    _add_output_options(p_list)
     p_list.set_defaults(func=cmd_list)
 
-    # SEARCH
+def _setup_search(sub) -> None:
     p_search = sub.add_parser(
         "search", 
         help="Searches for packages",
@@ -220,32 +412,143 @@ def main() -> None:
         nargs="+", 
         help="Search terms. Use 'flatpak#term' to search Flathub. Default is Nixpkgs."
     )
+    p_search.add_argument(
+        "--timeout",
+        type=float,
+        help="Seconds each provider may search before it is stopped and partial results are shown (default: its own limit, at most 60)"
+    )
+    p_search.add_argument(
+        "--limit",
+        type=int,
+        default=20,
+        help="Results per page, best matches first (default: 20, 0 = all)"
+    )
+    p_search.add_argument(
+        "--page",
+        type=int,
+        default=1,
+        help="Page of results to show (default: 1)"
+    )
+    _add_output_options(p_search)
     p_search.set_defaults(func=cmd_search)
 
+def _setup_index(sub) -> None:
+    p_index = sub.add_parser(
+        "index",
+        help="Manages local search indexes",
+        description="Builds or inspects the local package indexes used by search.",
+        formatter_class=ColoredHelpFormatter
+    )
+    p_index.add_argument(
+        "action",
+        choices=["refresh", "status"],
+        help="'refresh' rebuilds indexes whose source changed, 'status' reports them"
+    )
+    p_index.add_argument(
+        "provider",
+        nargs="?",
+        help="Optional: only this provider (e.g. 'nixpkgs')"
+    )
+    p_index.add_argument(
+        "--force",
+        action="store_true",
+        help="Rebuild even if the index is up to date"
+    )
+    p_index.set_defaults(func=cmd_index)
+
+# Built-in subcommands, in the order they appear in --help
+COMMANDS = {
+    "add": _setup_add,
+    "upgrade": _setup_upgrade,
+    "outdated": _setup_outdated,
+    "apply": _setup_apply,
+    "remove": _setup_remove,
+    "list": _setup_list,
+    "search": _setup_search,
+    "index": _setup_index,
+}
+
+def build_parser(command: str = None) -> argparse.ArgumentParser:
+    """
+    Builds the argument parser.
+
+    With a known `command` (fast path) only that subcommand is defined and only
+    the provider it names is loaded. Without one (help, typos, no arguments) the
+    full tree is built, including the epilog that lists every available manager.
+    """
+    manager = ModuleManager.get_instance()
+    full = command is None
+
+    if full:
+        available_managers = [m for m in manager.get_all_managers() if m.is_available()]
+    elif command in COMMANDS:
+        available_managers = []
+    else:
+        mgr = manager.get_manager(command)
+        available_managers = [mgr] if mgr and mgr.is_available() else []
+
+    parser = argparse.ArgumentParser(
+        prog="mixtura",
+        description=f"""
+{Style.ASCII}
+{Style.BOLD}Mixed together. Running everywhere.{Style.RESET}
+""",
+        epilog=_build_epilog(available_managers) if full else None,
+        formatter_class=ColoredHelpFormatter
+    )
+
+    sub = parser.add_subparsers(dest="command", required=True, title="available commands")
+
+    for name, setup in COMMANDS.items():
+        if full or name == command:
+            setup(sub)
+
     # Register Module Subcommands
     for mgr in available_managers:
-        if mgr.is_available():
-            # Check if manager has custom commands by inspecting a temporary parser
-            temp_parser = argparse.ArgumentParser(add_help=False)
-            mgr.setup_parser(temp_parser)
-            
-            # If actions were added (list is not empty), register the subcommand
-            if len(temp_parser._actions) > 0:
-                 p_mgr = sub.add_parser(
-                    mgr.name,
-                    help=f"Manage {mgr.name} specific operations",
-                    formatter_class=ColoredHelpFormatter
-                 )
-                 mgr.setup_parser(p_mgr)
-                 p_mgr.set_defaults(func=mgr.execute)
+        # Only managers whose setup_parser adds arguments get a subcommand
+        if _has_custom_commands(mgr):
+            p_mgr = sub.add_parser(
+                mgr.name,
+                help=f"Manage {mgr.name} specific operations",
+                formatter_class=ColoredHelpFormatter
+            )
+            mgr.setup_parser(p_mgr)
+            p_mgr.set_defaults(func=mgr.execute)
+        elif not full:
+            # Provider without a subcommand: let the full parser report the invalid choice
+            return build_parser(None)
+
+    if not full and command not in COMMANDS and not available_managers:
+        return build_parser(None)
+
+    return parser
+
+def main() -> None:
+    check_for_updates()
+
+    # Parse the subcommand name first, so we only build (and load) what it needs
+    argv = sys.argv[1:]
+    requested = argv[0] if argv and not argv[0].startswith("-") else None
+    if requested is not None and requested not in COMMANDS and requested not in ModuleManager.get_instance().get_manager_names():
+        # Unknown command: let the full parser report it with the complete list of choices
+        requested = None
+
+    parser = build_parser(requested)
 
     try:
-        args = parser.parse_args()
-        print(Style.ASCII)
+        args = parser.parse_args(argv)
+        output = getattr(args, "output", None)
+        if output:
+            # Keep stdout parseable: logs go to stderr and the banner is left out
+            Renderer.get_instance().set_format(output)
+        else:
+            print(Style.ASCII)
         args.func(args)
     except KeyboardInterrupt:
         print()
         sys.exit(0)
+    finally:
+        finish_update_check()
 
 if __name__ == "__main__":
     main()
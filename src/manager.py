@@ -1,16 +1,24 @@
 import os
-import importlib.util
-import sys
-import glob
-from typing import Dict, List, Type, Any
+import time
+import queue
+import importlib
+import threading
+from typing import Dict, Iterator, List, Optional, Tuple, Type, Any
 from core import PackageManager
-from utils import log_warn, log_info
+from utils import env_number, log_warn, log_info, set_deadline
+
+# Cap on each provider's own search_timeout, in seconds, unless the caller sets a deadline
+SEARCH_DEADLINE = env_number("MIXTURA_SEARCH_TIMEOUT", 60.0)
 
 class ModuleManager:
     _instance = None
     
     def __init__(self):
         self.managers: Dict[str, PackageManager] = {}
+        # Providers that missed their deadline in the last search_all call
+        self.incomplete_providers: List[str] = []
+        # Provider name -> (module path, class name), imported on first use
+        self._registry: Dict[str, Tuple[str, str]] = {}
         self.discover_modules()
 
     @classmethod
@@ -21,21 +29,35 @@ class ModuleManager:
 
     def discover_modules(self):
         """
-        Dynamically discovers and loads modules from src/modules/*
-        Uses pkgutil to ensure compatibility with Nuitka/frozen builds and pure Python.
+        Registers the providers listed in the static manifest (modules/manifest.py,
+        generated at build time) without importing them.
+        In pure Python mode, subpackages missing from the manifest (e.g. a provider
+        added without regenerating it) are still found on disk and loaded eagerly.
         """
         import modules
-        import pkgutil
-        
-        # Iterate over all packages in the modules directory
-        # This yields names like 'modules.flatpak', 'modules.nixpkgs' if prefix is set,
-        # or just 'flatpak', 'nixpkgs' if not.
-        for importer, modname, ispkg in pkgutil.iter_modules(modules.__path__, modules.__name__ + "."):
-            if ispkg:
-                # We interpret each subpackage as a manager/provider container
+
+        try:
+            from modules.manifest import PROVIDERS
+        except ImportError:
+            PROVIDERS = {}
+
+        self._registry.update(PROVIDERS)
+        known_packages = {module_name.rsplit('.', 1)[0] for module_name, _ in PROVIDERS.values()}
+
+        # A plain directory listing: pkgutil would pull in inspect & co on every run.
+        # Frozen (Nuitka) builds have no directory to list, but their manifest is complete.
+        for path in modules.__path__:
+            try:
+                entries = sorted(os.listdir(path))
+            except OSError:
+                continue
+
+            for entry in entries:
+                modname = f"{modules.__name__}.{entry}"
+                if modname in known_packages or not os.path.isfile(os.path.join(path, entry, "provider.py")):
+                    continue
                 # We expect a 'provider' submodule inside it: e.g. modules.flatpak.provider
-                provider_module_name = f"{modname}.provider"
-                self._load_module(provider_module_name)
+                self._load_module(f"{modname}.provider")
 
     def _load_module(self, module_name: str):
         try:
@@ -59,11 +81,35 @@ class ModuleManager:
         except Exception as e:
             log_warn(f"Failed to load module {module_name}: {e}")
 
-    def get_manager(self, name: str) -> PackageManager:
+    def _load_provider(self, name: str) -> Optional[PackageManager]:
+        """Imports and instantiates a manifest provider the first time it is needed."""
+        module_name, class_name = self._registry[name]
+        try:
+            module = importlib.import_module(module_name)
+            instance = getattr(module, class_name)()
+            self.managers[name] = instance
+            return instance
+        except Exception as e:
+            log_warn(f"Failed to load module {module_name}: {e}")
+            # Do not retry on every lookup
+            del self._registry[name]
+            return None
+
+    def get_manager_names(self) -> List[str]:
+        """Names of all known providers, without importing any of them."""
+        names = list(self._registry)
+        names.extend(n for n in self.managers if n not in self._registry)
+        return names
+
+    def get_manager(self, name: str) -> Optional[PackageManager]:
+        if name not in self.managers and name in self._registry:
+            return self._load_provider(name)
         return self.managers.get(name)
 
     def get_all_managers(self) -> List[PackageManager]:
-        return list(self.managers.values())
+        for name in list(self._registry):
+            self.get_manager(name)
+        return [self.managers[n] for n in self.get_manager_names() if n in self.managers]
         
     def resolve_packages(self, args: List[str]) -> Dict[str, List[str]]:
         """
@@ -76,8 +122,9 @@ class ModuleManager:
         
         # Determine default provider - usually nixpkgs, or the first one available
         default_manager_name = 'nixpkgs'
-        if default_manager_name not in self.managers and self.managers:
-             default_manager_name = next(iter(self.managers))
+        known_names = self.get_manager_names()
+        if default_manager_name not in known_names and known_names:
+             default_manager_name = known_names[0]
 
         for arg in args:
             if '#' in arg:
@@ -97,19 +144,99 @@ class ModuleManager:
                 
         return grouped
 
-    def search_all(self, query: str) -> List[Dict[str, Any]]:
+    def search_all(self, query: str, deadline: Optional[float] = None) -> List[Dict[str, Any]]:
         """
-        Search for query in all available package managers.
-        Returns a aggregated list of results.
+        Search for query in all available package managers, concurrently.
+        Returns a aggregated list of results, in provider order.
+        See search_all_many for deadlines and incomplete providers.
         """
-        all_results = []
-        for mgr in self.get_all_managers():
-            if mgr.is_available():
-                try:
-                    results = mgr.search(query)
-                    if results:
-                        all_results.extend(results)
-                except Exception as e:
-                    # Individual search failure shouldn't stop others
-                    log_warn(f"Search failed in {mgr.name}: {e}")
+        return self.search_all_many([query], deadline=deadline).get(query, [])
+
+    def search_all_many(
+        self, queries: List[str], deadline: Optional[float] = None,
+        managers: Optional[List[PackageManager]] = None
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Search for several queries in all available package managers, concurrently.
+        Returns the aggregated results per query, in provider order.
+        See iter_search_many for deadlines, `managers` and incomplete providers.
+        """
+        queries = list(dict.fromkeys(queries))
+        answers = self.iter_search_many(queries, deadline=deadline, managers=managers)
+        by_position = sorted(answers, key=lambda answer: answer[0])
+        all_results: Dict[str, List[Dict[str, Any]]] = {q: [] for q in queries}
+        for _, _, results in by_position:
+            for q in queries:
+                all_results[q].extend(results.get(q, []))
         return all_results
+
+    def iter_search_many(
+        self, queries: List[str], deadline: Optional[float] = None,
+        managers: Optional[List[PackageManager]] = None
+    ) -> Iterator[Tuple[int, str, Dict[str, List[Dict[str, Any]]]]]:
+        """
+        Searches for several queries in all available package managers (or just
+        `managers`), concurrently, yielding (provider position, provider name, results
+        per query) as each provider answers. Each provider answers the whole batch with
+        one PackageManager.search_many call.
+
+        Each provider gets `deadline` seconds, or by default its own search_timeout
+        capped at SEARCH_DEADLINE. The backend processes of a provider that misses its
+        deadline are killed; the provider is left behind and reported in
+        `self.incomplete_providers` once the iteration is done.
+        """
+        queries = list(dict.fromkeys(queries))
+        if managers is None:
+            managers = self.get_all_managers()
+        managers = [mgr for mgr in managers if mgr.is_available()]
+        positions = {mgr.name: i for i, mgr in enumerate(managers)}
+        finished: "queue.Queue" = queue.Queue()
+
+        def _worker(mgr: PackageManager, until: float) -> None:
+            # Whatever the provider runs is stopped at its deadline, even though we
+            # no longer wait for it by then
+            set_deadline(until)
+            try:
+                finished.put((mgr.name, mgr.search_many(queries), None))
+            except Exception as e:
+                finished.put((mgr.name, None, e))
+
+        start = time.monotonic()
+        deadlines = {}
+        for mgr in managers:
+            limit = deadline if deadline is not None else min(SEARCH_DEADLINE, mgr.search_timeout)
+            deadlines[mgr.name] = start + limit
+            # Daemon threads: a provider stuck past its deadline must not keep the CLI alive
+            threading.Thread(target=_worker, args=(mgr, deadlines[mgr.name]), daemon=True).start()
+
+        pending = set(deadlines)
+        timed_out = set()
+
+        while pending:
+            now = time.monotonic()
+            # Give up on providers whose own deadline already passed
+            for name in [n for n in pending if deadlines[n] <= now]:
+                pending.discard(name)
+                timed_out.add(name)
+            if not pending:
+                break
+
+            try:
+                name, results, error = finished.get(timeout=max(0.0, min(deadlines[n] for n in pending) - now))
+            except queue.Empty:
+                continue
+
+            if name not in pending:
+                # Late answer from a provider we already gave up on
+                continue
+            pending.discard(name)
+
+            if error is not None:
+                # Individual search failure shouldn't stop others
+                log_warn(f"Search failed in {name}: {error}")
+            elif results:
+                yield positions[name], name, results
+
+        self.incomplete_providers = [mgr.name for mgr in managers if mgr.name in timed_out]
+        if self.incomplete_providers:
+            log_warn(f"Results are incomplete: {', '.join(self.incomplete_providers)} did not answer in time.")
@@ -0,0 +1,134 @@
+import os
+import glob
+import gzip
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+from core import CachedCatalog
+from utils import cache_dir
+from modules.flatpak.installed import installations
+
+# Bump when the cached record layout changes
+CACHE_VERSION = 1
+
+# Record layout in the cache: one list per component, in this field order
+FIELDS = ["id", "name", "summary", "version", "branch", "remote", "installation", "keywords"]
+
+def appstream_files() -> List[Tuple[str, str, str]]:
+    """
+    (installation, remote, path) for every remote's active appstream data.
+    Flatpak keeps it at <base>/appstream/<remote>/<arch>/active/appstream.xml[.gz].
+    """
+    files = []
+    for installation, base in installations():
+        for arch_dir in sorted(glob.glob(os.path.join(base, "appstream", "*", "*", "active"))):
+            remote = arch_dir.split(os.sep)[-3]
+            for name in ("appstream.xml.gz", "appstream.xml"):
+                path = os.path.join(arch_dir, name)
+                if os.path.exists(path):
+                    files.append((installation, remote, path))
+                    break
+    return files
+
+def _untranslated_text(element) -> Optional[str]:
+    # Translated variants carry xml:lang; the bare element is the default (English) one
+    if element.get("{http://www.w3.org/XML/1998/namespace}lang"):
+        return None
+    return (element.text or "").strip()
+
+def parse_appstream(path: str, remote: str, installation: str) -> List[List[str]]:
+    """Parses one appstream XML file into compact records (see FIELDS)."""
+    # ElementTree is only needed when the cache is stale
+    import xml.etree.ElementTree as ET
+
+    opener = gzip.open if path.endswith(".gz") else open
+    records = []
+
+    with opener(path, "rb") as f:
+        for event, elem in ET.iterparse(f, events=("end",)):
+            if elem.tag != "component":
+                continue
+
+            app_id = name = summary = version = ""
+            branch = ""
+            keywords = []
+
+            for child in elem:
+                if child.tag == "id":
+                    app_id = (child.text or "").strip()
+                elif child.tag == "name" and not name:
+                    name = _untranslated_text(child) or ""
+                elif child.tag == "summary" and not summary:
+                    summary = _untranslated_text(child) or ""
+                elif child.tag == "releases":
+                    # Releases are listed newest first
+                    release = child.find("release")
+                    if release is not None:
+                        version = release.get("version", "")
+                elif child.tag == "bundle" and child.get("type") == "flatpak":
+                    # app/org.example.App/x86_64/stable
+                    ref = (child.text or "").strip().split("/")
+                    if len(ref) == 4:
+                        app_id = ref[1]
+                        branch = ref[3]
+                elif child.tag == "keywords":
+                    keywords.extend(
+                        (k.text or "").strip() for k in child.findall("keyword") if _untranslated_text(k)
+                    )
+
+            if app_id.endswith(".desktop"):
+                app_id = app_id[:-len(".desktop")]
+
+            if app_id:
+                records.append([
+                    app_id, name or app_id, summary, version or "unknown",
+                    branch or "stable", remote, installation, " ".join(keywords)
+                ])
+
+            # Free the parsed subtree, appstream files can be large
+            elem.clear()
+
+    return records
+
+class AppstreamCatalog(CachedCatalog):
+    """
+    Compact, searchable view of every configured remote's appstream data,
+    matched on id, name, summary and keywords. Flatpak swaps each remote's
+    `active` link on update, which changes the cache fingerprint.
+    """
+
+    cache_version = CACHE_VERSION
+
+    def __init__(self):
+        super().__init__(os.path.join(cache_dir("flatpak"), "appstream.json"))
+
+    def sources(self) -> List[Tuple[str, str, str]]:
+        return appstream_files()
+
+    def source_path(self, source: Tuple[str, str, str]) -> str:
+        return source[2]
+
+    def parse(self, source: Tuple[str, str, str]) -> List[List[str]]:
+        installation, remote, path = source
+        return parse_appstream(path, remote, installation)
+
+    def record_key(self, record: List[str]) -> Hashable:
+        # The same remote can be configured in both installations
+        return (record[0], record[4], record[5])
+
+    def haystack(self, record: List[str]) -> str:
+        # id, name, summary and keywords
+        return f"{record[0]}\n{record[1]}\n{record[2]}\n{record[7]}".lower()
+
+    def status_details(self, sources: List[Tuple[str, str, str]]) -> Dict[str, Any]:
+        return {"remotes": ", ".join(sorted({remote for _, remote, _ in sources}))}
+
+    def to_result(self, record: List[str]) -> Dict[str, Any]:
+        data = dict(zip(FIELDS, record))
+        return {
+            "name": data["name"],
+            "id": data["id"],
+            "description": data["summary"],
+            "version": data["version"],
+            "branch": data["branch"],
+            "remote": data["remote"],
+            "installation": data["installation"],
+        }
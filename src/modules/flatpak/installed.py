@@ -0,0 +1,139 @@
+import os
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+# Above this many deployments the per-app reads are spread over a thread pool
+PARALLEL_SCAN_MIN = 32
+PARALLEL_SCAN_WORKERS = 8
+
+# Extra installations configured here are only known to the flatpak CLI
+INSTALLATIONS_CONF_DIR = "/etc/flatpak/installations.d"
+
+_RELEASE_VERSION = re.compile(r"<release\b[^>]*?\bversion=[\"']([^\"']+)[\"']")
+_METAINFO_NAME = re.compile(r"<name>([^<]+)</name>")
+
+def installations() -> List[Tuple[str, str]]:
+    """(installation name, base directory) for the user and system installations."""
+    user_dir = os.environ.get("FLATPAK_USER_DIR") or os.path.join(
+        os.environ.get("XDG_DATA_HOME") or os.path.expanduser("~/.local/share"), "flatpak"
+    )
+    system_dir = os.environ.get("FLATPAK_SYSTEM_DIR") or "/var/lib/flatpak"
+    return [("user", user_dir), ("system", system_dir)]
+
+def can_list() -> bool:
+    """Whether the installation directories tell the whole story (no extra installations)."""
+    try:
+        if any(name.endswith(".conf") for name in os.listdir(INSTALLATIONS_CONF_DIR)):
+            return False
+    except OSError:
+        pass
+    return any(os.path.isdir(os.path.join(base, "app")) for _, base in installations())
+
+def _deployments() -> List[Tuple[str, str, str, str, str]]:
+    """(installation, app id, arch, branch, active deploy dir) for every installed app branch."""
+    found = []
+    for installation, base in installations():
+        app_root = os.path.join(base, "app")
+        try:
+            app_ids = sorted(os.listdir(app_root))
+        except OSError:
+            continue
+        for app_id in app_ids:
+            app_dir = os.path.join(app_root, app_id)
+            try:
+                arches = sorted(e for e in os.listdir(app_dir) if e != "current")
+            except OSError:
+                continue
+            for arch in arches:
+                try:
+                    branches = sorted(os.listdir(os.path.join(app_dir, arch)))
+                except OSError:
+                    continue
+                for branch in branches:
+                    # `active` points at the deployed commit; half-removed branches lack it
+                    active = os.path.join(app_dir, arch, branch, "active")
+                    if os.path.isdir(active):
+                        found.append((installation, app_id, arch, branch, active))
+    return found
+
+def _read_text(path: str) -> Optional[str]:
+    try:
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            return f.read()
+    except OSError:
+        return None
+
+def _keyfile_value(text: str, group: str, key: str) -> Optional[str]:
+    """Untranslated `key` of `[group]` in a GKeyFile (metadata, .desktop files)."""
+    in_group = False
+    for line in text.splitlines():
+        line = line.strip()
+        if line.startswith("["):
+            in_group = line == f"[{group}]"
+        elif in_group and "=" in line:
+            name, _, value = line.partition("=")
+            if name.strip() == key:
+                return value.strip()
+    return None
+
+def _deploy_origin(active: str) -> Optional[str]:
+    """
+    Remote the app was installed from. `deploy` is a GVariant of type (ssasta{sv})
+    whose first member, the origin, starts at offset 0 and is NUL-terminated.
+    """
+    try:
+        with open(os.path.join(active, "deploy"), "rb") as f:
+            head = f.read(256)
+    except OSError:
+        return None
+    origin = head.split(b"\0", 1)[0].decode("utf-8", "replace")
+    return origin or None
+
+def _read_deployment(installation: str, app_id: str, arch: str, branch: str, active: str) -> Dict[str, Any]:
+    metadata = _read_text(os.path.join(active, "metadata")) or ""
+    app_id = _keyfile_value(metadata, "Application", "name") or app_id
+
+    name = None
+    desktop = _read_text(os.path.join(active, "export", "share", "applications", f"{app_id}.desktop"))
+    if desktop:
+        name = _keyfile_value(desktop, "Desktop Entry", "Name")
+
+    version = None
+    for rel in ("share/metainfo", "share/appdata"):
+        for suffix in (".metainfo.xml", ".appdata.xml"):
+            metainfo = _read_text(os.path.join(active, "files", rel, f"{app_id}{suffix}"))
+            if metainfo is None:
+                continue
+            # Releases are listed newest first
+            match = _RELEASE_VERSION.search(metainfo)
+            version = match.group(1) if match else None
+            if not name:
+                match = _METAINFO_NAME.search(metainfo)
+                name = match.group(1).strip() if match else None
+            break
+        if version or name:
+            break
+
+    return {
+        "name": name or app_id,
+        "id": app_id,
+        "version": version or "unknown",
+        "branch": branch,
+        "arch": arch,
+        "origin": _deploy_origin(active) or "unknown",
+        "installation": installation,
+    }
+
+def list_installed() -> List[Dict[str, Any]]:
+    """
+    Installed apps of the user and system installations, read from their
+    directories like `flatpak list --app` (one record per installed branch).
+    """
+    deployments = _deployments()
+    if len(deployments) < PARALLEL_SCAN_MIN:
+        return [_read_deployment(*d) for d in deployments]
+
+    # Mostly small file reads: threads overlap the I/O waits
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(max_workers=PARALLEL_SCAN_WORKERS) as pool:
+        return list(pool.map(lambda d: _read_deployment(*d), deployments))
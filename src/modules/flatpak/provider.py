@@ -1,15 +1,65 @@
-import shutil
-import subprocess
+import os
 import sys
 import argparse
 from typing import List, Dict, Any, Optional
 from core import PackageManager
-from utils import log_info, log_error, log_warn, log_task, run, Style
+from utils import log_info, log_error, log_warn, log_task, run, run_cached, run_process, Style
+
+# Remote configuration of the system and user installations
+REPO_CONFIGS = [
+    "/var/lib/flatpak/repo/config",
+    os.path.expanduser("~/.local/share/flatpak/repo/config"),
+]
 
 class FlatpakProvider(PackageManager):
+    binary = "flatpak"
+
+    def __init__(self):
+        self._catalog = None
+
     @property
     def name(self) -> str:
         return "flatpak"
+
+    def probe_capabilities(self, path: str) -> Dict[str, Any]:
+        result = run_process([path, "remotes", "--columns=name"], timeout=30)
+        remotes = []
+        if result.returncode == 0:
+            remotes = sorted({line.strip() for line in result.stdout.splitlines() if line.strip()})
+        return {"remotes": remotes}
+
+    def probe_fingerprint_files(self) -> List[str]:
+        return REPO_CONFIGS
+
+    def _remotes_label(self) -> str:
+        return ", ".join(self.probe().capabilities.get("remotes") or ["flathub"])
+
+    def inventory_fingerprints(self) -> List[str]:
+        """Paths that change whenever apps are installed or removed."""
+        from modules.flatpak.installed import installations
+        paths = []
+        for _, base in installations():
+            # flatpak touches .changed after every transaction
+            paths += [os.path.join(base, "app"), os.path.join(base, ".changed")]
+        return paths
+
+    def catalog(self):
+        """Appstream-backed catalog of every configured remote (see modules.flatpak.appstream)."""
+        if self._catalog is None:
+            from modules.flatpak.appstream import AppstreamCatalog
+            self._catalog = AppstreamCatalog()
+        return self._catalog
+
+    def refresh_index(self, force: bool = False) -> Optional[bool]:
+        if not self.is_available() or not self.catalog().available():
+            return None
+        self.catalog().load(force=force)
+        return self.catalog().rebuilt
+
+    def index_status(self) -> Optional[Dict[str, Any]]:
+        if not self.is_available():
+            return None
+        return self.catalog().status()
     
     def setup_parser(self, parser: argparse.ArgumentParser) -> None:
         # No custom args for now
@@ -19,7 +69,7 @@ class FlatpakProvider(PackageManager):
         print(f"{Style.BOLD}Flatpak Package Manager{Style.RESET}")
 
     def is_available(self) -> bool:
-        return shutil.which("flatpak") is not None
+        return self.probe().available
 
     def install(self, packages: List[str]) -> None:
         if not self.is_available():
@@ -33,15 +83,18 @@ class FlatpakProvider(PackageManager):
         # We use -y to avoid flatpak's own confirmation (we are the wrapper).
         
         log_info(f"Installing: {', '.join(packages)} (flatpak)...")
-        run(["flatpak", "install", "-y"] + packages)
+        run([self.bin(), "install", "-y"] + packages)
 
     def uninstall(self, packages: List[str]) -> None:
         if not self.is_available():
             return
 
-        for pkg in packages:
-             log_info(f"Removing '{Style.BOLD}{pkg}{Style.RESET}' (flatpak)...")
-             run(["flatpak", "uninstall", pkg])
+        packages = list(dict.fromkeys(packages))
+        if not packages:
+            return
+        # One transaction for all of them; the plan was already shown, so no prompt
+        log_info(f"Removing {', '.join(f'{Style.BOLD}{p}{Style.RESET}' for p in packages)} (flatpak)...")
+        run([self.bin(), "uninstall", "-y"] + packages)
 
     def upgrade(self, packages: Optional[List[str]] = None) -> None:
         if not self.is_available():
@@ -49,20 +102,71 @@ class FlatpakProvider(PackageManager):
 
         if not packages:
             log_info("Upgrading all Flatpak packages...")
-            run(["flatpak", "update", "-y"])
+            run([self.bin(), "update", "-y"])
         else:
             log_info(f"Updating: {', '.join(packages)}")
-            run(["flatpak", "update", "-y"] + packages)
+            run([self.bin(), "update", "-y"] + packages)
+
+    def outdated(self) -> Optional[List[Dict[str, Any]]]:
+        """
+        Installed refs with an update on their remote, from `flatpak remote-ls --updates`.
+        Runtimes are listed too, marked 'full_upgrade': only `flatpak update` without
+        arguments reliably picks them up, so a stale runtime upgrades the whole provider.
+        """
+        if not self.is_available():
+            return []
+        try:
+            result = run_process(
+                [self.bin(), "remote-ls", "--updates", "--columns=ref,version,origin"],
+                timeout=60
+            )
+        except Exception:
+            return None
+        if result.returncode != 0:
+            return None
+
+        installed = {pkg.get("id"): pkg for pkg in self.list_packages()}
+        stale = []
+        for line in result.stdout.splitlines():
+            parts = [p.strip() for p in line.split('\t')]
+            # kind/id/arch/branch; anything else is a header
+            ref = parts[0].split("/")
+            if len(ref) != 4 or ref[0] not in ("app", "runtime"):
+                continue
+            kind, app_id, _, branch = ref
+            current = installed.get(app_id, {}) if kind == "app" else {}
+            record = {
+                "name": current.get("name") or app_id,
+                "id": app_id,
+                "version": current.get("version") or "unknown",
+                "latest": (parts[1] if len(parts) > 1 else "") or None,
+                "branch": branch,
+                "origin": parts[2] if len(parts) > 2 else "",
+            }
+            if kind == "runtime":
+                record["detail"] = f"runtime {branch}"
+                record["full_upgrade"] = True
+            stale.append(record)
+        return stale
 
     def list_packages(self) -> List[Dict[str, Any]]:
         if not self.is_available():
             return []
             
+        # The installation directories have everything `flatpak list` prints, and branch
+        # and origin on top; the CLI is only needed for extra configured installations
+        from modules.flatpak.installed import can_list, list_installed
+        if can_list():
+            try:
+                return list_installed()
+            except Exception as e:
+                log_warn(f"Reading flatpak installations failed, falling back to 'flatpak list': {e}")
+
         try:
-            result = subprocess.run(
-                ["flatpak", "list", "--app", "--columns=name,application,description,version"],
-                capture_output=True,
-                text=True
+            result = run_cached(
+                [self.bin(), "list", "--app", "--columns=name,application,description,version"],
+                fingerprints=self.inventory_fingerprints(),
+                env_keys=["FLATPAK_USER_DIR", "FLATPAK_SYSTEM_DIR"]
             )
             packages = []
             if result.returncode == 0:
@@ -80,18 +184,37 @@ class FlatpakProvider(PackageManager):
             return []
 
     def search(self, query: str) -> List[Dict[str, Any]]:
-        if not self.is_available():
-            return []
-        
-        log_info(f"Searching for '{Style.BOLD}{query}{Style.RESET}' in flathub...")
+        return self.search_many([query]).get(query, [])
+
+    def search_many(self, queries: List[str]) -> Dict[str, List[Dict[str, Any]]]:
+        queries = list(dict.fromkeys(queries))
+        if not self.is_available() or not queries:
+            return {q: [] for q in queries}
         
+        terms = ", ".join(f"'{Style.BOLD}{q}{Style.RESET}'" for q in queries)
+        log_info(f"Searching for {terms} in {self._remotes_label()}...")
+
+        # Answer from the locally cached appstream data when flatpak has downloaded it,
+        # which saves spawning `flatpak search` and gives us branch and remote too.
+        catalog = self.catalog()
+        if catalog.available():
+            try:
+                found = catalog.search_many(queries)
+                for packages in found.values():
+                    for pkg in packages:
+                        pkg["provider"] = self.name
+                return found
+            except Exception as e:
+                log_warn(f"Reading appstream data failed, falling back to 'flatpak search': {e}")
+
+        # `flatpak search` takes a single term
+        return {q: self._search_cli(q) for q in queries}
+
+    def _search_cli(self, query: str) -> List[Dict[str, Any]]:
         try:
             # We use --columns to ensure consistent output format
-            result = subprocess.run(
-                ["flatpak", "search", query, "--columns=name,application,description,version"], 
-                capture_output=True, 
-                text=True
-            )
+            # No timeout of its own: searches run under the caller's deadline (see ModuleManager.iter_search_many)
+            result = run_process([self.bin(), "search", query, "--columns=name,application,description,version"])
             
             if result.returncode != 0:
                 return []
@@ -131,13 +254,12 @@ class FlatpakProvider(PackageManager):
             return []
 
     def _install_interactive(self, term: str) -> None:
-        log_task(f"Searching for '{Style.BOLD}{term}{Style.RESET}' in flathub...")
+        log_task(f"Searching for '{Style.BOLD}{term}{Style.RESET}' in {self._remotes_label()}...")
         
         try:
-            result = subprocess.run(
-                ["flatpak", "search", term, "--columns=name,application,description"], 
-                capture_output=True, 
-                text=True
+            result = run_process(
+                [self.bin(), "search", term, "--columns=name,application,description"],
+                timeout=self.search_timeout
             )
             
             if result.returncode != 0:
@@ -194,7 +316,7 @@ class FlatpakProvider(PackageManager):
                 if 0 <= choice_idx < len(packages):
                     selected = packages[choice_idx]
                     log_task(f"Installing {selected['name']} ({selected['id']})...")
-                    run(["flatpak", "install", selected['id']])
+                    run([self.bin(), "install", selected['id']])
                 else:
                     log_error("Invalid selection.")
             except ValueError:
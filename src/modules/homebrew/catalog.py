@@ -0,0 +1,111 @@
+import os
+import sys
+import json
+from typing import Any, Dict, List, Tuple
+from core import CachedCatalog
+from utils import cache_dir
+
+# Bump when the cached record layout changes
+CACHE_VERSION = 1
+
+# Record layout in the cache: one list per formula/cask, in this field order
+FIELDS = ["name", "full_name", "tap", "description", "version", "type", "aliases"]
+
+def homebrew_cache() -> str:
+    """Homebrew's own cache directory (HOMEBREW_CACHE, or its per-OS default)."""
+    if os.environ.get("HOMEBREW_CACHE"):
+        return os.environ["HOMEBREW_CACHE"]
+    if sys.platform == "darwin":
+        return os.path.expanduser("~/Library/Caches/Homebrew")
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return os.path.join(base, "Homebrew")
+
+def api_files() -> Dict[str, str]:
+    """
+    Cached API payloads by type ('formula', 'cask'). Homebrew 4 writes signed
+    `<type>.jws.json` files; older releases wrote plain `<type>.json`.
+    """
+    api_dir = os.path.join(homebrew_cache(), "api")
+    files = {}
+    for kind in ("formula", "cask"):
+        for name in (f"{kind}.jws.json", f"{kind}.json"):
+            path = os.path.join(api_dir, name)
+            if os.path.exists(path):
+                files[kind] = path
+                break
+    return files
+
+def _load_payload(path: str) -> List[Dict[str, Any]]:
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    # JWS envelope: the actual list is a JSON string in 'payload'
+    if isinstance(data, dict) and "payload" in data:
+        data = json.loads(data["payload"])
+    return data if isinstance(data, list) else []
+
+def _formula_record(formula: Dict[str, Any]) -> List[Any]:
+    version = (formula.get("versions") or {}).get("stable") or "unknown"
+    if formula.get("revision"):
+        version = f"{version}_{formula['revision']}"
+    aliases = (formula.get("aliases") or []) + (formula.get("oldnames") or [])
+    return [
+        formula.get("name", ""),
+        formula.get("full_name") or formula.get("name", ""),
+        formula.get("tap", "homebrew/core"),
+        formula.get("desc") or "",
+        version,
+        "formula",
+        " ".join(aliases),
+    ]
+
+def _cask_record(cask: Dict[str, Any]) -> List[Any]:
+    display_names = cask.get("name") or []
+    return [
+        cask.get("token", ""),
+        cask.get("full_token") or cask.get("token", ""),
+        cask.get("tap", "homebrew/cask"),
+        cask.get("desc") or (display_names[0] if display_names else ""),
+        cask.get("version") or "unknown",
+        "cask",
+        " ".join(display_names),
+    ]
+
+class HomebrewCatalog(CachedCatalog):
+    """
+    Searchable view of the formula and cask JSON API payloads Homebrew keeps
+    in its cache, matched on name, aliases and description like `brew search --desc`.
+    """
+
+    cache_version = CACHE_VERSION
+
+    _BUILDERS = {"formula": _formula_record, "cask": _cask_record}
+
+    def __init__(self):
+        super().__init__(os.path.join(cache_dir("homebrew"), "catalog.json"))
+
+    def sources(self) -> List[Tuple[str, str]]:
+        # (kind, path), formulae first
+        return sorted(api_files().items(), reverse=True)
+
+    def source_path(self, source: Tuple[str, str]) -> str:
+        return source[1]
+
+    def parse(self, source: Tuple[str, str]) -> List[List[Any]]:
+        kind, path = source
+        return [self._BUILDERS[kind](item) for item in _load_payload(path)]
+
+    def haystack(self, record: List[Any]) -> str:
+        # name, full name, aliases and description
+        return f"{record[0]}\n{record[1]}\n{record[6]}\n{record[3]}".lower()
+
+    def to_result(self, record: List[Any]) -> Dict[str, Any]:
+        data = dict(zip(FIELDS, record))
+        return {
+            "name": data["name"],
+            # Third-party taps need the qualified name to install
+            "id": data["full_name"],
+            "description": data["description"] or "No description",
+            "version": data["version"],
+            "tap": data["tap"],
+            "type": data["type"],
+        }
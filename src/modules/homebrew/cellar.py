@@ -0,0 +1,74 @@
+import os
+import json
+from typing import Any, Dict, List, Optional
+
+def _installed_version(prefix: str, name: str, versions: List[str]) -> str:
+    """The linked keg's version (<prefix>/opt/<name>), else the most recently installed one."""
+    opt = os.path.join(prefix, "opt", name)
+    if os.path.islink(opt):
+        linked = os.path.basename(os.path.realpath(opt))
+        if linked in versions:
+            return linked
+    keg_dir = os.path.join(prefix, "Cellar", name)
+    return max(versions, key=lambda v: os.path.getmtime(os.path.join(keg_dir, v)))
+
+def _read_receipt(path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            receipt = json.load(f)
+        return receipt if isinstance(receipt, dict) else None
+    except (OSError, ValueError):
+        return None
+
+def _subdirs(path: str) -> List[str]:
+    try:
+        return sorted(e for e in os.listdir(path) if not e.startswith(".") and os.path.isdir(os.path.join(path, e)))
+    except OSError:
+        return []
+
+def list_formulae(prefix: str) -> List[Dict[str, Any]]:
+    """
+    Formulae installed on request, like `brew list --installed-on-request --versions`,
+    read from each keg's INSTALL_RECEIPT.json.
+    """
+    cellar = os.path.join(prefix, "Cellar")
+    packages = []
+    for name in _subdirs(cellar):
+        versions = _subdirs(os.path.join(cellar, name))
+        if not versions:
+            continue
+        version = _installed_version(prefix, name, versions)
+        receipt = _read_receipt(os.path.join(cellar, name, version, "INSTALL_RECEIPT.json")) or {}
+
+        # Receipts older than the field only know whether it came in as a dependency
+        on_request = receipt.get("installed_on_request")
+        if on_request is None:
+            on_request = not receipt.get("installed_as_dependency", False)
+        if not on_request:
+            continue
+
+        tap = (receipt.get("source") or {}).get("tap") or "homebrew/core"
+        packages.append({
+            "name": name,
+            "version": version,
+            "id": name, # brew doesn't really have IDs like flatpak, use name
+            "type": "formula",
+            "tap": tap,
+        })
+    return packages
+
+def list_casks(prefix: str) -> List[Dict[str, Any]]:
+    """Installed casks, from <prefix>/Caskroom/<token>/<version>."""
+    caskroom = os.path.join(prefix, "Caskroom")
+    packages = []
+    for token in _subdirs(caskroom):
+        versions = _subdirs(os.path.join(caskroom, token))
+        if not versions:
+            continue
+        version = max(versions, key=lambda v: os.path.getmtime(os.path.join(caskroom, token, v)))
+        packages.append({"name": token, "version": version, "id": token, "type": "cask"})
+    return packages
+
+def list_installed(prefix: str) -> List[Dict[str, Any]]:
+    """Formulae installed on request, then casks, without starting brew."""
+    return list_formulae(prefix) + list_casks(prefix)
@@ -1,30 +1,87 @@
-import shutil
-import subprocess
+import os
+import json
 from typing import List, Dict, Any, Optional
 import argparse
 from core import PackageManager
-from utils import log_info, log_error, log_warn, log_task, run, Style
+from utils import log_info, log_error, log_warn, log_task, run, run_cached, run_process, Style
 
 class HomebrewProvider(PackageManager):
+    binary = "brew"
+
+    def __init__(self):
+        self._catalog = None
+
     @property
     def name(self) -> str:
         return "homebrew"
 
+    def probe_capabilities(self, path: str) -> Dict[str, Any]:
+        # HOMEBREW_PREFIX is set by `brew shellenv`, and brew normally lives in <prefix>/bin.
+        # Only if neither has a Cellar is `brew --prefix` (a Ruby start) worth it.
+        for prefix in (os.environ.get("HOMEBREW_PREFIX"), os.path.dirname(os.path.dirname(path))):
+            if prefix and os.path.isdir(os.path.join(prefix, "Cellar")):
+                return {"prefix": prefix}
+
+        result = run_process([path, "--prefix"], timeout=30)
+        prefix = result.stdout.strip() if result.returncode == 0 else ""
+        if not prefix:
+            # <prefix>/bin/brew
+            prefix = os.path.dirname(os.path.dirname(path))
+        return {"prefix": prefix}
+
     def is_available(self) -> bool:
-        return shutil.which("brew") is not None
+        return self.probe().available
+
+    def inventory_fingerprints(self) -> List[str]:
+        """Directories whose mtime changes when kegs or casks are (un)installed or upgraded."""
+        prefix = self.probe().capabilities.get("prefix", "")
+        caskroom = os.path.join(prefix, "Caskroom")
+        # An upgrade adds Cellar/<name>/<new> and cleanup drops the old keg without
+        # touching Cellar/ itself; the opt/ and linked/ symlinks are re-pointed though.
+        # Casks have no such links, so each Caskroom/<token> (holding its versions) counts.
+        paths = [
+            os.path.join(prefix, "Cellar"),
+            os.path.join(prefix, "opt"),
+            os.path.join(prefix, "var", "homebrew", "linked"),
+            caskroom,
+        ]
+        try:
+            with os.scandir(caskroom) as it:
+                paths += sorted(entry.path for entry in it if entry.is_dir())
+        except OSError:
+            pass
+        return paths
+
+    def catalog(self):
+        """Catalog over Homebrew's cached JSON API payloads (see modules.homebrew.catalog)."""
+        if self._catalog is None:
+            from modules.homebrew.catalog import HomebrewCatalog
+            self._catalog = HomebrewCatalog()
+        return self._catalog
+
+    def refresh_index(self, force: bool = False) -> Optional[bool]:
+        if not self.is_available() or not self.catalog().available():
+            return None
+        self.catalog().load(force=force)
+        return self.catalog().rebuilt
+
+    def index_status(self) -> Optional[Dict[str, Any]]:
+        if not self.is_available():
+            return None
+        return self.catalog().status()
 
     def install(self, packages: List[str]) -> None:
         if not self.is_available():
             log_error("Homebrew is not installed.")
             return
 
-        run(["brew", "install"] + packages)
+        run([self.bin(), "install"] + packages)
 
     def uninstall(self, packages: List[str]) -> None:
         if not self.is_available():
             return
         
-        run(["brew", "uninstall"] + packages)
+        run([self.bin(), "uninstall"] + packages)
 
     def upgrade(self, packages: Optional[List[str]] = None) -> None:
         if not self.is_available():
@@ -32,21 +89,57 @@ class HomebrewProvider(PackageManager):
 
         if not packages:
             log_info("Upgrading all Homebrew packages...")
-            run(["brew", "upgrade"])
+            run([self.bin(), "upgrade"])
         else:
             log_info(f"Upgrading: {', '.join(packages)}")
-            run(["brew", "upgrade"] + packages)
+            run([self.bin(), "upgrade"] + packages)
+
+    def outdated(self) -> Optional[List[Dict[str, Any]]]:
+        """Outdated formulae and casks from `brew outdated --json=v2`; pinned formulae are left out."""
+        if not self.is_available():
+            return []
+        try:
+            result = run_process([self.bin(), "outdated", "--json=v2"], timeout=120)
+            data = json.loads(result.stdout)
+        except Exception:
+            return None
+        if not isinstance(data, dict):
+            return None
+
+        stale = []
+        for kind, key in (("formula", "formulae"), ("cask", "casks")):
+            for item in data.get(key) or []:
+                if item.get("pinned"):
+                    continue
+                installed = item.get("installed_versions") or []
+                stale.append({
+                    "name": item.get("name", ""),
+                    "id": item.get("name", ""),
+                    "version": installed[-1] if installed else "unknown",
+                    "latest": item.get("current_version"),
+                    "type": kind,
+                })
+        return stale
 
     def list_packages(self) -> List[Dict[str, Any]]:
         if not self.is_available():
             return []
 
+        # Kegs, their install receipts and the Caskroom hold everything the two
+        # `brew list` calls below would print, without starting Ruby twice
+        prefix = self.probe().capabilities.get("prefix", "")
+        if prefix and os.path.isdir(os.path.join(prefix, "Cellar")):
+            from modules.homebrew.cellar import list_installed
+            try:
+                return list_installed(prefix)
+            except Exception as e:
+                log_warn(f"Reading the Cellar failed, falling back to 'brew list': {e}")
+
         # 1. Get installed on request
         try:
-            req_result = subprocess.run(
-                ["brew", "list", "--installed-on-request"],
-                capture_output=True,
-                text=True
+            req_result = run_cached(
+                [self.bin(), "list", "--installed-on-request"],
+                fingerprints=self.inventory_fingerprints()
             )
             if req_result.returncode != 0:
                 return []
@@ -55,10 +148,9 @@ class HomebrewProvider(PackageManager):
             requested_pkgs = {p.strip() for p in requested_pkgs if p.strip()}
             
             # 2. Get versions
-            ver_result = subprocess.run(
-                ["brew", "list", "--versions"],
-                capture_output=True,
-                text=True
+            ver_result = run_cached(
+                [self.bin(), "list", "--versions"],
+                fingerprints=self.inventory_fingerprints()
             )
             
             if ver_result.returncode != 0:
@@ -87,10 +179,33 @@ class HomebrewProvider(PackageManager):
             return []
 
     def search(self, query: str) -> List[Dict[str, Any]]:
-        if not self.is_available():
-            return []
-        log_info(f"Searching for '{Style.BOLD}{query}{Style.RESET}' in Homebrew...")
-        
+        return self.search_many([query]).get(query, [])
+
+    def search_many(self, queries: List[str]) -> Dict[str, List[Dict[str, Any]]]:
+        queries = list(dict.fromkeys(queries))
+        if not self.is_available() or not queries:
+            return {q: [] for q in queries}
+        terms = ", ".join(f"'{Style.BOLD}{q}{Style.RESET}'" for q in queries)
+        log_info(f"Searching for {terms} in Homebrew...")
+
+        # Homebrew caches the full formula/cask API payloads; searching those gives real
+        # versions and taps without starting the Ruby runtime.
+        catalog = self.catalog()
+        if catalog.available():
+            try:
+                found = catalog.search_many(queries)
+                for packages in found.values():
+                    for pkg in packages:
+                        pkg["provider"] = self.name
+                return found
+            except Exception as e:
+                log_warn(f"Reading the Homebrew API cache failed, falling back to 'brew search': {e}")
+
+        # Without the API cache each term costs its own `brew search`
+        return {q: self._search_cli(q) for q in queries}
+
+    def _search_cli(self, query: str) -> List[Dict[str, Any]]:
+        # Fallback without the API cache:
         # brew search <query> --desc --eval-all
         # but output format is messy.
         # brew search --json is not available, but 'brew info --json=v2 <pkg>' works for known pkgs.
@@ -108,8 +223,9 @@ class HomebrewProvider(PackageManager):
              # Let's just use 'brew search <query>' and then maybe 'brew info' for details? Too slow.
              # Actually 'brew search --desc <query>' gives "name: description"
              
-             cmd = ["brew", "search", "--desc", query]
-             result = subprocess.run(cmd, capture_output=True, text=True)
+             cmd = [self.bin(), "search", "--desc", query]
+             # No timeout of its own: searches run under the caller's deadline (see ModuleManager.iter_search_many)
+             result = run_process(cmd)
              
              packages = []
              if result.returncode != 0 and not result.stdout:
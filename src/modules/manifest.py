@@ -0,0 +1,7 @@
+# Generated by build/gen_manifest.py - do not edit by hand.
+# Maps provider names to (module path, class name) for lazy loading.
+PROVIDERS = {
+    'flatpak': ('modules.flatpak.provider', 'FlatpakProvider'),
+    'homebrew': ('modules.homebrew.provider', 'HomebrewProvider'),
+    'nixpkgs': ('modules.nixpkgs.provider', 'NixProvider'),
+}
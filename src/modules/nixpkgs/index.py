@@ -0,0 +1,308 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import subprocess
+from contextlib import closing
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from utils import cache_dir, iter_json_command, run_process
+
+# How long a resolved nixpkgs revision is trusted before asking nix again.
+# Matches nix's default tarball-ttl, so we never look more often than nix would refetch.
+REVISION_TTL = 60 * 60
+
+# Partial databases of builds that died (their pid gone) are deleted; past this age
+# (seconds) they are deleted regardless, as the pid may have been reused
+STALE_BUILD_AGE = 24 * 60 * 60
+
+# Regex metacharacters: queries containing any of these need a full regex scan
+_REGEX_CHARS = re.compile(r"[.^$*+?{}\[\]\\|()]")
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+class NixIndex:
+    """
+    On-disk full-text index of the nixpkgs package set.
+
+    Built from one `nix search nixpkgs ^ --json` dump and tagged with the
+    locked nixpkgs revision it came from. Lookups by attribute path, name
+    and description are answered by SQLite (FTS5 with the trigram tokenizer
+    when available, so substring queries behave like `nix search`).
+    """
+
+    def __init__(self, nix: Callable[..., List[str]], path: Optional[str] = None):
+        # `nix` builds an argv for the nix CLI (NixProvider._nix)
+        self._nix = nix
+        self.path = path or os.path.join(cache_dir("nixpkgs"), "index.sqlite")
+
+    # -------------------------------------------------------------------------
+    # Metadata
+    # -------------------------------------------------------------------------
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+    def _connect(self, path: Optional[str] = None) -> sqlite3.Connection:
+        conn = sqlite3.connect(path or self.path)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _meta(self) -> Dict[str, str]:
+        if not self.exists():
+            return {}
+        try:
+            with closing(self._connect()) as conn:
+                return {row["key"]: row["value"] for row in conn.execute("SELECT key, value FROM meta")}
+        except sqlite3.Error:
+            return {}
+
+    def _set_meta(self, **values: Any) -> None:
+        # closing() releases the connection; the inner `with` commits
+        with closing(self._connect()) as conn, conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                [(k, str(v)) for k, v in values.items()]
+            )
+
+    def resolve_revision(self) -> Optional[str]:
+        """Asks nix which nixpkgs revision the registry currently locks to."""
+        try:
+            result = run_process(self._nix("flake", "metadata", "nixpkgs", "--json"), timeout=60)
+            if result.returncode != 0:
+                return None
+            locked = json.loads(result.stdout).get("locked", {})
+            return locked.get("rev") or locked.get("narHash")
+        except Exception:
+            return None
+
+    def current_revision(self) -> Optional[str]:
+        """
+        The locked nixpkgs revision, re-resolved at most every REVISION_TTL
+        seconds. Falls back to the indexed revision when nix can't be asked.
+        """
+        meta = self._meta()
+        checked_at = float(meta.get("checked_at", 0))
+        if meta.get("latest_revision") and time.time() - checked_at < REVISION_TTL:
+            return meta["latest_revision"]
+
+        revision = self.resolve_revision()
+        if revision is None:
+            return meta.get("latest_revision") or meta.get("revision")
+
+        if self.exists():
+            self._set_meta(latest_revision=revision, checked_at=time.time())
+        return revision
+
+    def is_current(self) -> bool:
+        meta = self._meta()
+        return bool(meta.get("revision")) and meta.get("revision") == self.current_revision()
+
+    def status(self) -> Dict[str, Any]:
+        if not self._meta():
+            return {"exists": False, "path": self.path}
+
+        latest = self.current_revision()
+        meta = self._meta()
+        return {
+            "exists": True,
+            "path": self.path,
+            "revision": meta.get("revision"),
+            "latest_revision": latest,
+            "current": meta.get("revision") == latest,
+            "packages": int(meta.get("packages", 0)),
+            "built_at": float(meta.get("built_at", 0)),
+            "fts": meta.get("fts", "none"),
+            "size": os.path.getsize(self.path),
+        }
+
+    # -------------------------------------------------------------------------
+    # Building
+    # -------------------------------------------------------------------------
+
+    def _dump(self) -> Iterable[Tuple[str, Dict[str, Any]]]:
+        """Full package set as (attribute path, details) pairs, streamed off the pipe."""
+        try:
+            yield from iter_json_command(self._nix("search", "nixpkgs", "^", "--json"))
+        except subprocess.CalledProcessError as e:
+            raise RuntimeError(e.stderr.strip() or f"nix search exited with {e.returncode}") from None
+
+    @staticmethod
+    def _create_schema(conn: sqlite3.Connection) -> str:
+        """Creates the tables and returns the full-text flavour that is available."""
+        conn.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)")
+        conn.execute(
+            "CREATE TABLE packages ("
+            "id INTEGER PRIMARY KEY, attr TEXT, name TEXT, pname TEXT, version TEXT, description TEXT)"
+        )
+        conn.execute("CREATE INDEX packages_name ON packages (name)")
+
+        # Trigram (SQLite >= 3.34) gives substring matching, plain FTS5 only whole tokens
+        for fts, tokenizer in (("trigram", "trigram"), ("fts5", "unicode61")):
+            try:
+                conn.execute(
+                    "CREATE VIRTUAL TABLE packages_fts USING fts5("
+                    "attr, name, description, content='packages', content_rowid='id', "
+                    f"tokenize='{tokenizer}')"
+                )
+                return fts
+            except sqlite3.OperationalError:
+                continue
+        return "none"
+
+    def _remove_stale_builds(self) -> None:
+        """
+        Deletes the temp databases of builds that never finished: a build running
+        in a daemon thread is killed at exit without reaching its cleanup.
+        """
+        directory, prefix = os.path.split(self.path)
+        try:
+            entries = os.listdir(directory)
+        except OSError:
+            return
+        for entry in entries:
+            # index.sqlite.<pid>.tmp, and its -journal
+            pid, _, suffix = entry[len(prefix) + 1:].partition(".")
+            if not entry.startswith(prefix + ".") or suffix not in ("tmp", "tmp-journal") or not pid.isdigit():
+                continue
+            path = os.path.join(directory, entry)
+            try:
+                if int(pid) != os.getpid() and _alive(int(pid)) and time.time() - os.path.getmtime(path) < STALE_BUILD_AGE:
+                    continue
+                os.remove(path)
+            except OSError:
+                continue
+
+    def build(self, revision: Optional[str] = None) -> int:
+        """
+        Rebuilds the index from a full dump of nixpkgs. The new database is written
+        next to the old one and renamed over it, so readers never see a partial index.
+        Returns the number of indexed packages. Refuses to build an index it couldn't
+        tag with a revision, as that could never be recognized as current.
+        """
+        if revision is None:
+            revision = self.resolve_revision()
+        if not revision:
+            raise RuntimeError("couldn't resolve the locked nixpkgs revision ('nix flake metadata nixpkgs' failed)")
+
+        self._remove_stale_builds()
+        temp_path = f"{self.path}.{os.getpid()}.tmp"
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+        try:
+            with closing(self._connect(temp_path)) as conn, conn:
+                fts = self._create_schema(conn)
+                count = 0
+                rows = []
+                for attr, details in self._dump():
+                    rows.append((
+                        attr,
+                        attr.split('.')[-1],
+                        details.get("pname", ""),
+                        details.get("version", "unknown"),
+                        details.get("description", ""),
+                    ))
+                    if len(rows) >= 5000:
+                        conn.executemany(
+                            "INSERT INTO packages (attr, name, pname, version, description) VALUES (?, ?, ?, ?, ?)",
+                            rows
+                        )
+                        count += len(rows)
+                        rows = []
+                if rows:
+                    conn.executemany(
+                        "INSERT INTO packages (attr, name, pname, version, description) VALUES (?, ?, ?, ?, ?)",
+                        rows
+                    )
+                    count += len(rows)
+
+                if fts != "none":
+                    conn.execute("INSERT INTO packages_fts (packages_fts) VALUES ('rebuild')")
+
+                now = time.time()
+                conn.executemany("INSERT INTO meta (key, value) VALUES (?, ?)", [
+                    ("revision", revision),
+                    ("latest_revision", revision),
+                    ("checked_at", str(now)),
+                    ("built_at", str(now)),
+                    ("packages", str(count)),
+                    ("fts", fts),
+                ])
+            os.replace(temp_path, self.path)
+            return count
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def refresh(self, force: bool = False) -> bool:
+        """Rebuilds only if the locked revision changed (or `force`). Returns True if rebuilt."""
+        revision = self.current_revision()
+        if not force and self.exists() and revision and self._meta().get("revision") == revision:
+            return False
+        self.build(revision)
+        return True
+
+    # -------------------------------------------------------------------------
+    # Querying
+    # -------------------------------------------------------------------------
+
+    def search(self, query: str) -> List[Dict[str, Any]]:
+        """
+        Packages whose attribute path, name or description match `query`,
+        case-insensitively. Like `nix search`, regular expressions are accepted;
+        an invalid one raises re.error.
+        """
+        # Compiled before querying: raised inside the SQLite function it would only
+        # surface as an opaque OperationalError
+        pattern = re.compile(query, re.IGNORECASE) if _REGEX_CHARS.search(query) else None
+
+        with closing(self._connect()) as conn:
+            fts = self._meta().get("fts", "none")
+
+            if pattern is not None:
+                conn.create_function(
+                    "matches", 3,
+                    lambda a, n, d: bool(pattern.search(a) or pattern.search(n) or pattern.search(d or "")),
+                    deterministic=True
+                )
+                rows = conn.execute(
+                    "SELECT * FROM packages WHERE matches(attr, name, description) ORDER BY id"
+                )
+            elif fts == "trigram" and len(query) >= 3:
+                phrase = '"' + query.replace('"', '""') + '"'
+                rows = conn.execute(
+                    "SELECT p.* FROM packages_fts f JOIN packages p ON p.id = f.rowid "
+                    "WHERE packages_fts MATCH ? ORDER BY p.id",
+                    (phrase,)
+                )
+            elif fts == "fts5" and query.isalnum():
+                rows = conn.execute(
+                    "SELECT p.* FROM packages_fts f JOIN packages p ON p.id = f.rowid "
+                    "WHERE packages_fts MATCH ? ORDER BY p.id",
+                    (f'"{query}"*',)
+                )
+            else:
+                like = "%" + query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+                rows = conn.execute(
+                    "SELECT * FROM packages WHERE attr LIKE ? ESCAPE '\\' OR description LIKE ? ESCAPE '\\' "
+                    "ORDER BY id",
+                    (like, like)
+                )
+
+            return [
+                {
+                    "name": row["name"],
+                    "id": row["attr"],
+                    "description": row["description"] or "",
+                    "version": row["version"] or "unknown",
+                }
+                for row in rows
+            ]
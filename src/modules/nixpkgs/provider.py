@@ -1,17 +1,136 @@
-import shutil
+import os
+import re
 import subprocess
 import json
 import sys
 import argparse
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 from core import PackageManager
-from utils import log_info, log_error, log_warn, run, Style
+from utils import log_info, log_error, log_warn, run, run_cached, run_process, iter_json_command, Style
+
+# Features the nix CLI calls below rely on
+REQUIRED_FEATURES = ["nix-command", "flakes"]
+
+# Cache lifetime for queries about (immutable) store paths
+STORE_QUERY_TTL = 30 * 24 * 60 * 60
+
+# <32 character hash>-<name>[-<version>]: the version starts at the first dash followed by a digit
+_STORE_NAME = re.compile(r"[0-9a-z]{32}-(?P<name>.+?)(?:-(?P<version>\d.*))?")
+
+def parse_store_path(path: str) -> Tuple[str, Optional[str]]:
+    """(name, version) of a store path like /nix/store/<hash>-git-2.44.0; version is None if absent."""
+    match = _STORE_NAME.fullmatch(path.rstrip("/").rsplit("/", 1)[-1])
+    if not match:
+        return "", None
+    return match.group("name"), match.group("version")
+
+def _query_pattern(query: str) -> "re.Pattern":
+    """`nix search` treats terms as case-insensitive regexes; plain text if it isn't one."""
+    try:
+        return re.compile(query, re.IGNORECASE)
+    except re.error:
+        return re.compile(re.escape(query), re.IGNORECASE)
+
+# `nix profile` manifest layouts we can read: 1 and 2 list the elements, 3 keys them by name
+MANIFEST_VERSIONS = (1, 2, 3)
+
+def profile_links() -> List[str]:
+    """Locations of the user's default nix profile link (legacy and XDG layouts)."""
+    state_home = os.environ.get("XDG_STATE_HOME") or os.path.expanduser("~/.local/state")
+    return [
+        os.path.expanduser("~/.nix-profile"),
+        os.path.join(state_home, "nix", "profile"),
+    ]
+
+def read_profile_manifest() -> Optional[Dict[str, Any]]:
+    """
+    The `nix profile` manifest (<profile>/manifest.json) of the first existing profile link,
+    read straight from disk. None when there is no such profile or its manifest version is
+    one we don't know, in which case `nix profile list --json` has to be asked instead.
+    """
+    for link in profile_links():
+        path = os.path.join(link, "manifest.json")
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            continue
+        except (OSError, ValueError):
+            return None
+        if not isinstance(manifest, dict) or manifest.get("version") not in MANIFEST_VERSIONS:
+            return None
+        return manifest
+    return None
+
+# Locked flake references carry the revision in the path (github:o/r/<rev>) or as ?rev=
+_LOCKED_REV = re.compile(r"[/=]([0-9a-f]{40})(?=[?&/]|$)")
+_LOCKED_NAR_HASH = re.compile(r"[?&]narHash=([^&]+)")
+
+def locked_revision(url: str) -> Optional[str]:
+    """Revision (or, failing that, narHash) a locked flake reference points at."""
+    match = _LOCKED_REV.search(url)
+    if match:
+        return match.group(1)
+    match = _LOCKED_NAR_HASH.search(url)
+    if match:
+        from urllib.parse import unquote
+        return unquote(match.group(1))
+    return None
 
 class NixProvider(PackageManager):
+    binary = "nix"
+    # A cold nixpkgs evaluation is slow
+    search_timeout = 60.0
+
     @property
     def name(self) -> str:
         return "nixpkgs"
 
+    def probe_capabilities(self, path: str) -> Dict[str, Any]:
+        features: List[str] = []
+        # 'nix config show' exists since 2.19, older versions only have 'show-config'
+        for cmd in ([path, "config", "show"], [path, "show-config"]):
+            result = run_process(cmd, timeout=30)
+            if result.returncode != 0:
+                continue
+            for line in result.stdout.splitlines():
+                key, _, value = line.partition("=")
+                if key.strip() == "experimental-features":
+                    features = value.split()
+                    break
+            break
+
+        return {"experimental_features": features}
+
+    def inventory_fingerprints(self) -> List[str]:
+        # The profile link points at a new generation after every change
+        return profile_links()
+
+    def _nix(self, *args: str) -> List[str]:
+        """Builds a nix argv with the absolute binary path, enabling flakes only if the config lacks them."""
+        cmd = [self.bin()]
+        enabled = self.probe().capabilities.get("experimental_features", [])
+        missing = [f for f in REQUIRED_FEATURES if f not in enabled]
+        if missing:
+            cmd += ["--extra-experimental-features", " ".join(missing)]
+        return cmd + list(args)
+
+    def index(self):
+        """Local full-text index of nixpkgs (see modules.nixpkgs.index)."""
+        # sqlite3 is only imported by commands that actually search
+        from modules.nixpkgs.index import NixIndex
+        return NixIndex(self._nix)
+
+    def refresh_index(self, force: bool = False) -> Optional[bool]:
+        if not self.is_available():
+            return None
+        return self.index().refresh(force=force)
+
+    def index_status(self) -> Optional[Dict[str, Any]]:
+        if not self.is_available():
+            return None
+        return self.index().status()
+
     def setup_parser(self, parser: argparse.ArgumentParser) -> None:
         parser.add_argument("--gc", action="store_true", help="Garbage collect the Nix store")
 
@@ -21,32 +140,52 @@ class NixProvider(PackageManager):
                 log_error("Nix is not installed.")
                 return
             log_info("Running Nix garbage collection...")
-            run(["nix", "store", "gc"])
+            run(self._nix("store", "gc"))
         else:
              print(f"{Style.BOLD}Nix Package Manager{Style.RESET}")
              print("Use 'poly nixpkgs --gc' to garbage collect.")
 
     def is_available(self) -> bool:
-        return shutil.which("nix") is not None
+        return self.probe().available
         
+    def package_key(self, package: str) -> str:
+        # `nixpkgs#vim` is what a bare `vim` installs
+        return package[len("nixpkgs#"):] if package.startswith("nixpkgs#") else package
+
+    def installed_names(self, package: str) -> List[str]:
+        key = self.package_key(package)
+        names = [key.lower()]
+        # Profile elements are named after the last attribute: python3Packages.requests
+        # installs as 'requests', github:owner/repo#packages.x86_64-linux.tool as 'tool'
+        if "#" in key or not any(c in key for c in ":/"):
+            last = key.rsplit("#", 1)[-1].rsplit(".", 1)[-1].lower()
+            if last and last not in names:
+                names.append(last)
+        return names
+
     def install(self, packages: List[str]) -> None:
         if not self.is_available():
             log_error("Nix is not installed.")
             return
 
-        for pkg in packages:
-            target = pkg if "#" in pkg else f"nixpkgs#{pkg}"
-            log_info(f"Adding '{Style.BOLD}{pkg}{Style.RESET}' (nix)...")
-            run(["nix", "profile", "add", "--impure", target])
+        # One `profile add` for all installables: the profile is locked and
+        # the registry resolved once. `vim` and `nixpkgs#vim` are the same target.
+        targets = list(dict.fromkeys(pkg if "#" in pkg else f"nixpkgs#{pkg}" for pkg in packages))
+        if not targets:
+            return
+        log_info(f"Adding {', '.join(f'{Style.BOLD}{t}{Style.RESET}' for t in targets)} (nix)...")
+        run(self._nix("profile", "add", "--impure", *targets))
 
     def uninstall(self, packages: List[str]) -> None:
         if not self.is_available():
             return
             
-        for pkg in packages:
-            log_info(f"Removing '{Style.BOLD}{pkg}{Style.RESET}' (nix)...")
-            # Using check_warnings=True mostly to catch "no match" errors nicely
-            run(["nix", "profile", "remove", pkg], check_warnings=True)
+        packages = list(dict.fromkeys(packages))
+        if not packages:
+            return
+        log_info(f"Removing {', '.join(f'{Style.BOLD}{p}{Style.RESET}' for p in packages)} (nix)...")
+        # Using check_warnings=True mostly to catch "no match" errors nicely
+        run(self._nix("profile", "remove", *packages), check_warnings=True)
 
     def upgrade(self, packages: Optional[List[str]] = None) -> None:
         if not self.is_available():
@@ -55,176 +194,262 @@ class NixProvider(PackageManager):
         if not packages:
             # Upgrade all
             log_info("Upgrading all Nix profile packages...")
-            run(["nix", "profile", "upgrade", "--impure", "--all"])
+            run(self._nix("profile", "upgrade", "--impure", "--all"))
         else:
-            # Upgrade specific
-            for pkg in packages:
-                log_info(f"Upgrading '{pkg}' (nix)...")
-                run(["nix", "profile", "upgrade", "--impure", pkg], check_warnings=True)
+            # Upgrade specific, all in one invocation
+            packages = list(dict.fromkeys(packages))
+            log_info(f"Upgrading {', '.join(packages)} (nix)...")
+            run(self._nix("profile", "upgrade", "--impure", *packages), check_warnings=True)
+
+    def _profile_elements(self) -> Optional[List[Dict[str, Any]]]:
+        """
+        Elements of the nix profile: name, origin, the flake they came from
+        (original_url), its locked reference (locked_url) and store paths.
+        None if the profile can't be read.
+        """
+        # The manifest has the same layout as `nix profile list --json`;
+        # the CLI is only needed for manifest versions we don't know
+        data = read_profile_manifest()
+        if data is None:
+            result = run_cached(
+                self._nix("profile", "list", "--json"),
+                fingerprints=self.inventory_fingerprints(),
+                env_keys=["NIX_CONFIG"]
+            )
+            if result.returncode != 0:
+                return None
+            data = json.loads(result.stdout)
+
+        elements = data.get("elements", {})
+        entries = []
+
+        # Handle dict structure (common in newer Nix versions)
+        if isinstance(elements, dict):
+            for name, details in elements.items():
+                entries.append({
+                    "name": name,
+                    "origin": details.get("originalUrl") or details.get("attrPath", "unknown"),
+                    "original_url": details.get("originalUrl"),
+                    "locked_url": details.get("url"),
+                    "store_paths": details.get("storePaths", []),
+                })
+
+        # Fallback for potential list structure (older versions?)
+        elif isinstance(elements, list):
+            for element in elements:
+                attr_path = element.get("attrPath") or element.get("url", "unknown")
+                entries.append({
+                    "name": attr_path.split('.')[-1] if '.' in attr_path else attr_path,
+                    "origin": attr_path,
+                    "original_url": element.get("originalUrl"),
+                    "locked_url": element.get("url"),
+                    "store_paths": element.get("storePaths", []),
+                })
+        return entries
 
     def list_packages(self) -> List[Dict[str, Any]]:
         if not self.is_available():
             return []
             
         try:
-            result = subprocess.run(
-                ["nix", "profile", "list", "--json"],
-                capture_output=True,
-                text=True
-            )
-            if result.returncode != 0:
+            entries = self._profile_elements()
+            if entries is None:
                 return []
-            
-            data = json.loads(result.stdout)
-            packages = []
-            elements = data.get("elements", {})
-            
-            def _resolve_version_fallback(store_path: str, pkg_name: str) -> str:
-                if not store_path or not pkg_name:
-                    return "unknown"
-                try:
-                    # Run: nix-store --query --references <store_path> | grep <pkg_name>
-                    # We'll do the grep in python to avoid shell pipes security issues if any
-                    res = subprocess.run(
-                        ["nix-store", "--query", "--references", store_path],
-                        capture_output=True,
-                        text=True
-                    )
-                    if res.returncode != 0:
-                        return "unknown"
-                    
-                    # Output is list of /nix/store/hash-name-ver
-                    # We filter for ones containing pkg_name
-                    candidates = []
-                    for line in res.stdout.splitlines():
-                        if pkg_name in line:
-                            candidates.append(line.strip())
-                    
-                    # Attempt to parse version from candidates
-                    # Example candidate: /nix/store/78562fr80k3r1wp7djvxvmm8s5p9m50z-bottles-unwrapped-60.1
-                    # Strategies:
-                    # 1. Look for one that seems to end in version numbers
-                    # 2. Heuristic: take the one that is NOT just the same as input if possible, 
-                    #    or matches name-version pattern.
-                    
-                    found_version = "unknown"
-                    
-                    for candidate in candidates:
-                        # Extract the filename part
-                        parts = candidate.split('/')
-                        if len(parts) < 4: continue
-                        filename = parts[3] 
-                        
-                        # Remove hash (32 chars) + dash = 33 chars
-                        if len(filename) <= 33: continue
-                        name_ver = filename[33:]
-                        
-                        # We want to extract version. 
-                        # name_ver like "bottles-unwrapped-60.1" or "bottles-60.1-bwrap" or "bottles-cli-60.1-bwrap"
-                        
-                        # Try to find the version part
-                        # Heuristic from before: first dash followed by digit
-                        ver_candidate = "unknown"
-                        for i in range(len(name_ver)):
-                             if name_ver[i] == '-' and i + 1 < len(name_ver) and name_ver[i+1].isdigit():
-                                 ver_candidate = name_ver[i+1:]
-                                 break
-                        
-                        if ver_candidate != "unknown":
-                             # If we found a version, we might want to prefer the Main package if we can identify it,
-                             # but usually just getting ANY version is better than unknown.
-                             # If we find multiple, maybe pick the shortest one assuming it is the main package?
-                             # Or just return the first one found.
-                             return ver_candidate
-
-                    return found_version
-                except Exception:
-                    return "unknown"
-
-            def _extract_version(store_paths: List[str], pkg_name: str) -> str:
-                if not store_paths: return "unknown"
-                
-                # Try from the main store path first (fast)
-                path = store_paths[0]
-                version = "unknown"
-                try:
-                     parts = path.split('/')
-                     if len(parts) > 3 and parts[1] == 'nix' and parts[2] == 'store':
-                         filename = parts[3]
-                         name_ver = filename[33:] # skip hash and dash
-                         
-                         for i in range(len(name_ver)):
-                             if name_ver[i] == '-' and i + 1 < len(name_ver) and name_ver[i+1].isdigit():
-                                 version = name_ver[i+1:]
-                                 break
-                except Exception:
-                    pass
-                
-                if version != "unknown":
-                    return version
-                    
-                # Fallback: query references
-                return _resolve_version_fallback(path, pkg_name)
-
-            # Handle dict structure (common in newer Nix versions)
-            if isinstance(elements, dict):
-                for name, details in elements.items():
-                    origin = details.get("originalUrl") or details.get("attrPath", "unknown")
-                    store_paths = details.get("storePaths", [])
-                    version = _extract_version(store_paths, name)
-                    packages.append({"name": name, "origin": origin, "version": version})
-
-            # Fallback for potential list structure (older versions?)
-            elif isinstance(elements, list):
-                for element in elements:
-                    attr_path = element.get("attrPath") or element.get("url", "unknown")
-                    name = attr_path.split('.')[-1] if '.' in attr_path else attr_path
-                    store_paths = element.get("storePaths", [])
-                    version = _extract_version(store_paths, name)
-                    packages.append({"name": name, "origin": attr_path, "version": version})
-                    
-            return packages
+
+            # The version is usually in the main store path's name; wrappers and
+            # buildEnvs without one are resolved from their references, all at once
+            versions = {}
+            unresolved = {}
+            for entry in entries:
+                store_paths = entry["store_paths"]
+                if not store_paths:
+                    continue
+                version = parse_store_path(store_paths[0])[1]
+                if version:
+                    versions[store_paths[0]] = version
+                else:
+                    unresolved[store_paths[0]] = entry["name"]
+            versions.update(self._reference_versions(unresolved))
+
+            return [
+                {
+                    "name": entry["name"],
+                    "origin": entry["origin"],
+                    "version": versions.get(entry["store_paths"][0], "unknown") if entry["store_paths"] else "unknown",
+                }
+                for entry in entries
+            ]
         except Exception:
             return []
 
-    def search(self, query: str) -> List[Dict[str, Any]]:
+    def outdated(self) -> Optional[List[Dict[str, Any]]]:
+        """
+        Profile elements locked to another revision than their flake currently
+        resolves to (e.g. the `nixpkgs` registry entry), which is exactly what
+        `nix profile upgrade` would change. Nothing is evaluated.
+        """
         if not self.is_available():
             return []
-        log_info(f"Searching for '{Style.BOLD}{query}{Style.RESET}' in nixpkgs...")
-        
         try:
-            # nix search nixpkgs <query> --json
-            # Note: Experimental feature, might need --extra-experimental-features 'nix-command flakes'
-            # But the existing code suggests 'nix profile' usage which implies 2.4+
-            cmd = ["nix", "search", "nixpkgs", query, "--json"]
-            result = subprocess.run(cmd, capture_output=True, text=True)
-            
+            entries = self._profile_elements()
+        except Exception:
+            return None
+        if entries is None:
+            return None
+
+        latest: Dict[str, Optional[str]] = {}
+        stale = []
+        for entry in entries:
+            flake = entry["original_url"]
+            if not flake:
+                # Not from a flake: nothing to compare, and nothing `profile upgrade` can do
+                continue
+            if flake not in latest:
+                latest[flake] = self._flake_revision(flake)
+            if latest[flake] is None:
+                # Can't tell without the current revision: let upgrade look at everything
+                return None
+
+            locked = locked_revision(entry["locked_url"] or "")
+            if locked == latest[flake]:
+                continue
+            version = parse_store_path(entry["store_paths"][0])[1] if entry["store_paths"] else None
+            stale.append({
+                "name": entry["name"],
+                "id": entry["name"],
+                "version": version or "unknown",
+                "latest": None,
+                "detail": f"locked to {(locked or 'unknown')[:7]}, {flake} is at {latest[flake][:7]}",
+            })
+        return stale
+
+    def _flake_revision(self, flake: str) -> Optional[str]:
+        """The revision `flake` currently locks to (nix keeps fetched flakes for its tarball-ttl)."""
+        try:
+            result = run_process(self._nix("flake", "metadata", flake, "--json"), timeout=60)
             if result.returncode != 0:
-                # Fallback or just return empty?
-                # Sometimes nix return non-zero if no matches?
-                return []
-            
-            data = json.loads(result.stdout)
-            packages = []
+                return None
+            locked = json.loads(result.stdout).get("locked", {})
+            return locked.get("rev") or locked.get("narHash")
+        except Exception:
+            return None
+
+    def _reference_versions(self, wanted: Dict[str, str]) -> Dict[str, str]:
+        """
+        Versions for store paths whose own name has none, taken from the first reference
+        whose name contains the package name and carries a version (e.g. bottles-60.1-bwrap
+        -> bottles-unwrapped-60.1). `wanted` maps store path -> package name.
+        All paths are looked up in a single `nix path-info` call, which unlike
+        `nix-store --query --references` keeps the references of each path apart.
+        """
+        if not wanted:
+            return {}
+        try:
+            # Store paths are immutable, so their references never change
+            res = run_cached(self._nix("path-info", "--json", *sorted(wanted)), ttl=STORE_QUERY_TTL)
+            if res.returncode != 0:
+                return {}
+            infos = json.loads(res.stdout)
+        except Exception:
+            return {}
+
+        # Nix < 2.19 prints a list of objects with a "path" key, newer versions a dict by path
+        if isinstance(infos, list):
+            infos = {info.get("path"): info for info in infos if isinstance(info, dict)}
+
+        versions = {}
+        for path, pkg_name in wanted.items():
+            info = infos.get(path) or {}
+            for reference in info.get("references", []):
+                if pkg_name not in reference:
+                    continue
+                version = parse_store_path(reference)[1]
+                if version:
+                    versions[path] = version
+                    break
+        return versions
+
+    def search(self, query: str) -> List[Dict[str, Any]]:
+        return self.search_many([query]).get(query, [])
+
+    def search_many(self, queries: List[str]) -> Dict[str, List[Dict[str, Any]]]:
+        queries = list(dict.fromkeys(queries))
+        if not self.is_available() or not queries:
+            return {q: [] for q in queries}
+        terms = ", ".join(f"'{Style.BOLD}{q}{Style.RESET}'" for q in queries)
+        log_info(f"Searching for {terms} in nixpkgs...")
+
+        # Terms are regexes to both the index and `nix search`: report a broken one
+        # here, once, instead of failing (and falling back) on it
+        invalid = {}
+        for q in queries:
+            try:
+                re.compile(q)
+            except re.error as e:
+                log_warn(f"Invalid search pattern '{q}': {e}")
+                invalid[q] = []
+        queries = [q for q in queries if q not in invalid]
+        if not queries:
+            return invalid
+
+        index = self.index()
+        if index.exists():
+            try:
+                # A rebuild takes longer than any search deadline, so it is left to
+                # `mixtura index refresh`; until then the previous revision's index answers
+                if not index.is_current():
+                    log_warn("The nixpkgs index is out of date. Run 'mixtura index refresh nixpkgs' to rebuild it.")
+                found = dict(invalid)
+                for q in queries:
+                    packages = index.search(q)
+                    for pkg in packages:
+                        pkg["provider"] = self.name
+                    found[q] = packages
+                return found
+            except Exception as e:
+                log_warn(f"Nix index lookup failed, falling back to 'nix search': {e}")
+        
+        try:
+            # Several regexes given to `nix search` must *all* match, so the terms are
+            # joined into one alternation: a single evaluation of nixpkgs for the batch.
+            # _nix adds --extra-experimental-features when the probe saw them disabled
+            combined = queries[0] if len(queries) == 1 else "|".join(f"({q})" for q in queries)
+            cmd = self._nix("search", "nixpkgs", combined, "--json")
+            found = dict(invalid, **{q: [] for q in queries})
+            patterns = {q: _query_pattern(q) for q in queries}
             
             # Structure: { "legacyPackages.x86_64-linux.pkgName": { "description": "...", "version": "..." } }
-            for key, details in data.items():
+            # Entries are parsed off the pipe one at a time instead of loading the whole
+            # (possibly hundreds of MB) document first.
+            for key, details in iter_json_command(cmd):
                 # key is usually something like "legacyPackages.x86_64-linux.git"
                 # we want the last part as name usually
                 name = key.split('.')[-1]
                 version = details.get('version', 'unknown')
                 desc = details.get('description', '')
                 
-                packages.append({
+                package = {
                     "name": name,
                     "id": key, # Provide full attribute path as ID
                     "description": desc,
                     "version": version,
                     "provider": self.name
-                })
+                }
+
+                if len(queries) == 1:
+                    found[queries[0]].append(package)
+                    continue
+                # Split the combined answer back per term, matching what nix matched on
+                attr = key.split('.', 2)[-1]
+                for q, pattern in patterns.items():
+                    if pattern.search(attr) or pattern.search(details.get('pname', '')) or pattern.search(desc):
+                        found[q].append(dict(package))
             
-            return packages
+            return found
 
+        except subprocess.CalledProcessError:
+            # Sometimes nix return non-zero if no matches?
+            return dict(invalid, **{q: [] for q in queries})
         except Exception as e:
             log_warn(f"Nix search failed: {e}")
-            return []
+            return dict(invalid, **{q: [] for q in queries})
@@ -0,0 +1,162 @@
+import time
+import subprocess
+from typing import Dict, List, Optional, Tuple
+from core import PackageManager
+from manager import ModuleManager
+from utils import log_error, log_task, log_warn, set_job_prefix, set_raise_failures, Renderer, Style
+
+# Order the actions of one provider run in: removals first, so installs can take
+# over what they freed, and upgrades last, once the package set is final
+ACTIONS = ("remove", "install", "upgrade")
+
+_VERBS = {"remove": "Removing", "install": "Installing", "upgrade": "Upgrading"}
+
+class Plan:
+    """
+    The package operations requested by one command, grouped per provider and action.
+
+    Requests are de-duplicated as they are added and every (provider, action) pair
+    becomes a single provider call, which the providers turn into one backend
+    invocation (`nix profile add a b c`, `flatpak uninstall -y a b c`, ...).
+    Providers run in the order they were first named, actions in ACTIONS order.
+    """
+
+    def __init__(self, manager: Optional[ModuleManager] = None):
+        self.manager = manager or ModuleManager.get_instance()
+        # Provider name -> action -> packages; None is "everything" (upgrade only)
+        self._steps: Dict[str, Dict[str, Optional[List[str]]]] = {}
+
+    def add(self, provider: str, action: str, packages: Optional[List[str]] = None) -> None:
+        """Queues `action` for `packages` in `provider`; upgrade with packages=None upgrades everything."""
+        if action not in ACTIONS:
+            raise ValueError(f"Unknown action '{action}'")
+        steps = self._steps.setdefault(provider, {})
+
+        if action == "upgrade" and packages is None:
+            steps["upgrade"] = None
+            return
+        if action in steps and steps[action] is None:
+            # Already upgrading everything in this provider
+            return
+
+        mgr = self.manager.get_manager(provider)
+        queued = steps.setdefault(action, [])
+        for pkg in packages or []:
+            pkg = mgr.package_key(pkg) if mgr else pkg
+            if pkg not in queued:
+                queued.append(pkg)
+
+    def steps(self) -> List[Tuple[str, str, Optional[List[str]]]]:
+        """(provider, action, packages) in execution order, empty steps left out."""
+        ordered = []
+        for provider, steps in self._steps.items():
+            installing = set(steps.get("install") or [])
+            for action in ACTIONS:
+                if action not in steps:
+                    continue
+                packages = steps[action]
+                if action == "upgrade" and packages is not None:
+                    # A fresh install already is the latest version
+                    packages = [p for p in packages if p not in installing]
+                if packages is None or packages:
+                    ordered.append((provider, action, packages))
+        return ordered
+
+    def __bool__(self) -> bool:
+        return bool(self.steps())
+
+    def show(self) -> None:
+        """Prints the plan: one line per backend call."""
+        steps = self.steps()
+        width = max(len(provider) for provider, _, _ in steps)
+        lines = [f"{Style.BOLD}{Style.INFO}:: Plan ({len(steps)} backend calls){Style.RESET}"]
+        for provider, action, packages in steps:
+            target = ", ".join(packages) if packages is not None else f"{Style.DIM}(all packages){Style.RESET}"
+            lines.append(f"  {Style.BOLD}{provider.ljust(width)}{Style.RESET}  {action.ljust(7)}  {target}")
+        out = Renderer.get_instance()
+        out.lines(lines + [""])
+        out.flush()
+
+    def execute(self, jobs: int = 1) -> int:
+        """
+        Runs every step through its provider, in order, and returns the exit code.
+
+        With `jobs` > 1 up to that many providers run at the same time, each in its
+        own thread: their output is prefixed with the provider name, a failing
+        provider doesn't stop the others, and a summary per provider follows.
+        The exit code is then that of the first failed provider (plan order), else 0.
+        Run one at a time, the first failed step ends the plan with its exit code.
+        Anything else that exits (e.g. Ctrl+C) still exits.
+        """
+        runnable: Dict[str, List[Tuple[str, Optional[List[str]]]]] = {}
+        managers: Dict[str, PackageManager] = {}
+        for provider, action, packages in self.steps():
+            mgr = self.manager.get_manager(provider)
+            if not mgr:
+                log_warn(f"Package manager '{provider}' is not available or not found.")
+                continue
+            if not mgr.is_available():
+                log_error(f"Provider '{mgr.name}' is not available.")
+                continue
+            managers[provider] = mgr
+            runnable.setdefault(provider, []).append((action, packages))
+
+        if jobs <= 1 or len(runnable) < 2:
+            # The first failed step stops the plan; its exit code is returned, not exited with
+            set_raise_failures(True)
+            try:
+                for provider, steps in runnable.items():
+                    for action, packages in steps:
+                        self._run_step(managers[provider], action, packages)
+            except subprocess.CalledProcessError as e:
+                return e.returncode or 1
+            finally:
+                set_raise_failures(False)
+            return 0
+
+        width = max(len(provider) for provider in runnable)
+
+        def _job(provider: str) -> Tuple[int, float]:
+            set_job_prefix(f"{Style.DIM}{provider.ljust(width)} │{Style.RESET} ")
+            start = time.monotonic()
+            try:
+                for action, packages in runnable[provider]:
+                    self._run_step(managers[provider], action, packages)
+                return 0, time.monotonic() - start
+            except subprocess.CalledProcessError as e:
+                return e.returncode or 1, time.monotonic() - start
+            except Exception as e:
+                log_error(str(e))
+                return 1, time.monotonic() - start
+            finally:
+                set_job_prefix(None)
+
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=jobs) as pool:
+            results = dict(zip(runnable, pool.map(_job, runnable)))
+
+        lines = [""]
+        for provider, (code, elapsed) in results.items():
+            if code:
+                lines.append(f"  {Style.ERROR}✖{Style.RESET}  {provider.ljust(width)}  failed (exit {code}) after {elapsed:.1f}s")
+            else:
+                lines.append(f"  {Style.SUCCESS}✔{Style.RESET}  {provider.ljust(width)}  done in {elapsed:.1f}s")
+        out = Renderer.get_instance()
+        out.lines(lines)
+        out.flush()
+
+        return next((code for code, _ in results.values() if code), 0)
+
+    @staticmethod
+    def _run_step(mgr: PackageManager, action: str, packages: Optional[List[str]]) -> None:
+        if packages is None:
+            log_task(f"{_VERBS[action]} all packages via {mgr.name}...")
+        else:
+            log_task(f"{_VERBS[action]} {len(packages)} packages via {mgr.name}...")
+
+        if action == "install":
+            mgr.install(packages)
+        elif action == "remove":
+            mgr.uninstall(packages)
+        else:
+            mgr.upgrade(packages)
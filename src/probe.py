@@ -0,0 +1,129 @@
+import os
+import zlib
+import threading
+from typing import Any, Callable, Dict, List, Optional
+from utils import cache_dir, read_json, run_process, write_json_atomic
+
+# How many distinct PATH values we keep probe results for on disk
+MAX_PATH_ENTRIES = 8
+
+class Probe:
+    """
+    Result of probing a backend binary: absolute path, version string and
+    provider-specific capabilities (e.g. nix experimental features).
+    """
+
+    def __init__(self, binary: str, path: Optional[str] = None, version: str = "unknown",
+                 capabilities: Optional[Dict[str, Any]] = None):
+        self.binary = binary
+        self.path = path
+        self.version = version
+        self.capabilities = capabilities or {}
+
+    @property
+    def available(self) -> bool:
+        return self.path is not None
+
+    def __repr__(self) -> str:
+        return f"Probe({self.binary!r}, path={self.path!r}, version={self.version!r})"
+
+# In-process results, keyed by binary name
+_probes: Dict[str, Probe] = {}
+_lock = threading.Lock()
+
+def _state_path() -> str:
+    return os.path.join(cache_dir(), "probes.json")
+
+def _path_key() -> str:
+    return format(zlib.crc32(os.environ.get("PATH", "").encode()), "08x")
+
+def _mtime(path: str) -> Optional[int]:
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+def _fingerprint(path: str, fingerprint_files: List[str]) -> List[Optional[int]]:
+    return [_mtime(path)] + [_mtime(f) for f in fingerprint_files]
+
+def _read_version(path: str) -> str:
+    try:
+        result = run_process([path, "--version"], timeout=10)
+        lines = result.stdout.strip().splitlines()
+        return lines[0].strip() if lines else "unknown"
+    except Exception:
+        return "unknown"
+
+def probe_binary(
+    binary: str,
+    capabilities: Optional[Callable[[str], Dict[str, Any]]] = None,
+    fingerprint_files: Optional[List[str]] = None
+) -> Probe:
+    """
+    Resolves `binary` once per process. Results are also persisted under the XDG
+    cache, keyed by $PATH, and reused as long as the binary's mtime (plus the
+    mtimes of `fingerprint_files`, for capabilities that live in config files)
+    is unchanged. Missing binaries are never persisted so a fresh install is
+    picked up immediately.
+    """
+    with _lock:
+        if binary in _probes:
+            return _probes[binary]
+
+        fingerprint_files = fingerprint_files or []
+        state = read_json(_state_path(), {})
+        if not isinstance(state, dict):
+            state = {}
+        entries = state.setdefault(_path_key(), {})
+
+        cached = entries.get(binary)
+        if cached and cached.get("path") and cached.get("fingerprint") == _fingerprint(cached["path"], fingerprint_files):
+            result = Probe(binary, cached["path"], cached.get("version", "unknown"), cached.get("capabilities"))
+            _probes[binary] = result
+            return result
+
+        # shutil drags in compression modules, only import it on a cache miss
+        import shutil
+        path = shutil.which(binary)
+        if path is None:
+            result = Probe(binary)
+            _probes[binary] = result
+            return result
+
+        path = os.path.abspath(path)
+        caps = {}
+        if capabilities:
+            try:
+                caps = capabilities(path) or {}
+            except Exception:
+                caps = {}
+
+        result = Probe(binary, path, _read_version(path), caps)
+        _probes[binary] = result
+
+        entries[binary] = {
+            "path": path,
+            "fingerprint": _fingerprint(path, fingerprint_files),
+            "version": result.version,
+            "capabilities": caps,
+        }
+        # Keep the most recently written PATH keys only
+        state.pop(_path_key())
+        state[_path_key()] = entries
+        while len(state) > MAX_PATH_ENTRIES:
+            state.pop(next(iter(state)))
+
+        try:
+            write_json_atomic(_state_path(), state)
+        except OSError:
+            pass
+
+        return result
+
+def forget(binary: Optional[str] = None) -> None:
+    """Drops in-process probe results (all of them if `binary` is None)."""
+    with _lock:
+        if binary is None:
+            _probes.clear()
+        else:
+            _probes.pop(binary, None)
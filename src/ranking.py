@@ -0,0 +1,124 @@
+import os
+import re
+import heapq
+import difflib
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# Score of each match tier, best first
+EXACT = 100.0
+PREFIX = 80.0
+TOKEN = 60.0
+SUBSTRING = 50.0
+DESCRIPTION_TOKEN = 30.0
+DESCRIPTION = 20.0
+FUZZY = 10.0
+# The provider matched it, but none of the tiers above apply (e.g. regex queries)
+OTHER = 1.0
+
+# Minimum difflib ratio for a name to count as a fuzzy match
+FUZZY_CUTOFF = 0.6
+
+# Preferred providers first; later ones get a slightly lower weight
+DEFAULT_PREFERENCE = ["nixpkgs", "flatpak", "homebrew"]
+PREFERENCE_STEP = 0.05
+
+_TOKEN_SPLIT = re.compile(r"[\s\-_.:/+]+")
+
+def provider_preference() -> List[str]:
+    """Provider order from MIXTURA_PROVIDER_PREFERENCE (comma separated), or the default."""
+    value = os.environ.get("MIXTURA_PROVIDER_PREFERENCE")
+    if value:
+        return [p.strip() for p in value.split(",") if p.strip()]
+    return DEFAULT_PREFERENCE
+
+def provider_weights(preference: Optional[List[str]] = None) -> Dict[str, float]:
+    preference = preference or provider_preference()
+    return {name: 1.0 - i * PREFERENCE_STEP for i, name in enumerate(preference)}
+
+def score(result: Dict[str, Any], query: str, weights: Optional[Dict[str, float]] = None) -> float:
+    """
+    Relevance of one search result. Tiers: exact name, name prefix, name token,
+    name substring, description token, description substring, fuzzy name.
+    The tier score is scaled by provider preference; shorter names win ties.
+    """
+    q = query.lower()
+    name = (result.get("name") or "").lower()
+    # Attribute paths / app ids often carry the real name in their last segment
+    ident = (result.get("id") or "").lower().rsplit(".", 1)[-1]
+    description = (result.get("description") or "").lower()
+
+    if q in (name, ident):
+        base = EXACT
+    elif name.startswith(q) or ident.startswith(q):
+        base = PREFIX
+    elif q in _TOKEN_SPLIT.split(name):
+        base = TOKEN
+    elif q in name or q in ident:
+        base = SUBSTRING
+    elif q in _TOKEN_SPLIT.split(description):
+        base = DESCRIPTION_TOKEN
+    elif q in description:
+        base = DESCRIPTION
+    else:
+        ratio = difflib.SequenceMatcher(None, q, name).ratio() if name else 0.0
+        base = FUZZY * ratio if ratio >= FUZZY_CUTOFF else OTHER
+
+    weight = (weights or {}).get(result.get("provider", ""), 1.0 - len(weights or {}) * PREFERENCE_STEP)
+    return base * weight - min(len(name), 100) * 0.001
+
+class Ranker:
+    """
+    Incremental, bounded ranking of the results for one query.
+
+    Results are added in batches as they arrive (e.g. one per provider) and only the
+    best `limit * page` are ever held, in a heap, so memory stays proportional to what
+    can be shown rather than to the number of hits. A `limit` of 0 means no limit.
+    Ties go to the earlier source, then to the earlier result within it, so the order
+    doesn't depend on which source answered first.
+    """
+
+    def __init__(self, query: str, limit: int = 20, page: int = 1, weights: Optional[Dict[str, float]] = None):
+        self.query = query
+        self.limit = limit
+        self.page = page
+        self.weights = provider_weights() if weights is None else weights
+        self.total = 0
+        self._keep = limit * page if limit > 0 else 0
+        self._heap: List[Tuple[float, int, int, Dict[str, Any]]] = []
+        self._added: Dict[int, int] = {}
+
+    def add(self, results: Iterable[Dict[str, Any]], source: int = 0) -> None:
+        """Scores `results` (any iterable, consumed once), the next batch from `source`."""
+        seq = self._added.get(source, 0)
+        for result in results:
+            s = score(result, self.query, self.weights)
+            self.total += 1
+            item = (s, -source, -seq, result)
+            seq += 1
+            if not self._keep or len(self._heap) < self._keep:
+                heapq.heappush(self._heap, item)
+            elif item[:3] > self._heap[0][:3]:
+                heapq.heapreplace(self._heap, item)
+        self._added[source] = seq
+
+    def results(self) -> Tuple[List[Dict[str, Any]], int]:
+        """(the requested page of results, best first, total matches)."""
+        ordered = [r for *_, r in sorted(self._heap, key=lambda x: x[:3], reverse=True)]
+        if self.limit > 0:
+            ordered = ordered[self.limit * (self.page - 1):self.limit * self.page]
+        return ordered, self.total
+
+def rank(
+    results: Iterable[Dict[str, Any]],
+    query: str,
+    limit: int = 20,
+    page: int = 1,
+    weights: Optional[Dict[str, float]] = None
+) -> Tuple[List[Dict[str, Any]], int]:
+    """
+    Ranks `results` (any iterable, consumed once) and returns (page of results, total matches).
+    See Ranker, which this feeds in one batch.
+    """
+    ranker = Ranker(query, limit=limit, page=page, weights=weights)
+    ranker.add(results)
+    return ranker.results()
@@ -1,6 +1,19 @@
+import os
 import sys
+import json
+import time
+import signal
+import threading
 import subprocess
-from typing import List
+from collections import OrderedDict
+from typing import IO, Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+_LOGO = """
+    ▙▗▌ ▗      ▐              
+    ▌▘▌ ▄  ▚▗▘ ▜▀  ▌ ▌ ▙▀▖ ▝▀▖
+    ▌ ▌ ▐  ▗▚  ▐ ▖ ▌ ▌ ▌   ▞▀▌
+    ▘ ▘ ▀▘ ▘ ▘  ▀  ▝▀▘ ▘   ▝▀▘
+"""
 
 class Style:
     RESET = "\033[0m"
@@ -14,47 +27,203 @@ class Style:
     INFO = "\033[38;2;100;200;255m"    # Sparkle Blue (was BLUE)
     MAIN = "\033[38;2;200;160;255m"    # Lavender/Mix (was CYAN)
 
-    ASCII = f"""{MAIN}
-    ▙▗▌ ▗      ▐              
-    ▌▘▌ ▄  ▚▗▘ ▜▀  ▌ ▌ ▙▀▖ ▝▀▖
-    ▌ ▌ ▐  ▗▚  ▐ ▖ ▌ ▌ ▌   ▞▀▌
-    ▘ ▘ ▀▘ ▘ ▘  ▀  ▝▀▘ ▘   ▝▀▘
-{RESET}"""
+    ASCII = f"{MAIN}{_LOGO}{RESET}"
+
+    @classmethod
+    def disable(cls) -> None:
+        """Plain text from here on: every escape code becomes empty."""
+        for attr in ("RESET", "BOLD", "DIM", "ERROR", "SUCCESS", "WARNING", "INFO", "MAIN"):
+            setattr(cls, attr, "")
+        cls.ASCII = _LOGO
+
+# Escape codes only make sense on a terminal (NO_COLOR: https://no-color.org)
+if os.environ.get("NO_COLOR") or not sys.stdout.isatty():
+    Style.disable()
+
+# -----------------------------------------------------------------------------
+# Output
+# -----------------------------------------------------------------------------
+
+# Buffered output is written out once it reaches this size (or on flush)
+OUTPUT_BUFFER_BYTES = 64 * 1024
+
+class Renderer:
+    """
+    Buffered writer for everything printed to stdout: lines are collected and
+    written in bulk, when the buffer fills or on flush(). Log helpers go through
+    the same instance and flush right away, so logs and buffered output keep
+    their order.
+
+    In a machine format ('json': one array, 'ndjson': one object per line)
+    record() streams packages as JSON and log lines move to stderr, leaving
+    stdout parseable.
+    """
+
+    _instance: Optional["Renderer"] = None
+
+    def __init__(self, limit: int = OUTPUT_BUFFER_BYTES):
+        self.limit = limit
+        self.format: Optional[str] = None
+        self._parts: List[str] = []
+        self._size = 0
+        self._records = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def get_instance(cls) -> "Renderer":
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    @property
+    def machine(self) -> bool:
+        return self.format is not None
+
+    def _write(self, text: str) -> None:
+        with self._lock:
+            self._parts.append(text)
+            self._size += len(text)
+            if self._size >= self.limit:
+                self._flush_locked()
+
+    def _flush_locked(self) -> None:
+        if self._parts:
+            sys.stdout.write("".join(self._parts))
+            self._parts.clear()
+            self._size = 0
+        sys.stdout.flush()
+
+    def flush(self) -> None:
+        with self._lock:
+            self._flush_locked()
+
+    def line(self, text: str = "") -> None:
+        self._write(text + "\n")
+
+    def lines(self, texts: Iterable[str]) -> None:
+        self._write("".join(t + "\n" for t in texts))
+
+    def log(self, text: str, error: bool = False) -> None:
+        """A log line: stdout (stderr for errors and in machine formats), written immediately."""
+        if error or self.machine:
+            self.flush()
+            print(text, file=sys.stderr, flush=True)
+        else:
+            self.line(text)
+            self.flush()
+
+    def set_format(self, fmt: Optional[str]) -> None:
+        """Machine format ('json' or 'ndjson') for the rest of the process, None for text."""
+        self.format = fmt
+
+    def start_records(self) -> None:
+        self._records = 0
+        if self.format == "json":
+            self._write("[")
+
+    def record(self, record: Dict[str, Any]) -> None:
+        text = json.dumps(record, ensure_ascii=False, default=str)
+        if self.format == "json":
+            text = ("," if self._records else "") + "\n  " + text
+        else:
+            text += "\n"
+        self._records += 1
+        self._write(text)
+
+    def end_records(self) -> None:
+        if self.format == "json":
+            self._write("\n]\n" if self._records else "]\n")
+        self.flush()
+
+# Set in the worker threads of concurrent plan execution (plan.Plan.execute with jobs):
+# everything that thread logs is prefixed with it, and run() raises instead of exiting.
+# Search workers set a deadline for the processes they start (see set_deadline).
+_job = threading.local()
+
+def job_prefix() -> Optional[str]:
+    return getattr(_job, "prefix", None)
+
+def set_job_prefix(prefix: Optional[str]) -> None:
+    _job.prefix = prefix
+
+def set_raise_failures(enabled: bool) -> None:
+    """Makes run() in this thread raise CalledProcessError on failure instead of exiting."""
+    _job.raise_failures = enabled
+
+def set_deadline(deadline: Optional[float]) -> None:
+    """
+    Stops every backend process this thread starts at `deadline` (a time.monotonic()
+    value), whatever timeout the caller asked for: run_process raises TimeoutExpired
+    and iter_json_command is killed. None lifts it.
+    """
+    _job.deadline = deadline
+
+def _deadline(timeout: Optional[float]) -> Optional[float]:
+    """The earlier of `timeout` from now and this thread's deadline."""
+    deadline = None if timeout is None else time.monotonic() + timeout
+    limit = getattr(_job, "deadline", None)
+    if limit is not None and (deadline is None or limit < deadline):
+        return limit
+    return deadline
+
+def _log(text: str, error: bool = False) -> None:
+    prefix = job_prefix()
+    Renderer.get_instance().log(f"{prefix}{text}" if prefix else text, error)
 
 def log_info(msg: str) -> None:
-    print(f"{Style.INFO}ℹ{Style.RESET}  {msg}")
+    _log(f"{Style.INFO}ℹ{Style.RESET}  {msg}")
 
 def log_task(msg: str) -> None:
-    print(f"{Style.BOLD}{Style.MAIN}==>{Style.RESET} {msg}")
+    _log(f"{Style.BOLD}{Style.MAIN}==>{Style.RESET} {msg}")
 
 def log_success(msg: str) -> None:
-    print(f"{Style.SUCCESS}✔{Style.RESET}  {msg}")
+    _log(f"{Style.SUCCESS}✔{Style.RESET}  {msg}")
 
 def log_warn(msg: str) -> None:
-    print(f"{Style.WARNING}⚠{Style.RESET}  {msg}")
+    _log(f"{Style.WARNING}⚠{Style.RESET}  {msg}")
 
 def log_error(msg: str) -> None:
-    print(f"{Style.ERROR}✖  Error:{Style.RESET} {msg}", file=sys.stderr)
+    _log(f"{Style.ERROR}✖  Error:{Style.RESET} {msg}", error=True)
 
 # -----------------------------------------------------------------------------
 # System Helpers
 # -----------------------------------------------------------------------------
 
 def run(cmd: List[str], silent: bool = False, check_warnings: bool = False) -> None:
-    """Executes a subprocess command with visual error handling."""
+    """
+    Executes a subprocess command with visual error handling.
+    A failure exits the process, except in a job thread (see set_job_prefix), where
+    the output is echoed with the job's prefix, and under set_raise_failures: there
+    CalledProcessError is raised.
+    """
     cmd_str = " ".join(cmd)
+    prefix = job_prefix()
     
     if not silent:
-        print(f"   {Style.DIM}$ {cmd_str}{Style.RESET}")
+        _log(f"   {Style.DIM}$ {cmd_str}{Style.RESET}")
 
     try:
-        # If we need to check warnings, we must capture output
-        if check_warnings:
-            result = subprocess.run(cmd, capture_output=True, text=True)
-            if result.stdout:
-                print(result.stdout, end='')
-            if result.stderr:
-                print(result.stderr, file=sys.stderr, end='')
+        if prefix is not None:
+            # Concurrent jobs share the terminal: no input, every line tagged with its job
+            out = Renderer.get_instance()
+            result = run_process(
+                cmd,
+                on_output=lambda stream, line: out.log(prefix + line, error=stream == "stderr"),
+                stdin=subprocess.DEVNULL,
+                # --jobs already bounds how many of these run at once
+                throttle=False
+            )
+            failed = result.returncode != 0 or (check_warnings and (
+                "does not match any packages" in result.stderr or "No packages to" in result.stderr))
+            if failed:
+                raise subprocess.CalledProcessError(result.returncode or 1, cmd, result.stdout, result.stderr)
+
+        # If we need to check warnings, we must capture output (echoed line by line as it comes)
+        elif check_warnings:
+            result = run_process(
+                cmd,
+                on_output=lambda stream, line: print(line, file=sys.stderr if stream == "stderr" else sys.stdout)
+            )
             
             if result.returncode != 0:
                 raise subprocess.CalledProcessError(result.returncode, cmd)
@@ -63,18 +232,549 @@ def run(cmd: List[str], silent: bool = False, check_warnings: bool = False) -> N
             if "does not match any packages" in err_output or "No packages to" in err_output:
                 raise subprocess.CalledProcessError(1, cmd)
         else:
-            subprocess.run(cmd, check=True)
+            result = run_process(cmd, capture=False)
+            if result.returncode != 0:
+                raise subprocess.CalledProcessError(result.returncode, cmd)
 
     except subprocess.CalledProcessError as e:
+        if prefix is not None:
+            log_error(f"Command failed with exit code {e.returncode}: {cmd_str}")
+            raise
         print() # Blank line to separate
         log_error(f"Failed to execute command.")
         log_info(f"Command: {cmd_str}")
         log_info(f"Exit code: {e.returncode}")
+        if getattr(_job, "raise_failures", False):
+            raise
         sys.exit(e.returncode)
     except KeyboardInterrupt:
         print()
         log_warn("Operation cancelled by user.")
         sys.exit(130)
+    finally:
+        # Whatever this command changed, cached read-only answers from the same backend are suspect
+        group = command_group(cmd)
+        invalidate_cached(group)
+        for listener in _mutation_listeners:
+            listener(group)
+
+# Called with the command group (see command_group) after every command run() executes
+_mutation_listeners: List[Callable[[str], None]] = []
+
+def on_mutation(listener: Callable[[str], None]) -> None:
+    """Registers `listener(group)` to hear about every mutation made through run()."""
+    _mutation_listeners.append(listener)
+
+def env_number(name: str, default: Any) -> Any:
+    """$name parsed as the type of `default` (int or float); `default` if unset or not a number."""
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    try:
+        return type(default)(value)
+    except ValueError:
+        return default
+
+def cache_dir(*parts: str) -> str:
+    """Returns (and creates) a directory under $XDG_CACHE_HOME/mixtura."""
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    path = os.path.join(base, "mixtura", *parts)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+def read_json(path: str, default: Any = None) -> Any:
+    """Reads a JSON file, returning `default` if it is missing or corrupt."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+def write_json_atomic(path: str, data: Any) -> None:
+    """Writes JSON to a temp file and renames it over `path` so readers never see partial data."""
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(temp_path, path)
+
+# -----------------------------------------------------------------------------
+# Memoized Read-only Commands
+# -----------------------------------------------------------------------------
+
+# Defaults for run_cached
+CACHE_TTL = 60 * 60
+CACHE_MAX_BYTES = 32 * 1024 * 1024
+CACHE_MAX_MEMORY_ENTRIES = 256
+
+# Executables that share cached state with another backend binary
+_COMMAND_GROUPS = {
+    "nix-store": "nix",
+    "nix-env": "nix",
+}
+
+_memo: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+_memo_lock = threading.Lock()
+
+def command_group(cmd: List[str]) -> str:
+    """The backend a command belongs to, used to invalidate cached entries together."""
+    name = os.path.basename(cmd[0]) if cmd else ""
+    return _COMMAND_GROUPS.get(name, name)
+
+def path_fingerprint(path: str) -> List[Any]:
+    """Cheap identity of a path's current state: target, mtime and size."""
+    try:
+        st = os.stat(path)
+        # realpath: profile links switch target without the target's mtime changing (nix store paths are mtime 1)
+        return [path, os.path.realpath(path), st.st_mtime_ns, st.st_size]
+    except OSError:
+        return [path, None]
+
+def _commands_dir() -> str:
+    return cache_dir("commands")
+
+def run_cached(
+    cmd: List[str],
+    fingerprints: Iterable[str] = (),
+    env_keys: Iterable[str] = (),
+    ttl: float = CACHE_TTL,
+    group: Optional[str] = None
+) -> subprocess.CompletedProcess:
+    """
+    Runs a read-only command, reusing a previous result when nothing it depends on changed.
+
+    Results are keyed by argv plus the values of `env_keys`, and are valid while every
+    path in `fingerprints` (profile manifests, install dirs...) keeps the same target,
+    mtime and size, and the entry is younger than `ttl` seconds. Lookups hit a small
+    in-process LRU first, then the on-disk cache (size-capped, least recently used
+    entries evicted). Only successful runs are cached. Mutations through run()
+    invalidate every entry of the same command group.
+    """
+    group = group or command_group(cmd)
+    env = {k: os.environ.get(k) for k in sorted(env_keys)}
+
+    import hashlib
+    key = hashlib.sha1(json.dumps([cmd, env]).encode()).hexdigest()
+    fingerprint = [path_fingerprint(p) for p in fingerprints]
+    now = time.time()
+
+    def _valid(entry: Any) -> bool:
+        return (isinstance(entry, dict) and entry.get("fingerprint") == fingerprint
+                and now - entry.get("created", 0) < ttl)
+
+    with _memo_lock:
+        entry = _memo.get(key)
+        if _valid(entry):
+            _memo.move_to_end(key)
+            return subprocess.CompletedProcess(cmd, entry["returncode"], entry["stdout"], entry["stderr"])
+
+    path = os.path.join(_commands_dir(), f"{group}-{key}.json")
+    entry = read_json(path)
+    if not _valid(entry):
+        result = run_process(cmd)
+        if result.returncode != 0:
+            return result
+
+        entry = {
+            "cmd": cmd,
+            "group": group,
+            "fingerprint": fingerprint,
+            "created": now,
+            "returncode": result.returncode,
+            "stdout": result.stdout,
+            "stderr": result.stderr,
+        }
+        try:
+            write_json_atomic(path, entry)
+            _evict_cached()
+        except OSError:
+            pass
+    else:
+        try:
+            # mtime doubles as "last used" for LRU eviction
+            os.utime(path)
+        except OSError:
+            pass
+
+    with _memo_lock:
+        _memo[key] = entry
+        _memo.move_to_end(key)
+        while len(_memo) > CACHE_MAX_MEMORY_ENTRIES:
+            _memo.popitem(last=False)
+
+    return subprocess.CompletedProcess(cmd, entry["returncode"], entry["stdout"], entry["stderr"])
+
+def _evict_cached(max_bytes: int = CACHE_MAX_BYTES) -> None:
+    """Deletes least recently used on-disk entries until the cache fits in `max_bytes`."""
+    directory = _commands_dir()
+    entries = []
+    total = 0
+    for name in os.listdir(directory):
+        if not name.endswith(".json"):
+            continue
+        try:
+            st = os.stat(os.path.join(directory, name))
+        except OSError:
+            continue
+        entries.append((st.st_mtime, st.st_size, name))
+        total += st.st_size
+
+    for mtime, size, name in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(os.path.join(directory, name))
+            total -= size
+        except OSError:
+            pass
+
+def invalidate_cached(group: Optional[str] = None) -> None:
+    """Drops cached command results of one group (e.g. 'flatpak'), or all of them."""
+    with _memo_lock:
+        for key in [k for k, e in _memo.items() if group is None or e.get("group") == group]:
+            del _memo[key]
+
+    try:
+        directory = _commands_dir()
+        for name in os.listdir(directory):
+            if group is None or name.startswith(f"{group}-"):
+                os.remove(os.path.join(directory, name))
+    except OSError:
+        pass
+
+# -----------------------------------------------------------------------------
+# Subprocess Engine
+# -----------------------------------------------------------------------------
+
+# Backend processes allowed to run at once, across all providers and threads
+MAX_PROCESSES = max(0, env_number("MIXTURA_MAX_PROCESSES", 0)) or min(8, (os.cpu_count() or 2) * 2)
+# Seconds a cancelled process gets between SIGTERM and SIGKILL
+KILL_GRACE = 2.0
+# Read size for streamed process output
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# Process groups of captured backend processes that are still running
+_live_groups: set = set()
+_live_groups_hooked = False
+
+def _track_group(pid: int) -> None:
+    """Remembers a process group so it is killed if mixtura exits while it still runs."""
+    global _live_groups_hooked
+    if not _live_groups_hooked:
+        import atexit
+        atexit.register(_kill_live_groups)
+        _live_groups_hooked = True
+    _live_groups.add(pid)
+
+def _kill_live_groups() -> None:
+    for pid in list(_live_groups):
+        try:
+            os.killpg(pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+    _live_groups.clear()
+
+class _Output:
+    """One output stream, decoded chunk by chunk: keeps the text and passes complete lines on."""
+
+    def __init__(self, name: str, on_output: Optional[Callable[[str, str], None]]):
+        import codecs
+        self.name = name
+        self.on_output = on_output
+        self._decoder = codecs.getincrementaldecoder("utf-8")("replace")
+        self._chunks: List[str] = []
+        self._partial = ""
+
+    def feed(self, data: bytes) -> None:
+        """Adds a chunk; an empty chunk marks the end of the stream."""
+        text = self._decoder.decode(data, final=not data)
+        self._chunks.append(text)
+        if not self.on_output:
+            return
+        self._partial += text
+        if data:
+            *lines, self._partial = self._partial.split("\n")
+        else:
+            lines, self._partial = ([self._partial] if self._partial else []), ""
+        for line in lines:
+            self.on_output(self.name, line)
+
+    def text(self) -> str:
+        return "".join(self._chunks)
+
+def _signal_process(proc: Any, sig: int, group: bool) -> None:
+    try:
+        if group:
+            os.killpg(proc.pid, sig)
+        else:
+            proc.send_signal(sig)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+# Process slots: every throttled process, whichever way it is started, holds one
+_slots = threading.BoundedSemaphore(MAX_PROCESSES)
+
+def _spawn(
+    cmd: List[str],
+    capture: bool,
+    throttle: bool,
+    deadline: Optional[float] = None,
+    **popen: Any
+) -> subprocess.Popen:
+    """
+    Starts `cmd` once a process slot is free (right away without `throttle`, for callers
+    that bound their own concurrency, like plan jobs). Captured processes get their own
+    session and are tracked, so their whole group can be killed. The caller hands the
+    slot back with _release(). Raises TimeoutExpired if `deadline` passes while waiting.
+    """
+    if throttle:
+        wait = None if deadline is None else max(0.0, deadline - time.monotonic())
+        if not _slots.acquire(timeout=wait):
+            raise subprocess.TimeoutExpired(cmd, wait)
+    try:
+        proc = subprocess.Popen(cmd, start_new_session=capture, **popen)
+    except BaseException:
+        if throttle:
+            _slots.release()
+        raise
+    if capture:
+        _track_group(proc.pid)
+    return proc
+
+def _stop(proc: subprocess.Popen, group: bool) -> None:
+    """
+    SIGTERM, then SIGKILL if the process (group) is still there after KILL_GRACE.
+    Whatever is left of a group whose leader already exited is killed outright.
+    """
+    if proc.poll() is not None:
+        if group:
+            _signal_process(proc, signal.SIGKILL, group)
+        return
+    _signal_process(proc, signal.SIGTERM, group)
+    try:
+        proc.wait(KILL_GRACE)
+    except subprocess.TimeoutExpired:
+        _signal_process(proc, signal.SIGKILL, group)
+        proc.wait()
+
+def _release(proc: subprocess.Popen, throttle: bool) -> None:
+    """Hands back what _spawn took for `proc`, once it is gone."""
+    _live_groups.discard(proc.pid)
+    if throttle:
+        _slots.release()
+
+def run_process(
+    cmd: List[str],
+    timeout: Optional[float] = None,
+    capture: bool = True,
+    on_output: Optional[Callable[[str, str], None]] = None,
+    env: Optional[Dict[str, str]] = None,
+    stdin: Optional[int] = None,
+    throttle: bool = True
+) -> subprocess.CompletedProcess:
+    """
+    Runs a backend process in the calling thread. Every backend process goes through
+    here or iter_json_command, so MAX_PROCESSES holds across all providers and threads.
+
+    With `capture`, stdout and stderr are read as they are produced: every complete
+    line is passed to `on_output(stream, line)` (stream is 'stdout' or 'stderr') and
+    the full text is returned. Otherwise the process shares our terminal, stays in our
+    process group, and can still prompt (sudo, confirmations) and get Ctrl-C from it.
+    `stdin` is passed to the process as is (e.g. subprocess.DEVNULL).
+
+    Raises subprocess.TimeoutExpired after `timeout` seconds (or at the thread's
+    deadline, see set_deadline), once the process (group) is gone; a timeout, Ctrl-C
+    or any other error while waiting kills it the same way.
+    """
+    import selectors
+
+    deadline = _deadline(timeout)
+    if deadline is not None:
+        timeout = max(0.0, deadline - time.monotonic())
+    pipe = subprocess.PIPE if capture else None
+    proc = _spawn(cmd, capture, throttle, deadline, stdin=stdin, stdout=pipe, stderr=pipe, env=env)
+    outputs = [_Output("stdout", on_output), _Output("stderr", on_output)]
+
+    def _remaining() -> Optional[float]:
+        if deadline is None:
+            return None
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise subprocess.TimeoutExpired(cmd, timeout, outputs[0].text(), outputs[1].text())
+        return remaining
+
+    try:
+        if capture:
+            with selectors.DefaultSelector() as selector:
+                selector.register(proc.stdout, selectors.EVENT_READ, outputs[0])
+                selector.register(proc.stderr, selectors.EVENT_READ, outputs[1])
+                while selector.get_map():
+                    for key, _ in selector.select(_remaining()):
+                        data = os.read(key.fd, STREAM_CHUNK_SIZE)
+                        key.data.feed(data)
+                        if not data:
+                            selector.unregister(key.fileobj)
+        try:
+            returncode = proc.wait(_remaining())
+        except subprocess.TimeoutExpired:
+            raise subprocess.TimeoutExpired(cmd, timeout, outputs[0].text(), outputs[1].text()) from None
+    except BaseException:
+        # Timed out, Ctrl-C, or failed while reading: the process goes too
+        _stop(proc, capture)
+        raise
+    finally:
+        _release(proc, throttle)
+        for stream in (proc.stdout, proc.stderr):
+            if stream:
+                stream.close()
+
+    if not capture:
+        return subprocess.CompletedProcess(cmd, returncode)
+    return subprocess.CompletedProcess(cmd, returncode, outputs[0].text(), outputs[1].text())
+
+# -----------------------------------------------------------------------------
+# Streaming JSON
+# -----------------------------------------------------------------------------
+
+def iter_json_object(chunks: Iterable[str]) -> Iterator[Tuple[str, Any]]:
+    """
+    Yields the (key, value) pairs of a top-level JSON object given as text chunks,
+    each one as soon as it is complete. Only the entry being parsed and the current
+    chunk are held in memory, never the whole document. Empty input yields nothing.
+    """
+    decoder = json.JSONDecoder()
+    chunks = iter(chunks)
+    buf = ""
+    pos = 0
+
+    def _more() -> bool:
+        nonlocal buf, pos
+        for chunk in chunks:
+            if chunk:
+                # Drop what was already consumed so the buffer stays one entry long
+                buf = buf[pos:] + chunk
+                pos = 0
+                return True
+        return False
+
+    def _peek() -> str:
+        # Next non-whitespace character, or "" at the end of the input
+        nonlocal pos
+        while True:
+            while pos < len(buf) and buf[pos] in " \t\r\n":
+                pos += 1
+            if pos < len(buf):
+                return buf[pos]
+            if not _more():
+                return ""
+
+    def _value() -> Any:
+        nonlocal pos
+        while True:
+            try:
+                value, end = decoder.raw_decode(buf, pos)
+            except ValueError:
+                # Most likely cut in the middle of a chunk
+                if not _more():
+                    raise
+                continue
+            # A number is only complete once a delimiter follows: "-1." may be "-1.5e3"
+            if (not isinstance(value, (dict, list, str))
+                    and (end == len(buf) or buf[end] not in " \t\r\n,}]") and _more()):
+                continue
+            pos = end
+            return value
+
+    char = _peek()
+    if not char:
+        return
+    if char != "{":
+        raise ValueError(f"Expected a JSON object, got {char!r}")
+    pos += 1
+
+    char = _peek()
+    while char != "}":
+        if char != '"':
+            raise ValueError(f"Expected an object key, got {char!r}")
+        key = _value()
+        if _peek() != ":":
+            raise ValueError(f"Expected ':' after key {key!r}")
+        pos += 1
+        _peek()
+        yield key, _value()
+
+        char = _peek()
+        if char == ",":
+            pos += 1
+            char = _peek()
+            if char == "}":
+                raise ValueError(f"Trailing ',' after key {key!r}")
+        elif char != "}":
+            raise ValueError(f"Expected ',' or '}}' after key {key!r}, got {char!r}")
+
+def _read_text_chunks(stream: IO[bytes], chunk_size: int) -> Iterator[str]:
+    # read1 returns whatever the pipe has, instead of waiting for a full chunk
+    import codecs
+    decoder = codecs.getincrementaldecoder("utf-8")("replace")
+    while True:
+        data = stream.read1(chunk_size)
+        if not data:
+            tail = decoder.decode(b"", final=True)
+            if tail:
+                yield tail
+            return
+        yield decoder.decode(data)
+
+def iter_json_command(cmd: List[str], chunk_size: int = STREAM_CHUNK_SIZE) -> Iterator[Tuple[str, Any]]:
+    """
+    Runs a read-only command that prints one JSON object and yields its top-level
+    entries while the command is still writing (see iter_json_object).
+    Raises subprocess.CalledProcessError (with stderr) if the command fails, and
+    subprocess.TimeoutExpired if it is killed at the thread's deadline (see set_deadline).
+    The process is killed if the consumer stops iterating early.
+    """
+    import tempfile
+
+    deadline = _deadline(None)
+    limit = None if deadline is None else max(0.0, deadline - time.monotonic())
+    # stderr goes to a file: an unread pipe could fill up and block the command
+    with tempfile.TemporaryFile() as stderr:
+        # Captured like run_process's processes (own session, a process slot held throughout),
+        # so stopping early kills the whole group
+        proc = _spawn(cmd, True, True, deadline, stdout=subprocess.PIPE, stderr=stderr)
+        expired = threading.Event()
+        watchdog = None
+        if deadline is not None:
+            # Nobody may be left to close the generator (an abandoned search), so the
+            # process is killed from another thread, which also ends our reads
+            def _expire() -> None:
+                expired.set()
+                _signal_process(proc, signal.SIGKILL, True)
+            watchdog = threading.Timer(max(0.0, deadline - time.monotonic()), _expire)
+            watchdog.daemon = True
+            watchdog.start()
+        try:
+            try:
+                yield from iter_json_object(_read_text_chunks(proc.stdout, chunk_size))
+            except ValueError:
+                # Truncated or garbled output from a failing command is reported as the failure
+                if proc.wait() == 0:
+                    raise
+            returncode = proc.wait()
+        finally:
+            if watchdog is not None:
+                watchdog.cancel()
+            # Stopped early (consumer gave up, Ctrl-C, bad JSON): the whole group goes
+            _stop(proc, group=True)
+            _release(proc, throttle=True)
+            proc.stdout.close()
+
+        if expired.is_set():
+            raise subprocess.TimeoutExpired(cmd, limit)
+        if returncode != 0:
+            stderr.seek(0)
+            raise subprocess.CalledProcessError(
+                returncode, cmd, stderr=stderr.read().decode("utf-8", "replace")
+            )
 
 def parse_package_args(packages: List[str]) -> tuple[List[str], List[str]]:
     """
@@ -0,0 +1,60 @@
+import pytest
+
+import apply
+import inventory
+from modules.flatpak.provider import FlatpakProvider
+from modules.nixpkgs.provider import NixProvider
+
+@pytest.fixture
+def managers():
+    return {"nixpkgs": NixProvider(), "flatpak": FlatpakProvider()}
+
+RAW = {
+    # nix profile elements are named after the last attribute
+    "nixpkgs": [
+        {"name": "git", "origin": "flake:nixpkgs#legacyPackages.x86_64-linux.git", "version": "2.44.0"},
+        {"name": "requests", "origin": "flake:nixpkgs#legacyPackages.x86_64-linux.python3Packages.requests", "version": "2.31.0"},
+        {"name": "tool", "origin": "github:owner/repo#packages.x86_64-linux.tool", "version": "1.0"},
+        {"name": "manual", "origin": "flake:nixpkgs#legacyPackages.x86_64-linux.manual", "version": "1"},
+    ],
+    "flatpak": [
+        {"name": "Spotify", "id": "com.spotify.Client", "version": "1.2.31", "origin": "flathub"},
+    ],
+}
+# As inventory.snapshot reports them
+INSTALLED = {provider: [inventory._record(provider, pkg) for pkg in pkgs] for provider, pkgs in RAW.items()}
+
+def test_dotted_and_flake_attrs_match_installed_elements(managers):
+    desired = {
+        "nixpkgs": ["git", "nixpkgs#python3Packages.requests", "github:owner/repo#packages.x86_64-linux.tool"],
+        "flatpak": ["com.spotify.Client"],
+    }
+    assert apply.diff(desired, {}, INSTALLED, managers) == ({}, {})
+
+    packages, unresolved = apply.resolve(desired, INSTALLED, managers)
+    assert unresolved == []
+    assert packages["nixpkgs"]["nixpkgs#python3Packages.requests"] == {
+        "id": "requests", "version": "2.31.0",
+        "origin": "flake:nixpkgs#legacyPackages.x86_64-linux.python3Packages.requests",
+    }
+    assert packages["flatpak"]["com.spotify.Client"]["version"] == "1.2.31"
+
+def test_only_tracked_packages_are_removed(managers):
+    locked = {
+        "nixpkgs": {
+            "python3Packages.requests": {"id": "requests", "version": "2.31.0", "origin": ""},
+            "git": {"id": "git", "version": "2.44.0", "origin": ""},
+        },
+    }
+    desired = {"nixpkgs": ["git", "ripgrep"], "flatpak": ["org.gimp.GIMP"]}
+
+    to_install, to_remove = apply.diff(desired, locked, INSTALLED, managers)
+
+    assert to_install == {"nixpkgs": ["ripgrep"], "flatpak": ["org.gimp.GIMP"]}
+    # requests left the manifest; 'manual' was never in it, so it stays
+    assert to_remove == {"nixpkgs": ["requests"]}
+
+def test_flatpak_ids_match_whole(managers):
+    # The last dot-separated part of an app id is not a name of its own
+    desired = {"flatpak": ["org.example.Client"]}
+    assert apply.diff(desired, {}, INSTALLED, managers) == ({"flatpak": ["org.example.Client"]}, {})
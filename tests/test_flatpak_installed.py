@@ -0,0 +1,104 @@
+import shutil
+import threading
+
+import pytest
+
+from modules.flatpak import installed
+
+def deploy(base, app_id, name=None, version=None, origin="flathub", arch="x86_64", branch="stable"):
+    """Lays out one app branch the way flatpak deploys it: app/<id>/<arch>/<branch>/active -> <commit>."""
+    app_dir = base / "app" / app_id
+    branch_dir = app_dir / arch / branch
+    commit = branch_dir / ("0123abcd" * 8)
+    files = commit / "files"
+    (files / "share" / "metainfo").mkdir(parents=True)
+    (commit / "export" / "share" / "applications").mkdir(parents=True)
+
+    (commit / "metadata").write_text(f"[Application]\nname={app_id}\nruntime=org.freedesktop.Platform/{arch}/23.08\n")
+    # GVariant (ssasta{sv}): the origin string comes first, NUL-terminated
+    (commit / "deploy").write_bytes(origin.encode() + b"\0" + b"\x00" * 8 + b"commit-data")
+    if name:
+        (commit / "export" / "share" / "applications" / f"{app_id}.desktop").write_text(
+            f"[Desktop Entry]\nName[de]=Übersetzt\nName={name}\nExec={app_id}\n"
+        )
+    if version:
+        (files / "share" / "metainfo" / f"{app_id}.metainfo.xml").write_text(
+            f'<component><id>{app_id}</id><releases><release version="{version}" date="2024-01-01"/>'
+            f'<release version="0.1"/></releases></component>'
+        )
+
+    (branch_dir / "active").symlink_to(commit.name)
+    (app_dir / "current").symlink_to(f"{arch}/{branch}")
+    return commit
+
+@pytest.fixture
+def roots(tmp_path, monkeypatch):
+    user, system = tmp_path / "user", tmp_path / "system"
+    user.mkdir()
+    system.mkdir()
+    monkeypatch.setenv("FLATPAK_USER_DIR", str(user))
+    monkeypatch.setenv("FLATPAK_SYSTEM_DIR", str(system))
+    monkeypatch.setattr(installed, "INSTALLATIONS_CONF_DIR", str(tmp_path / "installations.d"))
+    return user, system
+
+def test_reads_user_and_system_installations(roots):
+    user, system = roots
+    deploy(user, "com.spotify.Client", name="Spotify", version="1.2.31")
+    deploy(system, "org.gimp.GIMP", name="GNU Image Manipulation Program", version="2.10.36", origin="fedora")
+    deploy(system, "org.example.Bare", branch="beta")
+
+    assert installed.can_list()
+    assert installed.list_installed() == [
+        {"name": "Spotify", "id": "com.spotify.Client", "version": "1.2.31", "branch": "stable",
+         "arch": "x86_64", "origin": "flathub", "installation": "user"},
+        {"name": "org.example.Bare", "id": "org.example.Bare", "version": "unknown", "branch": "beta",
+         "arch": "x86_64", "origin": "flathub", "installation": "system"},
+        {"name": "GNU Image Manipulation Program", "id": "org.gimp.GIMP", "version": "2.10.36", "branch": "stable",
+         "arch": "x86_64", "origin": "fedora", "installation": "system"},
+    ]
+
+def test_broken_links_are_skipped(roots):
+    user, _ = roots
+    deploy(user, "com.spotify.Client", name="Spotify")
+    # `current` left dangling by a removed branch: the remaining branch is still listed
+    current = user / "app" / "com.spotify.Client" / "current"
+    current.unlink()
+    current.symlink_to("x86_64/gone")
+    # Half-removed app: `active` points at a deleted commit
+    commit = deploy(user, "org.example.Removed")
+    shutil.rmtree(commit)
+
+    assert [pkg["id"] for pkg in installed.list_installed()] == ["com.spotify.Client"]
+
+def test_parallel_scan_matches_sequential(roots, monkeypatch):
+    user, system = roots
+    count = installed.PARALLEL_SCAN_MIN + 8
+    for i in range(count):
+        deploy(user if i % 2 else system, f"org.example.App{i:03d}", name=f"App {i}", version=f"1.{i}")
+
+    threads = set()
+    read = installed._read_deployment
+    def _spy(*args):
+        threads.add(threading.get_ident())
+        return read(*args)
+    monkeypatch.setattr(installed, "_read_deployment", _spy)
+
+    parallel = installed.list_installed()
+    assert threading.get_ident() not in threads
+
+    threads.clear()
+    monkeypatch.setattr(installed, "PARALLEL_SCAN_MIN", count + 1)
+    sequential = installed.list_installed()
+    assert threads == {threading.get_ident()}
+
+    assert len(parallel) == count
+    assert parallel == sequential
+
+def test_extra_installations_need_the_cli(roots, tmp_path):
+    user, _ = roots
+    deploy(user, "com.spotify.Client")
+    conf_dir = tmp_path / "installations.d"
+    conf_dir.mkdir()
+    (conf_dir / "steam.conf").write_text("[Installation \"steam\"]\nPath=/mnt/steam/flatpak\n")
+
+    assert not installed.can_list()
@@ -0,0 +1,45 @@
+import inventory
+from inventory import InventoryIndex
+
+RECORDS = [inventory._record(provider, pkg) for provider, pkg in [
+    ("nixpkgs", {"name": "git", "origin": "flake:nixpkgs#legacyPackages.x86_64-linux.git"}),
+    ("nixpkgs", {"name": "lazygit"}),
+    ("nixpkgs", {"name": "ripgrep"}),
+    ("nixpkgs", {"name": "python3"}),
+    ("flatpak", {"name": "Spotify", "id": "com.spotify.Client"}),
+    ("flatpak", {"name": "GNU Image Manipulation Program", "id": "org.gimp.GIMP"}),
+]]
+
+def _names(records):
+    return [r["name"] for r in records]
+
+def _scan(term):
+    """What the index must agree with: the plain linear substring scan."""
+    term = term.lower()
+    return [r for r in RECORDS if term in r["name"].lower() or term in r["id"].lower()]
+
+def test_substring_matches_names_and_ids():
+    index = InventoryIndex(RECORDS)
+    assert _names(index.search("git")) == ["git", "lazygit"]
+    # Ids count too, case-insensitively, in inventory order
+    assert _names(index.search("SPOTIFY")) == ["Spotify"]
+    assert _names(index.search("gimp")) == ["GNU Image Manipulation Program"]
+    assert index.search("nothing-like-it") == []
+    assert index.search("") == []
+
+def test_short_terms_and_index_agree_with_a_scan():
+    index = InventoryIndex(RECORDS)
+    for term in ("g", "it", "git", "pyth", "o", "com.", "ion pro", "3", "client"):
+        assert index.search(term) == _scan(term), term
+
+def test_trigrams_never_span_name_and_id():
+    # "it\ncom" would otherwise make "itc" (end of the name, start of the id) a hit
+    index = InventoryIndex([inventory._record("flatpak", {"name": "Kit", "id": "com.example.Kit"})])
+    assert index.search("itc") == []
+    assert _names(index.search("kit")) == ["Kit"]
+
+def test_fuzzy_finds_typos_only():
+    index = InventoryIndex(RECORDS)
+    assert _names(index.fuzzy("ripgerp")) == ["ripgrep"]
+    assert _names(index.fuzzy("pyhton3")) == ["python3"]
+    assert index.fuzzy("zzzzzz") == []
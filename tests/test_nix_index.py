@@ -0,0 +1,129 @@
+import json
+import os
+import re
+import sys
+import textwrap
+
+import pytest
+
+from modules.nixpkgs import index as nix_index
+from modules.nixpkgs.index import NixIndex
+
+PACKAGES = {
+    "legacyPackages.x86_64-linux.git": {"pname": "git", "version": "2.44.0", "description": "Distributed version control system"},
+    "legacyPackages.x86_64-linux.gitui": {"pname": "gitui", "version": "0.26.1", "description": "Blazing fast terminal-ui for git"},
+    "legacyPackages.x86_64-linux.ripgrep": {"pname": "ripgrep", "version": "14.1.0", "description": "Line-oriented search tool"},
+}
+
+@pytest.fixture
+def nix(tmp_path):
+    """A stub nix CLI: canned `nix search --json` output and the revision in ./rev ("" fails)."""
+    stub = tmp_path / "nix.py"
+    stub.write_text(textwrap.dedent(f"""
+        import json, sys
+        args = sys.argv[1:]
+        if args[:2] == ["flake", "metadata"]:
+            rev = open({str(tmp_path / "rev")!r}).read().strip()
+            if not rev:
+                sys.exit("error: unable to download")
+            print(json.dumps({{"locked": {{"rev": rev}}}}))
+        elif args[:1] == ["search"]:
+            with open({str(tmp_path / "calls")!r}, "a") as f:
+                f.write("search\\n")
+            print(json.dumps({PACKAGES!r}))
+    """))
+    (tmp_path / "rev").write_text("aaaa")
+
+    def _nix(*args):
+        return [sys.executable, str(stub), *args]
+    return _nix
+
+@pytest.fixture
+def index(tmp_path, nix):
+    return NixIndex(nix, path=str(tmp_path / "cache" / "index.sqlite"))
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path):
+    (tmp_path / "cache").mkdir()
+
+def _dumps(tmp_path):
+    calls = tmp_path / "calls"
+    return len(calls.read_text().splitlines()) if calls.exists() else 0
+
+def test_build_and_search(index):
+    assert index.build() == 3
+    assert [p["name"] for p in index.search("git")] == ["git", "gitui"]
+    assert [p["name"] for p in index.search("^rip")] == ["ripgrep"]
+    assert index.search("git")[0] == {
+        "name": "git", "id": "legacyPackages.x86_64-linux.git",
+        "description": "Distributed version control system", "version": "2.44.0",
+    }
+
+def test_refresh_follows_the_locked_revision(index, tmp_path, monkeypatch):
+    assert not index.is_current()
+    assert index.refresh()
+    assert index.is_current()
+    assert not index.refresh()
+    assert _dumps(tmp_path) == 1
+
+    # Within REVISION_TTL the indexed revision is trusted without asking nix
+    (tmp_path / "rev").write_text("bbbb")
+    assert index.is_current()
+
+    monkeypatch.setattr(nix_index, "REVISION_TTL", 0)
+    assert not index.is_current()
+    assert index.refresh()
+    assert index.is_current()
+    assert index.status()["revision"] == "bbbb"
+    assert _dumps(tmp_path) == 2
+
+def test_build_removes_partial_databases_of_dead_builds(index, tmp_path):
+    cache = tmp_path / "cache"
+    # No process has pid 2**22 + 1 (above the kernel's pid_max)
+    dead = cache / f"index.sqlite.{2 ** 22 + 1}.tmp"
+    dead.write_bytes(b"partial")
+    (cache / f"index.sqlite.{2 ** 22 + 1}.tmp-journal").write_bytes(b"")
+    # A build still running in another process keeps its file
+    running = cache / f"index.sqlite.{os.getppid()}.tmp"
+    running.write_bytes(b"in progress")
+
+    index.build()
+
+    assert sorted(p.name for p in cache.iterdir()) == ["index.sqlite", running.name]
+
+def test_build_cleans_up_after_a_failed_dump(index, tmp_path, monkeypatch):
+    def _fail():
+        yield "legacyPackages.x86_64-linux.git", PACKAGES["legacyPackages.x86_64-linux.git"]
+        raise RuntimeError("evaluation aborted")
+    monkeypatch.setattr(index, "_dump", _fail)
+
+    with pytest.raises(RuntimeError):
+        index.build()
+    assert list((tmp_path / "cache").iterdir()) == []
+
+def test_no_build_without_a_revision(index, tmp_path):
+    (tmp_path / "rev").write_text("")
+
+    with pytest.raises(RuntimeError):
+        index.refresh()
+    assert not index.exists()
+    assert _dumps(tmp_path) == 0
+
+def test_invalid_pattern_raises_before_querying(index):
+    index.build()
+    with pytest.raises(re.error):
+        index.search("git(")
+
+def test_provider_reports_invalid_pattern_once(index, tmp_path, monkeypatch, capsys):
+    from modules.nixpkgs.provider import NixProvider
+    index.build()
+    provider = NixProvider()
+    monkeypatch.setattr(provider, "is_available", lambda: True)
+    monkeypatch.setattr(provider, "index", lambda: index)
+
+    found = provider.search_many(["git(", "ripgrep"])
+
+    assert found["git("] == []
+    assert [p["name"] for p in found["ripgrep"]] == ["ripgrep"]
+    assert _dumps(tmp_path) == 1
+    assert capsys.readouterr().out.count("Invalid search pattern 'git('") == 1
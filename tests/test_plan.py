@@ -0,0 +1,136 @@
+import threading
+import time
+
+import pytest
+
+from core import PackageManager
+from plan import Plan
+from utils import run
+
+class FakeProvider(PackageManager):
+    """Runs `sh -c 'exit <code>'` through utils.run for every step, recording the calls."""
+
+    def __init__(self, name, code=0, delay=0.0):
+        self._name = name
+        self.code = code
+        self.delay = delay
+        self.calls = []
+
+    @property
+    def name(self):
+        return self._name
+
+    def is_available(self):
+        return True
+
+    def _step(self, action, packages):
+        self.calls.append((action, packages, threading.current_thread() is threading.main_thread()))
+        run(["sh", "-c", f"sleep {self.delay}; exit {self.code}"], silent=True)
+
+    def install(self, packages):
+        self._step("install", packages)
+
+    def uninstall(self, packages):
+        self._step("remove", packages)
+
+    def upgrade(self, packages=None):
+        self._step("upgrade", packages)
+
+    def list_packages(self):
+        return []
+
+    def search(self, query):
+        return []
+
+class FakeManager:
+    def __init__(self, *providers):
+        self.providers = {p.name: p for p in providers}
+
+    def get_manager(self, name):
+        return self.providers.get(name)
+
+def test_steps_are_batched_and_ordered():
+    manager = FakeManager(FakeProvider("nixpkgs"), FakeProvider("flatpak"))
+    plan = Plan(manager)
+    plan.add("nixpkgs", "install", ["git", "nixpkgs#ripgrep"])
+    plan.add("flatpak", "install", ["com.spotify.Client"])
+    plan.add("nixpkgs", "upgrade", ["git", "vim"])
+    plan.add("nixpkgs", "remove", ["hello"])
+    plan.add("nixpkgs", "install", ["git"])
+
+    assert plan.steps() == [
+        ("nixpkgs", "remove", ["hello"]),
+        ("nixpkgs", "install", ["git", "nixpkgs#ripgrep"]),
+        # A fresh install already is the latest version
+        ("nixpkgs", "upgrade", ["vim"]),
+        ("flatpak", "install", ["com.spotify.Client"]),
+    ]
+
+    plan.add("flatpak", "upgrade", None)
+    plan.add("flatpak", "upgrade", ["com.spotify.Client"])
+    assert plan.steps()[-1] == ("flatpak", "upgrade", None)
+
+def test_sequential_failure_returns_its_code_and_stops():
+    nix, flatpak = FakeProvider("nixpkgs", code=3), FakeProvider("flatpak")
+    plan = Plan(FakeManager(nix, flatpak))
+    plan.add("nixpkgs", "install", ["git"])
+    plan.add("nixpkgs", "upgrade", ["vim"])
+    plan.add("flatpak", "install", ["com.spotify.Client"])
+
+    assert plan.execute() == 3
+    assert nix.calls == [("install", ["git"], True)]
+    assert flatpak.calls == []
+
+def test_jobs_isolate_failures_and_report_the_first():
+    ok = FakeProvider("nixpkgs", delay=0.3)
+    failing = FakeProvider("flatpak", code=4, delay=0.3)
+    also_failing = FakeProvider("homebrew", code=5)
+    plan = Plan(FakeManager(ok, failing, also_failing))
+    for name in ("nixpkgs", "flatpak", "homebrew"):
+        plan.add(name, "upgrade", None)
+    plan.add("flatpak", "install", ["com.spotify.Client"])
+
+    start = time.monotonic()
+    # Exit code of the first failed provider in plan order, not the first to fail
+    assert plan.execute(jobs=3) == 4
+    assert time.monotonic() - start < 0.6
+
+    assert ok.calls == [("upgrade", None, False)]
+    # The failed install ends that provider's steps only
+    assert failing.calls == [("install", ["com.spotify.Client"], False)]
+    assert also_failing.calls == [("upgrade", None, False)]
+
+def test_success_returns_zero():
+    plan = Plan(FakeManager(FakeProvider("nixpkgs"), FakeProvider("flatpak")))
+    plan.add("nixpkgs", "install", ["git"])
+    plan.add("flatpak", "install", ["com.spotify.Client"])
+    assert plan.execute() == 0
+    assert plan.execute(jobs=2) == 0
+
+def test_each_batch_is_one_backend_call(monkeypatch):
+    from modules.flatpak import provider as flatpak_provider
+    from modules.nixpkgs import provider as nix_provider
+
+    calls = []
+    def _run(cmd, silent=False, check_warnings=False):
+        calls.append(cmd)
+    monkeypatch.setattr(nix_provider, "run", _run)
+    monkeypatch.setattr(flatpak_provider, "run", _run)
+
+    nix, flatpak = nix_provider.NixProvider(), flatpak_provider.FlatpakProvider()
+    for mgr in (nix, flatpak):
+        monkeypatch.setattr(mgr, "is_available", lambda: True)
+    monkeypatch.setattr(nix, "_nix", lambda *args: ["nix", *args])
+    monkeypatch.setattr(flatpak, "bin", lambda: "flatpak")
+
+    plan = Plan(FakeManager(nix, flatpak))
+    plan.add("nixpkgs", "install", ["git", "nixpkgs#vim", "ripgrep"])
+    plan.add("nixpkgs", "remove", ["hello", "cowsay"])
+    plan.add("flatpak", "remove", ["org.gimp.GIMP", "com.spotify.Client", "org.gimp.GIMP"])
+
+    assert plan.execute() == 0
+    assert calls == [
+        ["nix", "profile", "remove", "hello", "cowsay"],
+        ["nix", "profile", "add", "--impure", "nixpkgs#git", "nixpkgs#vim", "nixpkgs#ripgrep"],
+        ["flatpak", "uninstall", "-y", "org.gimp.GIMP", "com.spotify.Client"],
+    ]
@@ -0,0 +1,105 @@
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+import utils
+from utils import iter_json_command, run_process
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    return True
+
+def _wait_gone(pid, timeout=2.0):
+    end = time.monotonic() + timeout
+    while _alive(pid) and time.monotonic() < end:
+        time.sleep(0.02)
+    return not _alive(pid)
+
+def test_output_is_streamed_and_returned():
+    lines = []
+    result = run_process(
+        ["sh", "-c", "echo one; echo two >&2; printf three; exit 3"],
+        on_output=lambda stream, line: lines.append((stream, line)),
+    )
+    assert result.returncode == 3
+    assert (result.stdout, result.stderr) == ("one\nthree", "two\n")
+    assert sorted(lines) == [("stderr", "two"), ("stdout", "one"), ("stdout", "three")]
+
+def test_timeout_kills_the_whole_group(tmp_path):
+    pid_file = tmp_path / "pid"
+    # The grandchild keeps the pipes open: only killing the group ends it
+    script = f"sleep 30 & echo $! > {pid_file}; echo started; wait"
+
+    start = time.monotonic()
+    with pytest.raises(subprocess.TimeoutExpired) as e:
+        run_process(["sh", "-c", script], timeout=0.5)
+
+    assert time.monotonic() - start < 0.5 + utils.KILL_GRACE
+    assert e.value.output == "started\n"
+    assert _wait_gone(int(pid_file.read_text()))
+    assert utils._live_groups == set()
+
+def test_timeout_path_frees_the_slot(monkeypatch):
+    monkeypatch.setattr(utils, "_slots", threading.BoundedSemaphore(1))
+    with pytest.raises(subprocess.TimeoutExpired):
+        run_process(["sleep", "30"], timeout=0.2)
+    # A leaked slot would block here forever
+    assert run_process(["true"], timeout=5).returncode == 0
+
+def test_json_commands_share_the_process_cap(monkeypatch):
+    monkeypatch.setattr(utils, "_slots", threading.BoundedSemaphore(1))
+    stream = iter_json_command([sys.executable, "-c", 'print(\'{"a": 1, "b": 2}\')'])
+    assert next(stream) == ("a", 1)
+
+    # The streaming command holds the only slot until it is done
+    done = threading.Event()
+    def _other():
+        run_process(["true"])
+        done.set()
+    threading.Thread(target=_other, daemon=True).start()
+    assert not done.wait(0.3)
+
+    assert list(stream) == [("b", 2)]
+    assert done.wait(5)
+
+def test_abandoned_json_command_is_killed(tmp_path):
+    pid_file = tmp_path / "pid"
+    script = f"echo $$ > {pid_file}; printf '{{\"a\": 1,'; sleep 30"
+    stream = iter_json_command(["sh", "-c", script])
+    assert next(stream) == ("a", 1)
+
+    stream.close()
+    assert _wait_gone(int(pid_file.read_text()))
+
+def test_thread_deadline_caps_every_process(tmp_path):
+    pid_file = tmp_path / "pid"
+    errors = []
+    def _search():
+        utils.set_deadline(time.monotonic() + 0.3)
+        try:
+            run_process(["sleep", "30"], timeout=60)
+        except subprocess.TimeoutExpired as e:
+            errors.append(e)
+        # Nobody closes this one: the deadline alone has to stop it
+        stream = iter_json_command(["sh", "-c", f"echo $$ > {pid_file}; printf '{{\"a\": 1,'; sleep 30"])
+        try:
+            list(stream)
+        except subprocess.TimeoutExpired as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=_search)
+    start = time.monotonic()
+    thread.start()
+    thread.join(5)
+
+    assert not thread.is_alive()
+    assert len(errors) == 2
+    assert time.monotonic() - start < 0.3 + utils.KILL_GRACE
+    assert _wait_gone(int(pid_file.read_text()))
@@ -0,0 +1,73 @@
+from ranking import Ranker, provider_weights, rank
+
+WEIGHTS = provider_weights(["nixpkgs", "flatpak", "homebrew"])
+
+def _results(provider, names):
+    return [{"name": n, "id": n, "description": f"{n} package", "provider": provider} for n in names]
+
+NIX = _results("nixpkgs", ["git", "gitui", "lazygit", "git-lfs", "tig"])
+FLATPAK = _results("flatpak", ["git", "gitg", "GitKraken"])
+BREW = _results("homebrew", ["git", "git-gui", "legit"])
+
+def test_batches_rank_like_one_list_whatever_the_arrival_order():
+    expected, total = rank(NIX + FLATPAK + BREW, "git", limit=4, page=1, weights=WEIGHTS)
+    assert total == 11
+    assert [(r["provider"], r["name"]) for r in expected] == [
+        ("nixpkgs", "git"), ("flatpak", "git"), ("homebrew", "git"), ("nixpkgs", "gitui"),
+    ]
+
+    ranker = Ranker("git", limit=4, page=1, weights=WEIGHTS)
+    # Providers answer in any order; their position decides ties, not arrival
+    ranker.add(BREW, source=2)
+    ranker.add(NIX, source=0)
+    ranker.add(FLATPAK, source=1)
+    assert ranker.results() == (expected, total)
+
+def test_only_the_requested_pages_are_held():
+    ranker = Ranker("git", limit=2, page=2, weights=WEIGHTS)
+    ranker.add(iter(NIX), source=0)
+    ranker.add(iter(FLATPAK + BREW), source=1)
+    assert len(ranker._heap) == 4
+
+    shown, total = ranker.results()
+    assert total == 11
+    assert shown == rank(NIX + FLATPAK + BREW, "git", limit=2, page=2, weights=WEIGHTS)[0]
+
+def test_ties_within_a_source_keep_its_order():
+    same = _results("nixpkgs", ["foo-a", "foo-b", "foo-c"])
+    ranker = Ranker("zzz", limit=0, weights=WEIGHTS)
+    ranker.add(same[:2])
+    ranker.add(same[2:])
+    # Equal length names and scores: the provider's own order is kept across batches
+    assert [r["name"] for r in ranker.results()[0]] == ["foo-a", "foo-b", "foo-c"]
+
+def test_tiers_rank_name_matches_before_descriptions():
+    results = [
+        {"name": "libgit2", "description": "", "provider": "nixpkgs"},
+        {"name": "tig", "description": "text-mode interface for git", "provider": "nixpkgs"},
+        {"name": "gti", "description": "humorous typo", "provider": "nixpkgs"},
+        {"name": "gitmojis", "description": "", "provider": "nixpkgs"},
+        {"name": "pre-git", "description": "", "provider": "nixpkgs"},
+        {"name": "gitmoji", "description": "", "provider": "nixpkgs"},
+        {"name": "Git", "id": "org.example.git", "description": "", "provider": "flatpak"},
+    ]
+    shown, total = rank(results, "git", limit=0, weights=WEIGHTS)
+    assert total == len(results)
+    # exact, prefix (shorter first), token, substring, description token, fuzzy
+    assert [r["name"] for r in shown] == ["Git", "gitmoji", "gitmojis", "pre-git", "libgit2", "tig", "gti"]
+
+def test_preferred_provider_wins_within_a_tier():
+    results = _results("homebrew", ["git"]) + _results("flatpak", ["git"]) + _results("nixpkgs", ["git"])
+    shown, _ = rank(results, "git", limit=0, weights=WEIGHTS)
+    assert [r["provider"] for r in shown] == ["nixpkgs", "flatpak", "homebrew"]
+
+    shown, _ = rank(results, "git", limit=0, weights=provider_weights(["homebrew", "nixpkgs"]))
+    assert [r["provider"] for r in shown] == ["homebrew", "nixpkgs", "flatpak"]
+
+def test_pages_split_the_ranking():
+    everything, total = rank(NIX + FLATPAK + BREW, "git", limit=0, weights=WEIGHTS)
+    pages = [rank(NIX + FLATPAK + BREW, "git", limit=4, page=p, weights=WEIGHTS) for p in (1, 2, 3, 4)]
+
+    assert [len(shown) for shown, _ in pages] == [4, 4, 3, 0]
+    assert {t for _, t in pages} == {total}
+    assert [r for shown, _ in pages for r in shown] == everything
@@ -0,0 +1,87 @@
+import os
+import sys
+
+import pytest
+
+import utils
+from utils import invalidate_cached, run_cached
+
+@pytest.fixture(autouse=True)
+def cache_home(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    monkeypatch.setattr(utils, "_memo", utils.OrderedDict())
+    return tmp_path
+
+@pytest.fixture
+def backend(tmp_path):
+    """A read-only 'backend' that prints its argument and counts its runs in ./runs."""
+    runs = tmp_path / "runs"
+    def _cmd(arg, code=0):
+        script = f"open({str(runs)!r}, 'a').write('x'); print({arg!r}); raise SystemExit({code})"
+        return [sys.executable, "-c", script]
+    _cmd.runs = lambda: len(runs.read_text()) if runs.exists() else 0
+    return _cmd
+
+def _entries():
+    return sorted(os.listdir(utils._commands_dir()))
+
+def test_memo_then_disk_then_fingerprint(backend, tmp_path, monkeypatch):
+    manifest = tmp_path / "manifest.json"
+    manifest.write_text("{}")
+
+    assert run_cached(backend("a"), fingerprints=[str(manifest)]).stdout == "a\n"
+    assert run_cached(backend("a"), fingerprints=[str(manifest)]).stdout == "a\n"
+    assert backend.runs() == 1
+
+    # A new process only has the on-disk tier
+    monkeypatch.setattr(utils, "_memo", utils.OrderedDict())
+    assert run_cached(backend("a"), fingerprints=[str(manifest)]).stdout == "a\n"
+    assert backend.runs() == 1
+
+    manifest.write_text('{"elements": {}}')
+    run_cached(backend("a"), fingerprints=[str(manifest)])
+    assert backend.runs() == 2
+
+def test_ttl_and_failures_are_not_reused(backend):
+    run_cached(backend("a"), ttl=0)
+    run_cached(backend("a"), ttl=0)
+    assert backend.runs() == 2
+
+    assert run_cached(backend("b", code=1)).returncode == 1
+    assert run_cached(backend("b", code=1)).returncode == 1
+    assert backend.runs() == 4
+
+def test_memory_tier_is_a_bounded_lru(backend, monkeypatch):
+    monkeypatch.setattr(utils, "CACHE_MAX_MEMORY_ENTRIES", 2)
+    for arg in ("a", "b", "a", "c"):
+        run_cached(backend(arg))
+
+    # 'b' was the least recently used when 'c' came in
+    assert [entry["stdout"] for entry in utils._memo.values()] == ["a\n", "c\n"]
+
+def test_disk_tier_evicts_least_recently_used(backend):
+    for arg in ("a", "b", "c"):
+        run_cached(backend(arg))
+    paths = {entry["stdout"]: os.path.join(utils._commands_dir(), f"{entry['group']}-{key}.json")
+             for key, entry in utils._memo.items()}
+    # Oldest first: b, then a, then c
+    for age, out in ((300, "b\n"), (200, "a\n"), (100, "c\n")):
+        os.utime(paths[out], (0, os.path.getmtime(paths[out]) - age))
+
+    # Room for two of them
+    utils._evict_cached(max_bytes=os.path.getsize(paths["a\n"]) + os.path.getsize(paths["c\n"]))
+
+    assert not os.path.exists(paths["b\n"])
+    assert os.path.exists(paths["a\n"]) and os.path.exists(paths["c\n"])
+
+def test_invalidation_is_per_group(backend):
+    run_cached(backend("a"))
+    run_cached(["echo", "other"])
+    assert len(_entries()) == 2
+
+    invalidate_cached(utils.command_group(backend("a")))
+
+    assert [entry["stdout"] for entry in utils._memo.values()] == ["other\n"]
+    assert len(_entries()) == 1
+    run_cached(backend("a"))
+    assert backend.runs() == 2
@@ -0,0 +1,139 @@
+import json
+import os
+import sys
+import textwrap
+import time
+
+from core import PackageManager
+from manager import ModuleManager
+from utils import run_process
+
+class SlowProvider(PackageManager):
+    """Answers every query after its backend process has slept `delay` seconds."""
+
+    def __init__(self, name, delay, search_timeout=30.0, pid_file=None):
+        self._name = name
+        self.delay = delay
+        self.search_timeout = search_timeout
+        self.pid_file = pid_file
+        self.batches = []
+
+    @property
+    def name(self):
+        return self._name
+
+    def is_available(self):
+        return True
+
+    def search_many(self, queries):
+        self.batches.append(list(queries))
+        script = f"sleep {self.delay}"
+        if self.pid_file:
+            script = f"echo $$ > {self.pid_file}; " + script
+        run_process(["sh", "-c", script])
+        return {q: [{"name": q, "id": q, "description": "", "provider": self.name}] for q in queries}
+
+    def install(self, packages):
+        pass
+
+    def uninstall(self, packages):
+        pass
+
+    def upgrade(self, packages=None):
+        pass
+
+    def list_packages(self):
+        return []
+
+    def search(self, query):
+        return self.search_many([query])[query]
+
+def _manager(*providers):
+    manager = ModuleManager()
+    # Only these providers, not the ones installed on this machine
+    manager._registry = {}
+    manager.managers = {p.name: p for p in providers}
+    return manager
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    return True
+
+def test_one_search_per_provider_for_the_whole_batch():
+    fast, slow = SlowProvider("nixpkgs", 0), SlowProvider("flatpak", 0.2)
+    manager = _manager(fast, slow)
+
+    found = manager.search_all_many(["git", "vim", "git"])
+
+    assert fast.batches == slow.batches == [["git", "vim"]]
+    # Provider order, not arrival order
+    assert [r["provider"] for r in found["git"]] == ["nixpkgs", "flatpak"]
+    assert manager.incomplete_providers == []
+
+def test_missed_deadline_stops_the_providers_processes(tmp_path):
+    pid_file = tmp_path / "pid"
+    stuck = SlowProvider("flatpak", 30, pid_file=pid_file)
+    manager = _manager(SlowProvider("nixpkgs", 0), stuck)
+
+    start = time.monotonic()
+    found = manager.search_all_many(["git"], deadline=0.5)
+
+    assert time.monotonic() - start < 1.5
+    assert [r["provider"] for r in found["git"]] == ["nixpkgs"]
+    assert manager.incomplete_providers == ["flatpak"]
+    # The abandoned search's process doesn't outlive the deadline by more than the kill grace
+    pid = int(pid_file.read_text())
+    end = time.monotonic() + 3
+    while _alive(pid) and time.monotonic() < end:
+        time.sleep(0.05)
+    assert not _alive(pid)
+
+def test_timeout_raises_the_providers_own_limit():
+    provider = SlowProvider("nixpkgs", 0.5, search_timeout=0.1)
+    manager = _manager(provider)
+
+    assert manager.search_all_many(["git"])["git"] == []
+    assert manager.incomplete_providers == ["nixpkgs"]
+
+    assert [r["name"] for r in manager.search_all_many(["git"], deadline=5)["git"]] == ["git"]
+    assert manager.incomplete_providers == []
+
+NIX_PACKAGES = {
+    "legacyPackages.x86_64-linux.git": {"pname": "git", "version": "2.44.0", "description": "Distributed version control system"},
+    "legacyPackages.x86_64-linux.gitui": {"pname": "gitui", "version": "0.26.1", "description": "Terminal-ui for git"},
+    "legacyPackages.x86_64-linux.ripgrep": {"pname": "ripgrep", "version": "14.1.0", "description": "Line-oriented search tool"},
+}
+
+def test_nix_answers_a_batch_with_one_evaluation(tmp_path, monkeypatch):
+    from modules.nixpkgs.index import NixIndex
+    from modules.nixpkgs.provider import NixProvider
+
+    calls = tmp_path / "calls"
+    stub = tmp_path / "nix.py"
+    # `nix search` with one regex, matched against attribute, pname and description
+    stub.write_text(textwrap.dedent(f"""
+        import json, re, sys
+        pattern = re.compile(sys.argv[3], re.IGNORECASE)
+        with open({str(calls)!r}, "a") as f:
+            f.write(json.dumps(sys.argv[1:]) + "\\n")
+        packages = {NIX_PACKAGES!r}
+        print(json.dumps({{attr: p for attr, p in packages.items()
+                          if pattern.search(attr.split(".", 2)[-1]) or pattern.search(p["pname"]) or pattern.search(p["description"])}}))
+    """))
+    provider = NixProvider()
+    nix = lambda *args: [sys.executable, str(stub), *args]
+    monkeypatch.setattr(provider, "is_available", lambda: True)
+    monkeypatch.setattr(provider, "_nix", nix)
+    # No index built yet: the batch goes to `nix search`
+    monkeypatch.setattr(provider, "index", lambda: NixIndex(nix, path=str(tmp_path / "index.sqlite")))
+
+    found = provider.search_many(["git", "^rip", "git"])
+
+    assert [json.loads(line) for line in calls.read_text().splitlines()] == [
+        ["search", "nixpkgs", "(git)|(^rip)", "--json"],
+    ]
+    # The combined answer is split back per term
+    assert {q: [p["name"] for p in found[q]] for q in found} == {"git": ["git", "gitui"], "^rip": ["ripgrep"]}
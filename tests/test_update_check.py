@@ -0,0 +1,140 @@
+import base64
+import json
+import socket
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+
+import main
+from utils import read_json
+
+REMOTE_HASH = "ab" * 32
+
+class _HashHandler(BaseHTTPRequestHandler):
+    """GitHub's contents API for bin/HASH: 200 with an ETag, 304 when it matches."""
+    etag = '"v1"'
+    seen = []
+
+    def do_GET(self):
+        sent = self.headers.get("If-None-Match")
+        self.seen.append(sent)
+        if sent == self.etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        body = json.dumps({"content": base64.b64encode(REMOTE_HASH.encode()).decode()}).encode()
+        self.send_response(200)
+        self.send_header("ETag", self.etag)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def hash_server(monkeypatch):
+    _HashHandler.seen = []
+    server = HTTPServer(("127.0.0.1", 0), _HashHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setattr(main, "GITHUB_HASH_URL", f"http://127.0.0.1:{server.server_port}/bin/HASH")
+    yield _HashHandler
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture(autouse=True)
+def cache_home(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    monkeypatch.setattr(main, "_update_thread", None)
+    return tmp_path
+
+@pytest.fixture
+def executable(tmp_path, monkeypatch):
+    path = tmp_path / "bin" / "mixtura"
+    path.parent.mkdir()
+    path.write_bytes(b"binary")
+    monkeypatch.setattr(sys, "argv", [str(path)])
+    return path
+
+def test_fetch_stores_etag_then_revalidates(hash_server):
+    main._fetch_remote_hash({})
+    state = read_json(main._update_state_path())
+    assert state["remote"] == REMOTE_HASH
+    assert state["etag"] == '"v1"'
+    first_check = state["checked_at"]
+
+    main._fetch_remote_hash(dict(state))
+    assert hash_server.seen == [None, '"v1"']
+
+    state = read_json(main._update_state_path())
+    # The 304 keeps what the 200 delivered and only moves the check time
+    assert state["remote"] == REMOTE_HASH
+    assert state["etag"] == '"v1"'
+    assert state["checked_at"] >= first_check
+    assert "failed_at" not in state
+
+def test_fresh_state_skips_fetch_and_reuses_local_hash(hash_server, executable, monkeypatch):
+    monkeypatch.setattr(main, "UPDATE_TTL", 3600)
+    main.check_for_updates()
+    main._update_thread.join()
+    assert hash_server.seen == [None]
+
+    state = read_json(main._update_state_path())
+    assert state["remote"] == REMOTE_HASH
+    assert state["local"]["hash"]
+
+    # Same (inode, size, mtime): the hash comes from the state, not the file
+    state["local"]["hash"] = "cached"
+    assert main._local_hash(str(executable), state) == "cached"
+
+    monkeypatch.setattr(main, "_update_thread", None)
+    main.check_for_updates()
+    assert main._update_thread is None
+    assert hash_server.seen == [None]
+
+def test_failed_fetch_backs_off(executable, monkeypatch):
+    monkeypatch.setattr(main, "GITHUB_HASH_URL", "http://127.0.0.1:9/bin/HASH")
+    monkeypatch.setattr(main, "UPDATE_TTL", 3600)
+    main.check_for_updates()
+    main._update_thread.join()
+
+    state = read_json(main._update_state_path())
+    assert "failed_at" in state
+    assert "checked_at" not in state
+
+    monkeypatch.setattr(main, "_update_thread", None)
+    main.check_for_updates()
+    assert main._update_thread is None
+
+def test_exit_does_not_wait_on_a_slow_check(executable, monkeypatch):
+    # Accepts connections but never answers
+    silent = socket.socket()
+    silent.bind(("127.0.0.1", 0))
+    silent.listen()
+    monkeypatch.setattr(main, "GITHUB_HASH_URL", f"http://127.0.0.1:{silent.getsockname()[1]}/bin/HASH")
+    monkeypatch.setattr(main, "UPDATE_TTL", 3600)
+    try:
+        main.check_for_updates()
+        start = time.monotonic()
+        main.finish_update_check()
+        assert time.monotonic() - start < main.UPDATE_JOIN_TIMEOUT + 0.3
+        assert main._update_thread.is_alive()
+
+        # The abandoned check counts as a failed one: the next run doesn't start another
+        assert "failed_at" in read_json(main._update_state_path())
+        monkeypatch.setattr(main, "_update_thread", None)
+        main.check_for_updates()
+        assert main._update_thread is None
+    finally:
+        silent.close()
+
+def test_update_ttl_falls_back_on_invalid_value(monkeypatch):
+    from utils import env_number
+    monkeypatch.setenv("MIXTURA_UPDATE_TTL", "daily")
+    assert env_number("MIXTURA_UPDATE_TTL", 24 * 60 * 60) == 24 * 60 * 60
+    monkeypatch.setenv("MIXTURA_UPDATE_TTL", "0")
+    assert env_number("MIXTURA_UPDATE_TTL", 24 * 60 * 60) == 0